@@ -0,0 +1,20 @@
+# gunicorn.conf.py
+#
+# Picked up automatically by `gunicorn main:app` (Procfile). Workers,
+# threads and the bind address still come from WEB_CONCURRENCY / PORT
+# and the usual GUNICORN_CMD_ARGS.
+
+import os
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+
+def post_fork(server, worker):
+    """Connect each worker to MongoDB before it accepts its first request"""
+    from website.general.mongo import warm_up
+
+    if warm_up():
+        server.log.info("Worker %s: MongoDB pool warmed up", worker.pid)
+    else:
+        server.log.warning("Worker %s: MongoDB warm-up failed, connecting lazily", worker.pid)
@@ -0,0 +1,26 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.general.db import db
+from website.navaratri.nlines import rebuild_lines
+
+
+def run_backfill():
+    cycles = list(db["navaratri_cycles"].find())
+    print(f"Found {len(cycles)} Navaratri cycles.")
+
+    for cycle in cycles:
+        coll_name = cycle.get("collection_name")
+        if not coll_name:
+            continue
+        try:
+            written = rebuild_lines(db[coll_name])
+            print(f"{coll_name}: wrote {written} booking lines into {coll_name}_lines")
+        except Exception as e:
+            print(f"Error backfilling {coll_name}: {e}")
+
+    print("\nBackfill completed.")
+
+if __name__ == "__main__":
+    run_backfill()
@@ -0,0 +1,26 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.general.db import db, fancy_collection
+from website.fancy.fservices import ensure_booking_dates
+
+
+def run_backfill():
+    names = [c["collection_name"] for c in db["fancy_cycles"].find() if c.get("collection_name")]
+    if fancy_collection.name not in names:
+        names.append(fancy_collection.name)
+
+    print(f"Backfilling start_at/end_at in {len(names)} fancy collections.")
+
+    for name in names:
+        try:
+            updated = ensure_booking_dates(db[name], force=True)
+            print(f"{name}: {updated} bookings updated")
+        except Exception as e:
+            print(f"Error backfilling {name}: {e}")
+
+    print("\nBackfill completed.")
+
+if __name__ == "__main__":
+    run_backfill()
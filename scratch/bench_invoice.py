@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.navaratri.ninvoice import InvoiceLayers, invoice_layers, render_invoice
+
+STATIC_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "website", "static"))
+
+
+def sample_customer(items):
+    codes = [f"{'CK'[i % 2]}{i // 2 + 1}" for i in range(items)]
+    bookings = {}
+    for i, code in enumerate(codes):
+        bookings.setdefault(f"{i // 3 + 1:02d}-10-25", []).append(code)
+    return {
+        "Name": "Benchmark Customer", "mobile": "9000000000", "address": "Maninagar",
+        "group": "Group A", "reference": "Walk-in", "deposit": "1000",
+        "total_price": 250 * items, "given_price": 100 * items, "bookings": bookings
+    }
+
+
+def timed(customer, layers_for, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        size = len(render_invoice(customer, layers_for()))
+    return (time.perf_counter() - start) / runs * 1000, size
+
+
+def run_bench(runs=20):
+    print(f"{'items':>5} | {'before ms':>9} | {'before bytes':>12} | {'after ms':>8} | {'after bytes':>11}")
+    for items in (1, 5, 10, 20):
+        customer = sample_customer(items)
+        # Fresh full-size layers every time is what each request paid before
+        before_ms, before_size = timed(customer, lambda: InvoiceLayers(STATIC_FOLDER, thumbnails=False), runs)
+        render_invoice(customer, invoice_layers(STATIC_FOLDER))
+        after_ms, after_size = timed(customer, lambda: invoice_layers(STATIC_FOLDER), runs)
+        print(f"{items:>5} | {before_ms:>9.1f} | {before_size:>12,} | {after_ms:>8.1f} | {after_size:>11,}")
+
+if __name__ == "__main__":
+    run_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Sends a WhatsApp broadcast from the command line and follows it to the
+# end. With --fake the messages go to scratch/fake_graph_api.py instead of
+# Meta, which also reports the concurrency and rate it observed.
+
+
+def run_broadcast():
+    parser = argparse.ArgumentParser(description="WhatsApp broadcast of a navaratri cycle")
+    parser.add_argument("collection", help="cycle collection, e.g. Navaratri_2026")
+    parser.add_argument("--message", choices=("reminder", "bill"), default="reminder")
+    parser.add_argument("--date", help="YYYY-MM-DD; tomorrow by default, 'none' for the whole cycle")
+    parser.add_argument("--rate", type=float, default=10, help="messages per second")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--url-root", default="http://localhost:5000/", help="host the invoice links point at")
+    parser.add_argument("--fake", action="store_true", help="send to a local fake Graph API")
+    parser.add_argument("--fail-first", type=int, default=0, help="with --fake, fail the first N calls")
+    args = parser.parse_args()
+
+    fake = None
+    if args.fake:
+        from fake_graph_api import FakeGraphAPI
+        fake = FakeGraphAPI(fail_first=args.fail_first).start()
+        # Read by website.general.whatsapp at import
+        os.environ.update(WHATSAPP_GRAPH_URL=fake.base_url, WHATSAPP_TOKEN="fake", WHATSAPP_PHONE_ID="1")
+        os.environ.setdefault("JOB_BACKOFF", "1")
+
+    from website import create_app
+    from website.general.jobs import DONE, FAILED, ensure_workers, get_job
+    from website.navaratri.nbroadcast import broadcast_counts, create_broadcast, get_broadcast, next_date
+
+    app = create_app()
+    date = None if args.date == "none" else (args.date or next_date())
+    with app.app_context():
+        ensure_workers(app)
+        start = time.monotonic()
+        broadcast = create_broadcast(args.collection, args.message, args.url_root, date, args.rate, args.concurrency)
+        print(f"Broadcast {broadcast['_id']}: {broadcast['total']} recipients, job {broadcast['job_id']}")
+
+        while get_job(broadcast["job_id"])["status"] not in (DONE, FAILED):
+            print(f"  {broadcast_counts(broadcast['_id'])}")
+            time.sleep(1)
+        elapsed = time.monotonic() - start
+        status = get_broadcast(broadcast["_id"])["status"]
+        print(f"Broadcast {status} after {elapsed:.1f}s: {broadcast_counts(broadcast['_id'])}")
+
+    if fake:
+        ok = [r for r in fake.received if r["status"] == 200]
+        if len(ok) > 1:
+            span = ok[-1]["at"] - ok[0]["at"]
+            print(f"Fake API: {len(fake.received)} calls, {len(ok)} accepted, "
+                  f"{(len(ok) - 1) / span if span else 0:.1f}/s, at most {fake.max_in_flight} in flight")
+        fake.stop()
+
+if __name__ == "__main__":
+    run_broadcast()
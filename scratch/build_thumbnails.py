@@ -0,0 +1,27 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.general.thumbnails import THUMBNAIL_CACHE_DIR
+from website.navaratri.ninvoice import PRODUCT_IMAGE_DIRS, InvoiceLayers
+
+STATIC_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "website", "static"))
+
+
+def run_build():
+    """Makes the invoice thumbnail of every product photo ahead of the first bill"""
+    layers = InvoiceLayers(STATIC_FOLDER)
+    made = 0
+    for folder in PRODUCT_IMAGE_DIRS.values():
+        path = os.path.join(STATIC_FOLDER, folder)
+        if not os.path.isdir(path):
+            continue
+        for filename in sorted(os.listdir(path)):
+            code, ext = os.path.splitext(filename)
+            if ext.lower() == ".jpg" and layers.product_image_path(code):
+                made += 1
+
+    print(f"{made} product thumbnails ready in {THUMBNAIL_CACHE_DIR}.")
+
+if __name__ == "__main__":
+    run_build()
@@ -5,12 +5,12 @@ import re
 sys.path.insert(0, os.getcwd())
 
 try:
-    from website.general.db import fcustomers, ncustomers, custom_localities
-    from website.navaratri.nroutes import KNOWN_LOCALITIES
-    from website.fancy.froutes import KNOWN_LOCALITIES_FANCY
+    from website.general.db import fcustomers, ncustomers
     from website.general.utils import resolve_customer_locality
+    from website.general.gazetteer import get_locality_matcher
 
-    localities = list(set(KNOWN_LOCALITIES + KNOWN_LOCALITIES_FANCY + [c.get('name') for c in custom_localities.find() if c.get('name')]))
+    # One compiled matcher over every known and custom locality
+    localities = get_locality_matcher()
 
     f_custs = list(fcustomers.find())
     f_updated = 0
@@ -0,0 +1,128 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import urlopen
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Stand-in for the WhatsApp Cloud API's POST /{phone_id}/messages. Point the
+# app at it with WHATSAPP_GRAPH_URL=http://127.0.0.1:<port>/v18.0 (and any
+# WHATSAPP_TOKEN / WHATSAPP_PHONE_ID). It answers like Meta, can fail the
+# first N calls or every call to one number, and can fetch document links
+# the way Meta does before delivering them.
+
+
+class FakeGraphAPI:
+    def __init__(self, port=0, fail_first=0, fail_status=500, fail_numbers=(), fetch_documents=False, latency=0):
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.fail_numbers = set(fail_numbers)
+        self.fetch_documents = fetch_documents
+        self.latency = latency
+        self.received = []
+        self.fetched = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v18.0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def sent_to(self, number):
+        return [r for r in self.received if r["status"] == 200 and r["body"].get("to") == number]
+
+    def _respond(self, body):
+        """(status, response) for one message request"""
+        with self._lock:
+            call = len(self.received) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if call <= self.fail_first or body.get("to") in self.fail_numbers:
+                status = self.fail_status
+                response = {"error": {"message": f"Fake failure ({status})", "code": status}}
+            else:
+                status = 200
+                wamid = f"wamid.fake{next(self._ids)}"
+                response = {
+                    "messaging_product": "whatsapp",
+                    "contacts": [{"input": body.get("to"), "wa_id": body.get("to")}],
+                    "messages": [{"id": wamid}]
+                }
+                link = (body.get("document") or {}).get("link")
+                if self.fetch_documents and link:
+                    with urlopen(link, timeout=10) as res:
+                        self.fetched.append((link, res.status, len(res.read())))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.received.append({"at": time.monotonic(), "status": status, "body": body})
+        return status, response
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    body = {}
+                if not self.path.endswith("/messages") or not self.headers.get("Authorization"):
+                    status, response = 400, {"error": {"message": "Bad request"}}
+                else:
+                    status, response = fake._respond(body)
+                raw = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        return Handler
+
+
+def run_server():
+    parser = argparse.ArgumentParser(description="Fake WhatsApp Cloud API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-first", type=int, default=0, help="fail the first N messages")
+    parser.add_argument("--fail-status", type=int, default=500)
+    parser.add_argument("--fetch", action="store_true", help="download document links like Meta")
+    parser.add_argument("--latency", type=float, default=0, help="seconds per request")
+    args = parser.parse_args()
+
+    fake = FakeGraphAPI(args.port, args.fail_first, args.fail_status, fetch_documents=args.fetch, latency=args.latency)
+    print(f"Fake Graph API on {fake.base_url}")
+    print(f"Run the app with WHATSAPP_GRAPH_URL={fake.base_url} WHATSAPP_TOKEN=x WHATSAPP_PHONE_ID=1")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"{len(fake.received)} messages received, {len(fake.fetched)} documents fetched.")
+
+if __name__ == "__main__":
+    run_server()
@@ -0,0 +1,24 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.general.indexes import ensure_all_indexes, explain_report
+
+
+def run_report(apply=False):
+    if apply:
+        failed = ensure_all_indexes()
+        print(f"Indexes applied ({failed} collections failed).\n")
+
+    rows = explain_report()
+    scans = [r for r in rows if r["collscan"]]
+
+    for r in rows:
+        flag = "COLLSCAN" if r["collscan"] else "ok"
+        sort = f" sort={r['sort']}" if r["sort"] else ""
+        print(f"[{flag:8}] {r['collection']} {r['filter']}{sort} -> {' > '.join(r['stages'])}")
+
+    print(f"\n{len(scans)} of {len(rows)} queries use a collection scan.")
+
+if __name__ == "__main__":
+    run_report(apply="--apply" in sys.argv)
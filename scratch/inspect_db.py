@@ -1,12 +1,11 @@
 import os
-from pymongo import MongoClient
-from dotenv import load_dotenv
+import sys
 from pprint import pprint
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-load_dotenv()
-mongo_url = os.environ.get("client")
-client = MongoClient(mongo_url, tls=True, tlsAllowInvalidCertificates=True)
-db = client["Image_Traditional"]
+from website.general.mongo import get_db
+
+db = get_db()
 
 print("Collections in database:")
 print(db.list_collection_names())
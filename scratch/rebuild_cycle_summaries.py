@@ -0,0 +1,38 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.general.db import db, fancy_collection
+from website.navaratri.nsummary import rebuild_cycle_summary
+from website.fancy.fsummary import rebuild_fancy_summary
+
+
+def run_rebuild():
+    targets = []
+    for cycle in db["navaratri_cycles"].find():
+        if cycle.get("collection_name"):
+            targets.append((cycle["collection_name"], rebuild_cycle_summary))
+    for cycle in db["fancy_cycles"].find():
+        if cycle.get("collection_name"):
+            targets.append((cycle["collection_name"], rebuild_fancy_summary))
+
+    # The combined /dashboard always reads this fancy collection
+    if fancy_collection.name not in {name for name, _ in targets}:
+        targets.append((fancy_collection.name, rebuild_fancy_summary))
+
+    print(f"Rebuilding {len(targets)} cycle summaries.")
+
+    for coll_name, rebuild in targets:
+        try:
+            summary = rebuild(db[coll_name])
+            if summary is None:
+                print(f"{coll_name}: already being rebuilt, skipped")
+                continue
+            print(f"{coll_name}: {summary.get('totals', {})}")
+        except Exception as e:
+            print(f"Error rebuilding {coll_name}: {e}")
+
+    print("\nRebuild completed.")
+
+if __name__ == "__main__":
+    run_rebuild()
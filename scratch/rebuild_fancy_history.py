@@ -0,0 +1,25 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.general.db import db, fancy_collection
+from website.fancy.fhistory import rebuild_customer_history
+
+
+def run_rebuild():
+    names = [c["collection_name"] for c in db["fancy_cycles"].find() if c.get("collection_name")]
+    if fancy_collection.name not in names:
+        names.append(fancy_collection.name)
+
+    print(f"Rebuilding Fancy_Customer_History from {len(names)} fancy collections.")
+
+    try:
+        written = rebuild_customer_history(names)
+        print(f"{written} history rows written")
+    except Exception as e:
+        print(f"Error rebuilding history: {e}")
+
+    print("\nRebuild completed.")
+
+if __name__ == "__main__":
+    run_rebuild()
@@ -0,0 +1,24 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website.general.db import ncustomers, fcustomers
+from website.general.areas import reresolve_stale
+from website.general.gazetteer import get_gazetteer
+
+
+def run_reresolve():
+    gazetteer = get_gazetteer()
+    print(f"Gazetteer {gazetteer.stamp}: {len(gazetteer.names)} localities.")
+
+    for coll in (ncustomers, fcustomers):
+        try:
+            count = reresolve_stale(coll)
+            print(f"{coll.name}: re-resolved {count} customers")
+        except Exception as e:
+            print(f"Error re-resolving {coll.name}: {e}")
+
+    print("\nRe-resolve completed.")
+
+if __name__ == "__main__":
+    run_reresolve()
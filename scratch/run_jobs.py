@@ -0,0 +1,25 @@
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from website import create_app
+from website.general.jobs import JOB_WORKERS, ensure_workers
+
+# Runs the background jobs in a process of their own, for deployments that
+# start the web workers with JOB_WORKERS=0.
+
+
+def run_jobs(workers=None):
+    workers = workers or JOB_WORKERS or 4
+    app = create_app()
+    ensure_workers(app, workers)
+    print(f"Running jobs with {workers} workers (Ctrl+C to stop).")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    run_jobs(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -1,8 +1,8 @@
 import os
-from pymongo import MongoClient
-from dotenv import load_dotenv
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-load_dotenv()
+from website.general.mongo import new_client
 
 mongo_uri = os.environ.get("client")
 if not mongo_uri:
@@ -11,7 +11,7 @@ if not mongo_uri:
 
 try:
     print(f"Connecting to MongoDB...")
-    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    client = new_client(serverSelectionTimeoutMS=5000)
     # Trigger connection
     client.admin.command('ping')
     print("Ping success! Connected to MongoDB Atlas.")
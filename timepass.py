@@ -1,13 +1,6 @@
-from pymongo import MongoClient
-import os
-from dotenv import load_dotenv
+from website.general.mongo import get_db
 
-load_dotenv()
-
-mongoUrl = os.environ.get("client")
-client = MongoClient(mongoUrl, tls=True, tlsAllowInvalidCertificates=True)
-
-db = client["Image_Traditional"]
+db = get_db()
 
 # 👉 CHANGE THIS to your target collection
 collection = db["Fancy_2025_2026"]
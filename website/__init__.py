@@ -1,5 +1,4 @@
 from flask import Flask
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
 
@@ -23,6 +22,10 @@ def create_app():
     app.register_blueprint(navaratri,url_prefix='/')
     app.register_blueprint(general,url_prefix='/')
 
+    if os.environ.get("ENSURE_INDEXES", "1") != "0":
+        from .general.indexes import ensure_all_indexes
+        ensure_all_indexes()
+
 
    
     return app
\ No newline at end of file
@@ -17,7 +17,6 @@ from flask import (
     session, flash, jsonify, send_file, send_from_directory,
     current_app, Response
 )
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
 from fpdf import FPDF
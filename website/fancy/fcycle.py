@@ -3,9 +3,24 @@ from flask import session
 from bson import ObjectId
 
 from website.general.db import db
+from website.general.cache import CycleRegistry, request_memo
+from website.general.indexes import ensure_cycle_indexes
 
 fancy_cycles = db["fancy_cycles"]
 
+# Process-wide copy of fancy_cycles; every write to it must call invalidate_cycles()
+cycle_registry = CycleRegistry(fancy_cycles)
+
+SELECTED_MEMO_KEY = "fancy_selected_cycle"
+
+
+def invalidate_cycles():
+    """
+    Drops every cached view of fancy_cycles (this process, other workers
+    through the version counter, and the current request's memo)
+    """
+    cycle_registry.invalidate()
+
 
 def format_cycle_date(date_value):
     """
@@ -43,9 +58,7 @@ def get_active_cycle():
     Returns active cycle
     """
 
-    return fancy_cycles.find_one(
-        {"status": "active"}
-    )
+    return cycle_registry.find(status="active")
 
 
 def get_cycle_by_id(cycle_id):
@@ -53,9 +66,7 @@ def get_cycle_by_id(cycle_id):
     Returns cycle by ObjectId
     """
 
-    return fancy_cycles.find_one(
-        {"_id": ObjectId(cycle_id)}
-    )
+    return cycle_registry.by_id(cycle_id)
 
 
 def create_cycle(name, collection_name):
@@ -63,7 +74,7 @@ def create_cycle(name, collection_name):
     Creates new cycle
     """
 
-    active_cycle = get_active_cycle()
+    active_cycle = fancy_cycles.find_one({"status": "active"})
 
     if active_cycle:
         raise Exception(
@@ -80,6 +91,8 @@ def create_cycle(name, collection_name):
     }
 
     result = fancy_cycles.insert_one(cycle)
+    invalidate_cycles()
+    ensure_cycle_indexes("fancy", collection_name)
 
     return result.inserted_id
 
@@ -108,6 +121,7 @@ def end_cycle(cycle_id=None):
             }
         }
     )
+    invalidate_cycles()
 
     return True
 
@@ -117,8 +131,11 @@ def reactivate_cycle(cycle_id):
     Reactivates a closed cycle IF AND ONLY IF no other cycle is currently active.
     Returns (success: bool, message: str)
     """
-    active_cycle = get_active_cycle()
-    target_cycle = get_cycle_by_id(cycle_id)
+    active_cycle = fancy_cycles.find_one({"status": "active"})
+    try:
+        target_cycle = fancy_cycles.find_one({"_id": ObjectId(cycle_id)})
+    except Exception:
+        target_cycle = None
 
     if not target_cycle:
         return False, "Cycle not found."
@@ -136,21 +153,33 @@ def reactivate_cycle(cycle_id):
             "$unset": {"end_date": "", "closed_at": ""}
         }
     )
+    invalidate_cycles()
     return True, f"Cycle '{target_cycle.get('name')}' successfully reactivated!"
 
 
 
+def set_cycle_edit_override(cycle_id, enabled):
+    """
+    Unlocks (True) or re-locks (False) a closed cycle for editing
+    """
+
+    fancy_cycles.update_one(
+        {"_id": ObjectId(cycle_id)},
+        {
+            "$set": {
+                "edit_override": enabled
+            }
+        }
+    )
+    invalidate_cycles()
+
+
 def get_all_cycles():
     """
     Returns all cycles
     """
 
-    return list(
-        fancy_cycles.find().sort(
-            "created_at",
-            -1
-        )
-    )
+    return cycle_registry.all()
 
 
 def set_selected_cycle(cycle_id):
@@ -160,12 +189,27 @@ def set_selected_cycle(cycle_id):
 
     session["fancy_cycle_id"] = str(cycle_id)
 
+    memo = request_memo()
+    if memo is not None:
+        memo.pop(SELECTED_MEMO_KEY, None)
+
 
 def get_selected_cycle():
     """
-    Returns selected cycle
+    Returns selected cycle, resolved once per request
     """
 
+    memo = request_memo()
+    if memo is not None and SELECTED_MEMO_KEY in memo:
+        return memo[SELECTED_MEMO_KEY]
+
+    cycle = _resolve_selected_cycle()
+    if memo is not None:
+        memo[SELECTED_MEMO_KEY] = cycle
+    return cycle
+
+
+def _resolve_selected_cycle():
     cycle_id = session.get(
         "fancy_cycle_id"
     )
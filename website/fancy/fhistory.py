@@ -0,0 +1,133 @@
+# fhistory.py
+#
+# Cross-cycle booking history of fancy customers: one row per booking in
+# `Fancy_Customer_History`, copied from its cycle collection and indexed
+# by mobile, so a profile is a single indexed read however many seasons
+# exist. Rows are refreshed by on_booking_write().
+#
+# Rows are keyed on the booking _id and always written as upserts, so a
+# rebuild can run next to live writes or another rebuild without
+# emptying the history or colliding on duplicate keys.
+
+from datetime import datetime, time
+
+from pymongo import DESCENDING, ReplaceOne
+
+from website.general.db import db
+from website.general.summaries import summaries
+from website.general.indexes import STATIC_INDEXES, apply_indexes
+from website.fancy.fcycle import cycle_registry
+from website.fancy.fsummary import parse_booking_date
+
+history = db["Fancy_Customer_History"]
+
+HISTORY_INDEXES = STATIC_INDEXES[history.name]
+
+HISTORY_FIELDS = [
+    "name", "mobile", "address", "school", "costume", "details", "price",
+    "start_date", "end_date", "start_at", "end_at",
+    "taken", "returned", "timestamp"
+]
+
+# Marker in cycle_summaries telling that the history has been built once
+HISTORY_MARKER = history.name
+
+
+def _season(collection_name):
+    cycle = cycle_registry.find(collection_name=collection_name)
+    if cycle:
+        return cycle["name"], str(cycle["_id"])
+    return collection_name, None
+
+
+def history_row(doc, collection_name, season, cycle_id):
+    row = {k: doc[k] for k in HISTORY_FIELDS if k in doc}
+    row["taken"] = bool(doc.get("taken"))
+    row["returned"] = bool(doc.get("returned"))
+
+    # Bookings saved before start_at/end_at existed
+    for raw, at in (("start_date", "start_at"), ("end_date", "end_at")):
+        if at not in row:
+            d = parse_booking_date(doc.get(raw))
+            row[at] = datetime.combine(d, time.min) if d else None
+
+    row.update({
+        "_id": doc["_id"],
+        "collection_name": collection_name,
+        "season": season,
+        "cycle_id": cycle_id
+    })
+    return row
+
+
+def _is_built():
+    return summaries.count_documents({"_id": HISTORY_MARKER}, limit=1) > 0
+
+
+def rebuild_customer_history(collection_names=None):
+    """
+    Copies every booking of the given fancy collections (default: all
+    fancy cycles) into the history. Returns the number of rows written.
+    """
+    apply_indexes(history, HISTORY_INDEXES)
+
+    if collection_names is None:
+        collection_names = [c["collection_name"] for c in cycle_registry.all() if c.get("collection_name")]
+
+    written = 0
+    for name in collection_names:
+        season, cycle_id = _season(name)
+
+        seen = set()
+        batch = []
+        for doc in db[name].find({}, {k: 1 for k in HISTORY_FIELDS}):
+            seen.add(doc["_id"])
+            batch.append(ReplaceOne({"_id": doc["_id"]}, history_row(doc, name, season, cycle_id), upsert=True))
+            if len(batch) >= 1000:
+                history.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            history.bulk_write(batch, ordered=False)
+        written += len(seen)
+
+        # Rows of bookings deleted since; ones booked after the scan keep theirs
+        extra = [r["_id"] for r in history.find({"collection_name": name}, {"_id": 1}) if r["_id"] not in seen]
+        if extra:
+            alive = {d["_id"] for d in db[name].find({"_id": {"$in": extra}}, {"_id": 1})}
+            history.delete_many({"_id": {"$in": [i for i in extra if i not in alive]}})
+
+    summaries.update_one(
+        {"_id": HISTORY_MARKER},
+        {"$set": {"kind": "history", "rebuilt_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return written
+
+
+def sync_booking_history(collection, booking_id):
+    """
+    Re-copies one booking after a write; deleted bookings are removed.
+    Also done before the history is first built, whose rebuild then
+    upserts the same row.
+    """
+    doc = collection.find_one({"_id": booking_id}, {k: 1 for k in HISTORY_FIELDS})
+    if doc:
+        season, cycle_id = _season(collection.name)
+        history.replace_one(
+            {"_id": booking_id},
+            history_row(doc, collection.name, season, cycle_id),
+            upsert=True
+        )
+    else:
+        history.delete_one({"_id": booking_id})
+
+
+def get_customer_history(mobile, collection_names=None):
+    """A customer's bookings across seasons, latest first"""
+    if not _is_built():
+        rebuild_customer_history()
+
+    query = {"mobile": mobile}
+    if collection_names is not None:
+        query["collection_name"] = {"$in": list(collection_names)}
+    return list(history.find(query).sort("timestamp", DESCENDING))
@@ -0,0 +1,196 @@
+# finterval.py
+#
+# In-memory interval index over fancy rental ranges (start_at..end_at,
+# both days inclusive), one per cycle collection, rebuilt when the cycle's
+# version counter moves (on_booking_write bumps it).
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+from website.general.cache import get_cycle_versions
+from website.general.db import db
+from .fsummary import parse_booking_date
+
+CALENDAR_PROJECTION = {
+    "name": 1, "mobile": 1, "address": 1, "school": 1, "costume": 1,
+    "details": 1, "price": 1, "taken": 1, "returned": 1, "timestamp": 1,
+    "start_date": 1, "end_date": 1, "start_at": 1, "end_at": 1
+}
+
+
+def day_number(value):
+    """date/datetime -> proleptic ordinal, the unit the index works in"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() if isinstance(value, date) else None
+
+
+class IntervalIndex:
+    """
+    Static interval tree over (start, end, booking) triples.
+
+    Intervals are sorted by start and the sorted array is read as an
+    implicit balanced tree (each range's middle element is its root), with
+    the largest end of every subtree stored at its root. Overlap queries
+    cost O(log n + k). A second array sorted by end answers "ended before"
+    and "ending from", and the merged union of all ranges answers which
+    days have at least one booking.
+    """
+
+    def __init__(self, intervals, version=None):
+        self.version = version
+        items = []
+        for seq, (start, end, booking) in enumerate(intervals):
+            s, e = day_number(start), day_number(end)
+            if s is not None and e is not None and e >= s:
+                items.append((s, e, seq, booking))
+        items.sort(key=lambda x: (x[0], x[2]))
+
+        self._starts = [x[0] for x in items]
+        self._ends = [x[1] for x in items]
+        self._seqs = [x[2] for x in items]
+        self._bookings = [x[3] for x in items]
+        self._max_end = [0] * len(items)
+        self._build(0, len(items))
+
+        by_end = sorted(range(len(items)), key=lambda i: (self._ends[i], self._seqs[i]))
+        self._by_end = by_end
+        self._end_keys = [self._ends[i] for i in by_end]
+
+        self._union_starts = []
+        self._union_ends = []
+        for s, e in zip(self._starts, self._ends):
+            if self._union_ends and s <= self._union_ends[-1] + 1:
+                self._union_ends[-1] = max(self._union_ends[-1], e)
+            else:
+                self._union_starts.append(s)
+                self._union_ends.append(e)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return 0
+        mid = (lo + hi) // 2
+        best = max(self._ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        self._max_end[mid] = best
+        return best
+
+    def __len__(self):
+        return len(self._bookings)
+
+    def _collect(self, positions):
+        """Bookings at the given positions, in the order they were added"""
+        return [self._bookings[i] for i in sorted(positions, key=lambda i: self._seqs[i])]
+
+    def overlapping(self, start, end):
+        """Bookings whose range shares at least one day with start..end"""
+        s, e = day_number(start), day_number(end)
+        found = []
+        stack = [(0, len(self._starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] < s:
+                continue
+            stack.append((lo, mid))
+            if self._starts[mid] <= e:
+                if self._ends[mid] >= s:
+                    found.append(mid)
+                stack.append((mid + 1, hi))
+        return self._collect(found)
+
+    def active_on(self, day):
+        return self.overlapping(day, day)
+
+    def ended_before(self, day):
+        """Bookings whose last day is earlier than `day`"""
+        cut = bisect_left(self._end_keys, day_number(day))
+        return self._collect(self._by_end[:cut])
+
+    def ending_from(self, day):
+        """Bookings whose last day is `day` or later"""
+        cut = bisect_left(self._end_keys, day_number(day))
+        return self._collect(self._by_end[cut:])
+
+    def booked_days(self, start=None, end=None):
+        """Sorted dates within start..end (default: everything) with a booking"""
+        if not self._union_starts:
+            return []
+        s = day_number(start) if start is not None else self._union_starts[0]
+        e = day_number(end) if end is not None else self._union_ends[-1]
+
+        days = []
+        i = max(bisect_right(self._union_starts, s) - 1, 0)
+        while i < len(self._union_starts) and self._union_starts[i] <= e:
+            lo = max(self._union_starts[i], s)
+            hi = min(self._union_ends[i], e)
+            days.extend(date.fromordinal(d) for d in range(lo, hi + 1))
+            i += 1
+        return days
+
+
+class CycleIntervals:
+    """Interval indexes of one fancy cycle: every booking, and the unreturned ones"""
+
+    def __init__(self, bookings, version=None):
+        self.version = version
+        self.bookings = IntervalIndex(
+            ((b.get("start_at"), b.get("end_at"), b) for b in bookings), version
+        )
+        self.unreturned = IntervalIndex(
+            ((b.get("start_at"), b.get("end_at"), b) for b in bookings if not b.get("returned")),
+            version
+        )
+
+
+def booking_intervals(bookings, version=None):
+    """IntervalIndex over already-loaded bookings (start_at/end_at or raw dates)"""
+    def bounds(b):
+        return (
+            b.get("start_at") or parse_booking_date(b.get("start_date")),
+            b.get("end_at") or parse_booking_date(b.get("end_date"))
+        )
+
+    return IntervalIndex(((*bounds(b), b) for b in bookings), version)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_cycle_intervals(collection, version):
+    """
+    Interval indexes of a fancy cycle collection at `version`,
+    rebuilt with one scan when the cached copy is older.
+    """
+    from .fservices import ensure_booking_dates
+
+    name = collection.name
+    index = _indexes.get(name)
+    if index is not None and index.version == version:
+        return index
+
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None or index.version != version:
+            ensure_booking_dates(collection)
+            docs = list(collection.find({"start_at": {"$ne": None}}, CALENDAR_PROJECTION))
+            index = CycleIntervals(docs, version)
+            _indexes[name] = index
+    return index
+
+
+def cycles_intervals(cycles):
+    """[(cycle, CycleIntervals)] for several cycles, one version lookup in total"""
+    versions = get_cycle_versions(c["collection_name"] for c in cycles)
+    return [
+        (cycle, get_cycle_intervals(db[cycle["collection_name"]], versions[cycle["collection_name"]]))
+        for cycle in cycles
+    ]
+
+
+def drop_cycle_intervals(collection_name):
+    with _indexes_lock:
+        _indexes.pop(collection_name, None)
@@ -1,6 +1,7 @@
 # fmodels.py
 
 from ..general.db import fancy_collection, fcustomers, finventory
+from ..general.areas import on_customer_address_write
 from bson.objectid import ObjectId
 
 
@@ -21,7 +22,7 @@ def get_fancy_customer(mobile):
 
 
 def upsert_fancy_customer(mobile, data):
-    return fcustomers.update_one(
+    result = fcustomers.update_one(
         {"mobile": mobile},
         {
             "$set": data,
@@ -29,6 +30,8 @@ def upsert_fancy_customer(mobile, data):
         },
         upsert=True
     )
+    on_customer_address_write(fcustomers, {"mobile": mobile})
+    return result
 
 
 # ------------------ INVENTORY ------------------
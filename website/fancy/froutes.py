@@ -8,8 +8,14 @@ import os
 from .fservices import *
 from .fmodels import *
 from ..general.db import *
-
-from website.fancy.fcycle import fancy_cycles
+from .fsummary import summary_kpis
+from .fhistory import get_customer_history
+from .finterval import cycles_intervals
+from ..general.projections import find_view, projection
+from ..general.pagination import keyset_page, page_size
+from ..general.areas import area_analytics, area_query, directory_changed, on_customer_address_write
+from ..general.cache import cached_result, bump_cycle_version
+from ..general.aggregations import customer_totals
 
 from website.fancy.fcycle import (
     get_active_cycle,
@@ -22,6 +28,7 @@ from website.fancy.fcycle import (
     create_cycle,
     end_cycle,
     reactivate_cycle,
+    set_cycle_edit_override,
     get_active_collection,
     get_selected_collection
 )
@@ -70,6 +77,9 @@ def fbook():
     'details': data.get('details', '').strip(),
     'timestamp': datetime.utcnow()
 }
+        booking_data.update(
+            booking_dates(booking_data['start_date'], booking_data['end_date'])
+        )
 
         customer_data = {
             'name': booking_data['name'],
@@ -87,6 +97,7 @@ def fbook():
             },
             upsert=True
         )
+        on_customer_address_write(fcustomers, {'mobile': mobile})
 
         # Add school to School_Master if new
         if school:
@@ -104,7 +115,8 @@ def fbook():
                 upsert=True
             )
 
-        collection.insert_one(booking_data)
+        result = collection.insert_one(booking_data)
+        on_booking_write(collection, result.inserted_id)
 
         return jsonify({'status': 'success'}), 200
 
@@ -129,7 +141,7 @@ def flisting():
         return redirect(url_for('auth.login'))
     
     collection = get_selected_collection()
-    fbookings = list(collection.find())
+    fbookings = list(find_view(collection, "fancy_listing"))
 
     return render_template("fancy/fancy_listing.html",fbookings = fbookings)
 
@@ -148,6 +160,7 @@ def delete_booking(id):
     collection.delete_one({
         '_id': ObjectId(id)
     })
+    on_booking_write(collection, ObjectId(id))
 
     return jsonify(success=True)
 
@@ -173,10 +186,12 @@ def update_booking():
             'details': data['details'],
             'price': int(float(data['price'])),
             'start_date': data['start_date'],
-            'end_date': data['end_date']
+            'end_date': data['end_date'],
+            **booking_dates(data['start_date'], data['end_date'])
         }
     }
 )
+        on_booking_write(collection, ObjectId(data['id']))
 
         return jsonify(success=True)
 
@@ -238,81 +253,11 @@ def fancy_calendar():
                 {'_id': ObjectId(bid)},
                 {'$set': {field: True}}
             )
+            on_booking_write(collection, ObjectId(bid))
 
         return jsonify(success=True)
 
-    # ---------- FETCH ALL BOOKINGS ----------
-    all_bookings = []
-
-    for cycle in get_all_cycles():
-
-        collection = db[
-            cycle['collection_name']
-        ]
-
-        for b in collection.find():
-
-            b['season'] = cycle['name']
-            b['cycle_id'] = str(cycle['_id'])
-
-            # Normalize dates
-            for k in ['start_date', 'end_date']:
-
-                v = b.get(k)
-
-                if isinstance(v, datetime):
-
-                    b[k] = v.strftime('%d-%m-%Y')
-
-                elif isinstance(v, str):
-
-                    formats = [
-                        '%Y-%m-%d',
-                        '%d-%m-%Y',
-                        '%d-%m-%y'
-                    ]
-
-                    for fmt in formats:
-                        try:
-                            b[k] = datetime.strptime(
-                                v,
-                                fmt
-                            ).strftime('%d-%m-%Y')
-                            break
-                        except:
-                            pass
-
-            all_bookings.append(b)
-
-    # ---------- CALENDAR HIGHLIGHT DATES ----------
-    booked_dates = set()
-
-    for b in all_bookings:
-
-        try:
-
-            sd = datetime.strptime(
-                b['start_date'],
-                '%d-%m-%Y'
-            ).date()
-
-            ed = datetime.strptime(
-                b['end_date'],
-                '%d-%m-%Y'
-            ).date()
-
-            cur = sd
-
-            while cur <= ed:
-
-                booked_dates.add(
-                    cur.strftime('%Y-%m-%d')
-                )
-
-                cur += timedelta(days=1)
-
-        except:
-            pass
+    cycles = cycles_intervals(get_all_cycles())
 
     # ---------- BOOKINGS FOR SELECTED DATE ----------
     day_bookings = []
@@ -324,53 +269,24 @@ def fancy_calendar():
             '%Y-%m-%d'
         ).date()
 
-        for b in all_bookings:
-
-            try:
-
-                sd = datetime.strptime(
-                    b['start_date'],
-                    '%d-%m-%Y'
-                ).date()
-
-                ed = datetime.strptime(
-                    b['end_date'],
-                    '%d-%m-%Y'
-                ).date()
-
-                if sd <= sel <= ed:
-                    day_bookings.append(b)
-
-            except:
-                pass
+        day_bookings = tag_bookings(
+            cycles,
+            lambda ix: ix.bookings.active_on(sel)
+        )
 
     # ---------- UPCOMING & NOT RETURNED ----------
-    upcoming = []
-    not_returned = []
-
-    for b in all_bookings:
-
-        try:
-
-            ed = datetime.strptime(
-                b['end_date'],
-                '%d-%m-%Y'
-            ).date()
-
-            if ed >= today:
-
-                upcoming.append(b)
-
-            elif ed < today and not b.get('returned'):
-
-                not_returned.append(b)
+    upcoming = tag_bookings(
+        cycles,
+        lambda ix: ix.bookings.ending_from(today)
+    )
 
-        except:
-            pass
+    not_returned = tag_bookings(
+        cycles,
+        lambda ix: ix.unreturned.ended_before(today)
+    )
 
     return render_template(
         'fancy/fancy_calendar.html',
-        booked_dates=list(booked_dates),
         day_bookings=day_bookings,
         upcoming=upcoming,
         not_returned=not_returned,
@@ -378,55 +294,49 @@ def fancy_calendar():
         today=today.strftime('%Y-%m-%d')
     )
 
-@fancy.route('/fancy_dashboard')
-def fancy_dashboard():
-
+@fancy.route('/fancy_calendar/booked_dates')
+def fancy_calendar_booked_dates():
+    """
+    Days with at least one fancy booking inside the visible calendar
+    window; FullCalendar sends ?start=...&end=... (end exclusive).
+    """
     if not session.get('logged_in'):
-        return redirect(url_for('auth.login'))
+        return jsonify({"error": "Unauthorized"}), 401
 
-    # -----------------------------
-    # CYCLE SELECTOR HANDLE
-    # -----------------------------
-    cycle_id = request.args.get('cycle_id')
-    if cycle_id:
-        set_selected_cycle(cycle_id)
+    try:
+        start = datetime.strptime(request.args.get('start', '')[:10], '%Y-%m-%d')
+        end = datetime.strptime(request.args.get('end', '')[:10], '%Y-%m-%d') - timedelta(days=1)
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM-DD"}), 400
 
-    # -----------------------------
-    # SELECTED CYCLE DATA
-    # -----------------------------
-    collection = get_selected_collection()
+    if end < start or (end - start).days > 92:
+        return jsonify({"error": "Invalid date window"}), 400
 
-    current_bookings = list(
-        collection.find()
-    )
+    booked_dates = set()
 
-    total_bookings_count = len(
-        current_bookings
-    )
+    for cycle, ix in cycles_intervals(get_all_cycles()):
 
-    total_revenue = sum(
-        b.get('price', 0)
-        for b in current_bookings
-    )
+        booked_dates.update(
+            ix.bookings.booked_days(start, end)
+        )
 
-    returned_count = sum(
-        1
-        for b in current_bookings
-        if b.get('returned')
-    )
+    return jsonify([
+        {'start': d.strftime('%Y-%m-%d'), 'display': 'background'}
+        for d in sorted(booked_dates)
+    ])
 
-    taken_count = sum(
-        1
-        for b in current_bookings
-        if b.get('taken')
-    )
+def build_fancy_dashboard_context(collection):
+    """
+    Template context of /fancy_dashboard for one fancy cycle collection
+    """
+    kpis = summary_kpis(collection)
+    totals = kpis["totals"]
 
-    not_returned = sum(
-        1
-        for b in current_bookings
-        if b.get('taken')
-        and not b.get('returned')
-    )
+    total_bookings_count = totals["bookings"]
+    total_revenue = totals["revenue"]
+    returned_count = totals["returned"]
+    taken_count = totals["taken"]
+    not_returned = totals["not_returned"]
 
     awaiting_pickup = total_bookings_count - returned_count - not_returned
     avg_revenue = total_revenue / total_bookings_count if total_bookings_count > 0 else 0
@@ -437,13 +347,12 @@ def fancy_dashboard():
     costume_counter = Counter()
     school_counter = Counter()
 
-    for b in current_bookings:
-        costume = b.get('details')
-        school = b.get('school')
-        if costume:
-            costume_counter[costume.strip().title()] += 1
-        if school:
-            school_counter[school.strip().title()] += 1
+    for row in kpis["by_details"]:
+        if row["key"]:
+            costume_counter[row["key"].strip().title()] += row["count"]
+    for row in kpis["by_school"]:
+        if row["key"]:
+            school_counter[row["key"].strip().title()] += row["count"]
 
     top_costumes = sorted(
         costume_counter.items(),
@@ -484,12 +393,11 @@ def fancy_dashboard():
     # 2. Group bookings and revenue by category (costume field holds the category name in bookings schema)
     category_bookings = {}
     category_revenue = {}
-    for b in current_bookings:
-        cat = b.get("costume", "General").strip().title()
-        price = b.get("price", 0)
+    for row in kpis["by_costume"]:
+        cat = (row["key"] if row["key"] is not None else "General").strip().title()
         
-        category_bookings[cat] = category_bookings.get(cat, 0) + 1
-        category_revenue[cat] = category_revenue.get(cat, 0) + price
+        category_bookings[cat] = category_bookings.get(cat, 0) + row["count"]
+        category_revenue[cat] = category_revenue.get(cat, 0) + row["revenue"]
 
     # 3. Calculate Best Category and Best Product highlights (excluding catch-alls like Other & General)
     category_bookings_sorted = sorted(category_bookings.items(), key=lambda x: x[1], reverse=True)
@@ -527,17 +435,12 @@ def fancy_dashboard():
     total_duration_days = 0
     duration_bookings_count = 0
 
-    for b in current_bookings:
-        costume = b.get("costume", "").strip().title()
-        cat = costume_to_category.get(costume, "Other")
-        sd = safe_parse_date(b.get("start_date"))
-        ed = safe_parse_date(b.get("end_date"))
-        if sd and ed and ed >= sd:
-            duration = (ed - sd).days + 1
-            category_durations[cat] = category_durations.get(cat, 0) + duration
-            category_duration_counts[cat] = category_duration_counts.get(cat, 0) + 1
-            total_duration_days += duration
-            duration_bookings_count += 1
+    for row in kpis["durations"]:
+        cat = costume_to_category.get(row["costume"], "Other")
+        category_durations[cat] = category_durations.get(cat, 0) + row["days"]
+        category_duration_counts[cat] = category_duration_counts.get(cat, 0) + row["count"]
+        total_duration_days += row["days"]
+        duration_bookings_count += row["count"]
 
     avg_durations_by_category = []
     for cat, total_dur in category_durations.items():
@@ -556,83 +459,56 @@ def fancy_dashboard():
         "Monday": 0, "Tuesday": 0, "Wednesday": 0, "Thursday": 0, "Friday": 0, "Saturday": 0, "Sunday": 0
     }
     days_list = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    for b in current_bookings:
-        sd = safe_parse_date(b.get("start_date"))
+    for row in kpis["by_start_date"]:
+        sd = safe_parse_date(row["key"])
         if sd:
             day_name = days_list[sd.weekday()]
-            day_of_week_counts[day_name] += 1
+            day_of_week_counts[day_name] += row["count"]
     day_of_week_data = [{"day": d, "count": day_of_week_counts[d]} for d in days_list]
 
     # 6. Monthly Revenue Performance Analysis
     months_list = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
     monthly_revenue = {m: 0 for m in months_list}
-    for b in current_bookings:
-        sd = safe_parse_date(b.get("start_date"))
+    for row in kpis["by_start_date"]:
+        sd = safe_parse_date(row["key"])
         if sd:
             m_name = months_list[sd.month - 1]
-            monthly_revenue[m_name] += b.get("price", 0)
+            monthly_revenue[m_name] += row["revenue"]
     monthly_revenue_data = [{"month": m, "revenue": monthly_revenue[m]} for m in months_list]
 
     # 7. Active Customers count
-    active_customers = len({b.get("mobile") for b in current_bookings if b.get("mobile")})
+    active_customers = totals["active_customers"]
 
     # -----------------------------
     # ALL-TIME CUSTOMER DATA & CYCLES
     # -----------------------------
+    all_cycles = get_all_cycles()
     all_bookings = []
-    for cycle in get_all_cycles():
-        cycle_collection = db[cycle["collection_name"]]
-        cycle_bookings = list(cycle_collection.find())
+    for cycle in all_cycles:
+        cycle_bookings = list(db[cycle["collection_name"]].find(
+            {}, {"name": 1, "mobile": 1, "price": 1, "costume": 1, "start_date": 1}
+        ))
         for b in cycle_bookings:
             b["season"] = cycle["name"]
         all_bookings.extend(cycle_bookings)
 
-    customer_totals = {}
-    for b in all_bookings:
-        mobile = b.get('mobile')
-        name = b.get('name', 'Unknown')
-        price = b.get('price', 0)
-
-        if not mobile:
-            continue
-
-        if mobile not in customer_totals:
-            customer_totals[mobile] = {
-                'name': name,
-                'mobile': mobile,
-                'total_amount': 0,
-                'total_bookings': 0
-            }
-        customer_totals[mobile]['total_amount'] += price
-        customer_totals[mobile]['total_bookings'] += 1
-
-    top_20_customers = sorted(
-        customer_totals.values(),
-        key=lambda x: x['total_amount'],
-        reverse=True
-    )[:20]
+    top_20_customers = customer_totals(
+        [db[cycle["collection_name"]] for cycle in all_cycles], 20
+    )
 
     # -----------------------------
     # ADVANCED GRAPH METRICS & REVENUE BREAKDOWNS
     # -----------------------------
     school_stats_dict = {}
     costume_stats_dict = {}
-    for b in current_bookings:
-        school = b.get('school', 'Unknown').strip().title()
-        costume = b.get('details', 'Unknown').strip().title()
-        price = b.get('price', 0)
-        
-        if school:
-            if school not in school_stats_dict:
-                school_stats_dict[school] = {"bookings": 0, "revenue": 0}
-            school_stats_dict[school]["bookings"] += 1
-            school_stats_dict[school]["revenue"] += price
-            
-        if costume:
-            if costume not in costume_stats_dict:
-                costume_stats_dict[costume] = {"bookings": 0, "revenue": 0}
-            costume_stats_dict[costume]["bookings"] += 1
-            costume_stats_dict[costume]["revenue"] += price
+    for stats_dict, rows in ((school_stats_dict, kpis["by_school"]), (costume_stats_dict, kpis["by_details"])):
+        for row in rows:
+            name = (row["key"] if row["key"] is not None else "Unknown").strip().title()
+            if name:
+                if name not in stats_dict:
+                    stats_dict[name] = {"bookings": 0, "revenue": 0}
+                stats_dict[name]["bookings"] += row["count"]
+                stats_dict[name]["revenue"] += row["revenue"]
 
     top_schools_by_revenue = sorted(
         [{"name": k, "bookings": v["bookings"], "revenue": v["revenue"]} for k, v in school_stats_dict.items()],
@@ -650,20 +526,11 @@ def fancy_dashboard():
     # BOOKINGS TIMELINE (DATE NORMALIZATION)
     # -----------------------------
     bookings_by_date_dict = {}
-    for b in current_bookings:
-        sd = b.get("start_date")
-        date_str = None
-        if isinstance(sd, datetime):
+    for row in kpis["by_start_date"]:
+        sd = safe_parse_date(row["key"])
+        if sd:
             date_str = sd.strftime("%d-%m-%Y")
-        elif isinstance(sd, str) and sd.strip():
-            for fmt in ["%Y-%m-%d", "%d-%m-%Y", "%d-%m-%y"]:
-                try:
-                    date_str = datetime.strptime(sd.strip(), fmt).strftime("%d-%m-%Y")
-                    break
-                except ValueError:
-                    continue
-        if date_str:
-            bookings_by_date_dict[date_str] = bookings_by_date_dict.get(date_str, 0) + 1
+            bookings_by_date_dict[date_str] = bookings_by_date_dict.get(date_str, 0) + row["count"]
 
     sorted_date_items = []
     for date_str, count in bookings_by_date_dict.items():
@@ -794,35 +661,64 @@ def fancy_dashboard():
         reverse=True
     )
 
+    return {
+        "total_bookings": total_bookings_count,
+        "total_revenue": total_revenue,
+        "returned_count": returned_count,
+        "taken_count": taken_count,
+        "not_returned": not_returned,
+        "awaiting_pickup": awaiting_pickup,
+        "avg_revenue": avg_revenue,
+        "top_costumes": top_costumes,
+        "top_school": top_school,
+        "top_20_customers": top_20_customers,
+        "bookings_by_date": bookings_by_date,
+        "top_schools_by_revenue": top_schools_by_revenue,
+        "top_costumes_by_revenue": top_costumes_by_revenue,
+        "total_stock": total_stock,
+        "avg_durations_by_category": avg_durations_by_category,
+        "strategic_insights": strategic_insights,
+        "day_of_week_data": day_of_week_data,
+        "active_customers": active_customers,
+        "monthly_revenue_data": monthly_revenue_data,
+        "forecast_calendar": forecast_calendar,
+        "category_revenue_list": category_revenue_list
+    }
+
+
+@fancy.route('/fancy_dashboard')
+def fancy_dashboard():
+
+    if not session.get('logged_in'):
+        return redirect(url_for('auth.login'))
+
+    # -----------------------------
+    # CYCLE SELECTOR HANDLE
+    # -----------------------------
+    cycle_id = request.args.get('cycle_id')
+    if cycle_id:
+        set_selected_cycle(cycle_id)
+
+    # -----------------------------
+    # SELECTED CYCLE DATA
+    # -----------------------------
+    collection = get_selected_collection()
+
+    all_cycles = get_all_cycles()
+    context = cached_result(
+        ("fancy_dashboard", collection.name, datetime.now().date().isoformat()),
+        [c["collection_name"] for c in all_cycles] + [finventory.name],
+        lambda: build_fancy_dashboard_context(collection)
+    )
+
     # CURRENT SELECTED CYCLE INFO
     selected_cycle = get_selected_cycle()
-    all_cycles = get_all_cycles()
 
     return render_template(
         'fancy/fancy_dashboard.html',
-        total_bookings=total_bookings_count,
-        total_revenue=total_revenue,
-        returned_count=returned_count,
-        taken_count=taken_count,
-        not_returned=not_returned,
-        awaiting_pickup=awaiting_pickup,
-        avg_revenue=avg_revenue,
-        top_costumes=top_costumes,
-        top_school=top_school,
-        top_20_customers=top_20_customers,
         selected_cycle=selected_cycle,
         all_cycles=all_cycles,
-        bookings_by_date=bookings_by_date,
-        top_schools_by_revenue=top_schools_by_revenue,
-        top_costumes_by_revenue=top_costumes_by_revenue,
-        total_stock=total_stock,
-        avg_durations_by_category=avg_durations_by_category,
-        strategic_insights=strategic_insights,
-        day_of_week_data=day_of_week_data,
-        active_customers=active_customers,
-        monthly_revenue_data=monthly_revenue_data,
-        forecast_calendar=forecast_calendar,
-        category_revenue_list=category_revenue_list
+        **context
     )
 
 from io import BytesIO
@@ -895,45 +791,9 @@ def download_dashboard_excel():
     )
 
     # Top Customers
-    all_bookings = []
-
-    for cycle in get_all_cycles():
-
-        cycle_collection = db[
-            cycle["collection_name"]
-        ]
-
-        all_bookings.extend(
-            list(cycle_collection.find())
-        )
-
-    customer_totals = {}
-
-    for b in all_bookings:
-
-        mobile = b.get('mobile')
-
-        if not mobile:
-            continue
-
-        if mobile not in customer_totals:
-
-            customer_totals[mobile] = {
-                'name': b.get('name', ''),
-                'mobile': mobile,
-                'total_amount': 0,
-                'total_bookings': 0
-            }
-
-        customer_totals[mobile]['total_amount'] += b.get('price', 0)
-        customer_totals['mobile'] if False else None
-        customer_totals[mobile]['total_bookings'] += 1
-
-    top_customers = sorted(
-        customer_totals.values(),
-        key=lambda x: x['total_amount'],
-        reverse=True
-    )[:50]
+    top_customers = customer_totals(
+        [db[cycle["collection_name"]] for cycle in get_all_cycles()], 50
+    )
 
     wb = Workbook()
 
@@ -1042,6 +902,7 @@ def fancy_inventory():
             "category": category,
             "sizes": sizes
         })
+        bump_cycle_version(finventory.name)
 
         return redirect(url_for("fancy.fancy_inventory"))
 
@@ -1074,6 +935,7 @@ def update_fancy_inventory(id):
             "sizes": sizes
         }}
     )
+    bump_cycle_version(finventory.name)
 
     return redirect(url_for("fancy.fancy_inventory"))
 
@@ -1083,6 +945,7 @@ def delete_fancy_inventory(id):
     if not session.get('logged_in'):
         return redirect(url_for('auth.login'))
     finventory.delete_one({"_id": ObjectId(id)})
+    bump_cycle_version(finventory.name)
     return redirect(url_for("fancy.fancy_inventory"))
 
 @fancy.route('/fancy_profile')
@@ -1104,100 +967,11 @@ def fancy_profile():
     if not customer:
         return "Customer not found", 404
 
-    all_bookings = []
-
-    # ---------- FETCH FROM ALL CYCLES ----------
-    for cycle in get_all_cycles():
-
-        collection = db[
-            cycle["collection_name"]
-        ]
-
-        bookings = list(
-            collection.find({
-                "mobile": mobile
-            })
-        )
-
-        for b in bookings:
-
-            b["season"] = cycle["name"]
-            b["cycle_id"] = str(
-                cycle["_id"]
-            )
-
-            # Normalize start_date
-            sd = b.get("start_date")
-
-            if isinstance(sd, datetime):
-
-                b["start_date"] = sd.strftime(
-                    "%d-%m-%Y"
-                )
-
-            elif isinstance(sd, str):
-
-                formats = [
-                    "%Y-%m-%d",
-                    "%d-%m-%Y",
-                    "%d-%m-%y"
-                ]
-
-                for fmt in formats:
-                    try:
-                        b["start_date"] = (
-                            datetime.strptime(
-                                sd,
-                                fmt
-                            ).strftime(
-                                "%d-%m-%Y"
-                            )
-                        )
-                        break
-                    except:
-                        pass
-
-            # Normalize end_date
-            ed = b.get("end_date")
-
-            if isinstance(ed, datetime):
-
-                b["end_date"] = ed.strftime(
-                    "%d-%m-%Y"
-                )
-
-            elif isinstance(ed, str):
-
-                formats = [
-                    "%Y-%m-%d",
-                    "%d-%m-%Y",
-                    "%d-%m-%y"
-                ]
-
-                for fmt in formats:
-                    try:
-                        b["end_date"] = (
-                            datetime.strptime(
-                                ed,
-                                fmt
-                            ).strftime(
-                                "%d-%m-%Y"
-                            )
-                        )
-                        break
-                    except:
-                        pass
-
-        all_bookings.extend(bookings)
-
-    # ---------- SORT LATEST FIRST ----------
-    all_bookings.sort(
-        key=lambda x: x.get(
-            "timestamp",
-            datetime.min
-        ),
-        reverse=True
-    )
+    # ---------- HISTORY ACROSS ALL CYCLES ----------
+    all_bookings = [
+        display_dates(b)
+        for b in get_customer_history(mobile)
+    ]
 
     total_spent = sum(
         b.get("price", 0)
@@ -1325,14 +1099,7 @@ def unlock_cycle(cycle_id):
         flash("❌ Invalid credentials!", "error")
         return redirect("/fancy_admin")
 
-    fancy_cycles.update_one(
-        {"_id": ObjectId(cycle_id)},
-        {
-            "$set": {
-                "edit_override": True
-            }
-        }
-    )
+    set_cycle_edit_override(cycle_id, True)
 
     flash("🔓 Cycle unlocked successfully!", "success")
     return redirect("/fancy_admin")
@@ -1346,137 +1113,50 @@ def lock_cycle(cycle_id):
     if not session.get('logged_in'):
         return redirect(url_for('auth.login'))
 
-    fancy_cycles.update_one(
-        {"_id": ObjectId(cycle_id)},
-        {
-            "$set": {
-                "edit_override": False
-            }
-        }
-    )
+    set_cycle_edit_override(cycle_id, False)
 
     flash("🔒 Cycle locked successfully!", "success")
     return redirect("/fancy_admin")
 
-KNOWN_LOCALITIES_FANCY = [
-    "Lambha", "Dehgam", "Patan", "Palanpur", "Unjha", "Visnagar", "Mehsana", "Kalol", "Chhatral", "Kadi", "Himmatnagar", "Gandhinagar",
-    "Nadiad", "Anand", "Bakrol", "Vadtal", "Vadodara", "Surat", "Rajkot", "Kheda", "Sanand", "Dholka", "Bavla",
-    "Aslali", "Bareja", "Changodar", "Moraiya",
-    "Nava Vadaj", "Vadaj", "Jay Hind", "Arbuda Nagar", "Haridarshan", "Hathijan", "Vivekanand Nagar",
-    "Saijpur Bogha", "Saijpur", "Jivraj Park", "South Bopal", "Bopal", "Ghatlodiya", "Gordhanwadi", "Maniyasa", "Laxminarayan",
-    "Jashodanagar", "Jashoda Nagar", "Bhadwat Nagar", "Prahlad Nagar", "Prahladnagar", "Prerna Tirth", "Satelite",
-    "New Maninagar", "New Vatva", "Shahwadi", "Motipura", "Sureliya", "Khodiyar Nagar", "Rajendra Park", "Saheed Circle", "Aman Nagar",
-    "Vastral", "Maninagar", "Khokhra", "Isanpur", "Amraiwadi", "Ghodasar",
-    "Vatva", "Odhav", "Hatkeshwar", "CTM", "Nikol", "Ramol", "Narol",
-    "Bapunagar", "Saraspur", "Asarwa", "Shahibaug", "Naroda", "Rakhial",
-    "Sarangpur", "Kalupur", "Astodia", "Raipur", "Lal Darwaja", "Geeta Mandir",
-    "Shahpur", "Dani Limda", "Navrangpura", "Satellite", "Vastrapur", "Bodakdev",
-    "Thaltej", "Sola", "Gota", "Ghatlodia", "Naranpura", "Paldi", "Vasna",
-    "Ranip", "Sabarmati", "Chandkheda"
-]
-
-AREA_COORDINATES_FANCY = {
-    "Lambha": [22.9238, 72.5843],
-    "Dehgam": [23.1670, 72.8120],
-    "Patan": [23.8493, 72.1266],
-    "Palanpur": [24.1724, 72.4346],
-    "Unjha": [23.8043, 72.3942],
-    "Visnagar": [23.6961, 72.5484],
-    "Mehsana": [23.5880, 72.3693],
-    "Kalol": [23.2393, 72.4962],
-    "Chhatral": [23.2800, 72.4500],
-    "Kadi": [23.3000, 72.3300],
-    "Himmatnagar": [23.5979, 72.9698],
-    "Gandhinagar": [23.2156, 72.6369],
-    "Nadiad": [22.6916, 72.8634],
-    "Anand": [22.5645, 72.9289],
-    "Bakrol": [22.5480, 72.9350],
-    "Vadtal": [22.5920, 72.8880],
-    "Vadodara": [22.3072, 73.1812],
-    "Surat": [21.1702, 72.8311],
-    "Rajkot": [22.3039, 70.8022],
-    "Kheda": [22.7500, 72.6800],
-    "Sanand": [22.9910, 72.3810],
-    "Dholka": [22.7200, 72.4700],
-    "Bavla": [22.8300, 72.3600],
-    "Aslali": [22.9210, 72.6010],
-    "Bareja": [22.8850, 72.6050],
-    "Changodar": [22.9230, 72.4410],
-    "Moraiya": [22.9150, 72.4350],
-    "Nava Vadaj": [23.0640, 72.5690],
-    "Vadaj": [23.0640, 72.5690],
-    "Jay Hind": [22.9920, 72.5980],
-    "Arbuda Nagar": [23.0250, 72.6630],
-    "Haridarshan": [23.0450, 72.6680],
-    "Hathijan": [22.9280, 72.6390],
-    "Vivekanand Nagar": [22.9280, 72.6390],
-    "Saijpur Bogha": [23.0640, 72.6280],
-    "Saijpur": [23.0640, 72.6280],
-    "Jivraj Park": [23.0010, 72.5410],
-    "South Bopal": [23.0300, 72.4640],
-    "Bopal": [23.0300, 72.4640],
-    "Ghatlodiya": [23.0682, 72.5358],
-    "Gordhanwadi": [22.9980, 72.5920],
-    "Maniyasa": [22.9976, 72.6009],
-    "Laxminarayan": [22.9554, 72.6240],
-    "Jashodanagar": [22.9850, 72.6250],
-    "Jashoda Nagar": [22.9850, 72.6250],
-    "Bhadwat Nagar": [22.9910, 72.6080],
-    "Prahlad Nagar": [23.0125, 72.5118],
-    "Prahladnagar": [23.0125, 72.5118],
-    "Prerna Tirth": [23.0300, 72.5176],
-    "Satelite": [23.0300, 72.5176],
-    "Vastral": [23.0041, 72.6617],
-    "Maninagar": [22.9976, 72.6009],
-    "New Maninagar": [22.9850, 72.6150],
-    "Khokhra": [22.9983, 72.6167],
-    "Isanpur": [22.9731, 72.5976],
-    "Amraiwadi": [23.0039, 72.6288],
-    "Ghodasar": [22.9815, 72.6094],
-    "Vatva": [22.9554, 72.6240],
-    "New Vatva": [22.9480, 72.6310],
-    "Odhav": [23.0232, 72.6698],
-    "Hatkeshwar": [23.0012, 72.6225],
-    "CTM": [22.9908, 72.6321],
-    "Nikol": [23.0483, 72.6717],
-    "Ramol": [22.9840, 72.6582],
-    "Narol": [22.9634, 72.5891],
-    "Shahwadi": [22.9570, 72.5780],
-    "Motipura": [22.9610, 72.5820],
-    "Sureliya": [23.0010, 72.6510],
-    "Khodiyar Nagar": [23.0390, 72.6350],
-    "Rajendra Park": [23.0210, 72.6610],
-    "Aman Nagar": [23.0240, 72.6650],
-    "Saheed Circle": [23.0490, 72.6730],
-    "Bapunagar": [23.0371, 72.6231],
-    "Saraspur": [23.0298, 72.6080],
-    "Asarwa": [23.0494, 72.6033],
-    "Shahibaug": [23.0560, 72.5925],
-    "Naroda": [23.0725, 72.6656],
-    "Rakhial": [23.0180, 72.6210],
-    "Sarangpur": [23.0215, 72.5990],
-    "Kalupur": [23.0260, 72.5950],
-    "Astodia": [23.0170, 72.5910],
-    "Raipur": [23.0185, 72.5940],
-    "Lal Darwaja": [23.0240, 72.5810],
-    "Geeta Mandir": [23.0110, 72.5880],
-    "Shahpur": [23.0350, 72.5780],
-    "Dani Limda": [22.9950, 72.5810],
-    "Navrangpura": [23.0366, 72.5611],
-    "Satellite": [23.0300, 72.5176],
-    "Vastrapur": [23.0350, 72.5293],
-    "Bodakdev": [23.0410, 72.5115],
-    "Thaltej": [23.0500, 72.5070],
-    "Sola": [23.0680, 72.5180],
-    "Gota": [23.0970, 72.5310],
-    "Ghatlodia": [23.0682, 72.5358],
-    "Naranpura": [23.0520, 72.5530],
-    "Paldi": [23.0120, 72.5620],
-    "Vasna": [22.9980, 72.5520],
-    "Ranip": [23.0800, 72.5710],
-    "Sabarmati": [23.0845, 72.5802],
-    "Chandkheda": [23.1114, 72.5835]
-}
+
+def directory_query(search, area):
+    """Filter of the fancy directory for a search text and a map area"""
+    query = {}
+    if search:
+        query["$or"] = [
+            {"name": {"$regex": search, "$options": "i"}},
+            {"mobile": {"$regex": search, "$options": "i"}},
+            {"school": {"$regex": search, "$options": "i"}},
+            {"address": {"$regex": search, "$options": "i"}}
+        ]
+    if area:
+        query.update(area_query(area))
+    return query
+
+
+def directory_page(args):
+    """(customers, next_cursor) of one directory page for request args"""
+    query = directory_query(args.get("search", "").strip(), args.get("area", "").strip())
+
+    customers, next_cursor = keyset_page(
+        fcustomers, query, projection("fancy_customers"),
+        page_size(args.get("per_page")), args.get("after") or None
+    )
+    for c in customers:
+        c["mapped_locality"] = c.get("resolved_locality") or ""
+    return customers, next_cursor
+
+
+def directory_stats():
+    """Schools and updated-record counts of the directory header, cached like the areas"""
+    def build():
+        schools = [s for s in fcustomers.distinct("school") if s and s != '-']
+        return {
+            "schools": len(schools),
+            "updated": fcustomers.count_documents({"updated_at": {"$ne": None}})
+        }
+
+    return cached_result("directory_stats", fcustomers.name, build)
 
 
 @fancy.route("/fancy-customers")
@@ -1487,89 +1167,61 @@ def fancy_customers():
 
     search = request.args.get("search", "").strip()
 
-    query = {}
-
-    if search:
-        query = {
-            "$or": [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"mobile": {"$regex": search, "$options": "i"}},
-                {"school": {"$regex": search, "$options": "i"}},
-                {"address": {"$regex": search, "$options": "i"}}
-            ]
-        }
-
-    all_customers = list(fcustomers.find().sort("updated_at", -1))
-
-    # Dynamic Custom Localities Merge
-    from website.general.db import custom_localities
-    active_localities = list(KNOWN_LOCALITIES_FANCY)
-    active_coords = dict(AREA_COORDINATES_FANCY)
     try:
-        for cloc in custom_localities.find():
-            cname = cloc.get("name")
-            clat = cloc.get("lat")
-            clng = cloc.get("lng")
-            if cname and clat is not None and clng is not None:
-                if cname not in active_localities:
-                    active_localities.insert(0, cname)
-                active_coords[cname] = [float(clat), float(clng)]
-    except Exception:
-        pass
+        customers, next_cursor = directory_page(request.args)
+    except ValueError:
+        return redirect(url_for('fancy.fancy_customers', search=search or None))
 
-    # Area Strength Analytics & Verified Locality Mapping
-    from website.general.utils import resolve_customer_locality
-
-    area_counts = {}
-    total_with_addr = 0
-    unmapped_count = 0
-
-    for c in all_customers:
-        matched_loc = resolve_customer_locality(c, active_localities)
-        if matched_loc:
-            c["mapped_locality"] = matched_loc
-            area_counts[matched_loc] = area_counts.get(matched_loc, 0) + 1
-            total_with_addr += 1
-        else:
-            c["mapped_locality"] = ""
-            unmapped_count += 1
-
-    sorted_areas = sorted(area_counts.items(), key=lambda x: x[1], reverse=True)
-    top_areas = []
-    map_localities = []
-
-    for loc, count in sorted_areas:
-        pct = round((count / max(total_with_addr, 1)) * 100, 1)
-        item = {"area": loc, "count": count, "percentage": pct}
-        if len(top_areas) < 5:
-            top_areas.append(item)
-        if loc in active_coords:
-            item_map = dict(item)
-            item_map["lat"] = active_coords[loc][0]
-            item_map["lng"] = active_coords[loc][1]
-            map_localities.append(item_map)
-
-    id_to_loc = {str(c["_id"]): c.get("mapped_locality", "") for c in all_customers}
+    analytics = area_analytics(fcustomers)
 
+    total_count = analytics["total"]
     if search:
-        customers = list(fcustomers.find(query).sort("updated_at", -1))
-        for c in customers:
-            c["mapped_locality"] = id_to_loc.get(str(c["_id"]), "")
-    else:
-        customers = all_customers
+        total_count = fcustomers.count_documents(directory_query(search, ""))
+
+    stats = directory_stats()
 
     return render_template(
         "fancy/fancy_customers.html",
         customers=customers,
-        total_count=len(all_customers),
-        total_with_addr=total_with_addr,
-        unmapped_count=unmapped_count,
-        top_areas=top_areas,
-        map_localities=map_localities,
-        area_map_data=map_localities,
+        next_cursor=next_cursor,
+        per_page=page_size(request.args.get("per_page")),
+        total_count=total_count,
+        schools_count=stats["schools"],
+        updated_count=stats["updated"],
+        total_with_addr=analytics["total_with_addr"],
+        unmapped_count=analytics["unmapped_count"],
+        top_areas=analytics["top_areas"],
+        map_localities=analytics["map_localities"],
+        area_map_data=analytics["map_localities"],
         search=search
     )
 
+
+@fancy.route("/api/fancy-customers")
+def fancy_customers_page():
+    """Next page of the customer directory for infinite scroll"""
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    try:
+        customers, next_cursor = directory_page(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    offset = request.args.get("offset", 0, type=int)
+    data = {
+        "success": True,
+        "html": render_template("fancy/customer_rows.html", customers=customers, offset=offset),
+        "cards_html": render_template("fancy/customer_cards.html", customers=customers, offset=offset),
+        "count": len(customers),
+        "next": next_cursor
+    }
+    if not request.args.get("after"):
+        data["total"] = fcustomers.count_documents(
+            directory_query(request.args.get("search", "").strip(), request.args.get("area", "").strip())
+        )
+    return jsonify(data)
+
 @fancy.route(
     "/fancy-customer/<customer_id>",
     methods=["GET", "POST"]
@@ -1600,6 +1252,7 @@ def fancy_customer(customer_id):
                 }
             }
         )
+        on_customer_address_write(fcustomers, {"_id": ObjectId(customer_id)})
 
         flash("Customer Updated", "success")
 
@@ -1624,6 +1277,7 @@ def delete_fancy_customer(customer_id):
     fcustomers.delete_one(
         {"_id": ObjectId(customer_id)}
     )
+    directory_changed(fcustomers)
 
     flash("Customer Deleted", "success")
 
@@ -1,7 +1,104 @@
 # fservices.py
 
 from collections import Counter
+from datetime import datetime, time
 from .fmodels import *
+from .fsummary import sync_booking_summary, parse_booking_date
+from ..general.cache import bump_cycle_version
+from ..general.search import sync_search_document
+from ..general.indexes import CYCLE_INDEXES, apply_indexes
+from .finterval import booking_intervals
+from .fhistory import sync_booking_history
+
+_dated_collections = set()
+
+
+def on_booking_write(collection, booking_id):
+    """
+    Keeps the dashboard summary, customer history, search rows and cache
+    version of a fancy cycle in step with a booking that was just inserted, updated or
+    deleted.
+    """
+    try:
+        sync_booking_summary(collection, booking_id)
+    except Exception:
+        pass
+
+    try:
+        sync_booking_history(collection, booking_id)
+    except Exception:
+        pass
+
+    try:
+        sync_search_document(collection, "fancy", booking_id)
+    except Exception:
+        pass
+
+    try:
+        bump_cycle_version(collection.name)
+    except Exception:
+        pass
+
+
+# ------------------ BOOKING DATES ------------------
+
+def booking_dates(start_date, end_date):
+    """
+    {"start_at", "end_at"} datetimes (midnight) for the raw start/end dates
+    of a booking; None where a date cannot be read.
+    """
+    sd = parse_booking_date(start_date)
+    ed = parse_booking_date(end_date)
+    return {
+        "start_at": datetime.combine(sd, time.min) if sd else None,
+        "end_at": datetime.combine(ed, time.min) if ed else None
+    }
+
+
+def ensure_booking_dates(collection, force=False):
+    """
+    Creates the indexes of a fancy cycle collection and fills in
+    start_at/end_at on bookings saved before those fields existed.
+    Runs once per collection per process; returns the number backfilled.
+    """
+    if collection.name in _dated_collections and not force:
+        return 0
+
+    apply_indexes(collection, CYCLE_INDEXES["fancy"])
+
+    updated = 0
+    missing = {"start_at": {"$exists": False}}
+    for b in collection.find(missing, {"start_date": 1, "end_date": 1}):
+        collection.update_one(
+            {"_id": b["_id"]},
+            {"$set": booking_dates(b.get("start_date"), b.get("end_date"))}
+        )
+        updated += 1
+
+    _dated_collections.add(collection.name)
+    return updated
+
+
+def display_dates(b):
+    """Start/end shown as dd-mm-yyyy, read from start_at/end_at when set"""
+    for raw, at in (("start_date", "start_at"), ("end_date", "end_at")):
+        if isinstance(b.get(at), datetime):
+            b[raw] = b[at].strftime("%d-%m-%Y")
+    return b
+
+
+def tag_bookings(cycle_intervals, pick):
+    """
+    Runs pick(CycleIntervals) for every (cycle, intervals) pair and returns
+    copies of the bookings found, tagged with their cycle for the templates.
+    """
+    found = []
+    for cycle, intervals in cycle_intervals:
+        for b in pick(intervals):
+            b = dict(b, season=cycle["name"], cycle_id=str(cycle["_id"]))
+            found.append(display_dates(b))
+    return found
+
 
 def get_fancy_dashboard_data():
     bookings = get_all_fancy_bookings()
@@ -34,77 +131,17 @@ def get_fancy_dashboard_data():
         "top_school": sorted(school_counter.items(), key=lambda x: x[1], reverse=True),
     }   
 
-def format_date_safe(date):
-    from datetime import datetime
-
-    if isinstance(date, datetime):
-        return date.strftime("%d-%m-%Y")
-
-    if isinstance(date, str):
-        try:
-            return datetime.strptime(date, "%Y-%m-%d").strftime("%d-%m-%Y")
-        except:
-            return date
-
-    return date
-
-def get_fancy_profile_data(mobile, fancy_collection, fancy_2024_2025):
-    from datetime import datetime
-
-    all_bookings = []
-
-    for col, season in [
-        (fancy_2024_2025, "2024-2025"),
-        (fancy_collection, "2025-2026"),
-    ]:
-        bookings = list(col.find({"mobile": mobile}))
-
-        for b in bookings:
-            b["season"] = season
-            b["start_date"] = format_date_safe(b.get("start_date"))
-            b["end_date"] = format_date_safe(b.get("end_date"))
-
-        all_bookings.extend(bookings)
-
-    all_bookings.sort(
-        key=lambda x: x.get("timestamp", datetime.min),
-        reverse=True
-    )
-
-    total_spent = sum(b.get("price", 0) for b in all_bookings)
-
-    return all_bookings, total_spent
-
 def get_calendar_data(all_bookings, selected_date):
-    from datetime import datetime, timedelta
+    from datetime import datetime
 
-    booked_dates = set()
     today = datetime.now().date()
+    intervals = booking_intervals(all_bookings)
 
-    for b in all_bookings:
-        try:
-            sd = datetime.strptime(b['start_date'], '%d-%m-%Y').date()
-            ed = datetime.strptime(b['end_date'], '%d-%m-%Y').date()
-
-            cur = sd
-            while cur <= ed:
-                booked_dates.add(cur.strftime('%Y-%m-%d'))
-                cur += timedelta(days=1)
-        except:
-            pass
+    booked_dates = {d.strftime('%Y-%m-%d') for d in intervals.booked_days()}
 
     day_bookings = []
     if selected_date:
         sel = datetime.strptime(selected_date, '%Y-%m-%d').date()
+        day_bookings = intervals.active_on(sel)
 
-        for b in all_bookings:
-            try:
-                sd = datetime.strptime(b['start_date'], '%d-%m-%Y').date()
-                ed = datetime.strptime(b['end_date'], '%d-%m-%Y').date()
-
-                if sd <= sel <= ed:
-                    day_bookings.append(b)
-            except:
-                pass
-
-    return booked_dates, day_bookings, today
\ No newline at end of file
+    return booked_dates, day_bookings, today
@@ -0,0 +1,141 @@
+# fsummary.py
+#
+# Per-cycle dashboard summary for fancy bookings, kept current with `$inc`
+# deltas by on_booking_write(). See website/general/summaries.py.
+
+from datetime import datetime
+
+from website.general.summaries import (
+    path,
+    positive,
+    get_summary,
+    rebuild_summary,
+    sync_summary_part
+)
+
+KIND = "fancy"
+
+SUMMARY_PROJECTION = {
+    "mobile": 1, "details": 1, "school": 1, "costume": 1,
+    "taken": 1, "returned": 1, "price": 1,
+    "start_date": 1, "end_date": 1
+}
+
+
+def price_value(val):
+    """Booking price as stored (fbook saves floats); unreadable prices count as 0"""
+    if isinstance(val, bool):
+        return 0
+    if isinstance(val, (int, float)):
+        return val
+    try:
+        return float(str(val).strip())
+    except (ValueError, TypeError):
+        return 0
+
+
+def parse_booking_date(d):
+    if not d:
+        return None
+    if isinstance(d, datetime):
+        return d.date()
+    if isinstance(d, str):
+        for fmt in ["%Y-%m-%d", "%d-%m-%Y", "%d-%m-%y"]:
+            try:
+                return datetime.strptime(d.strip(), fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def start_date_key(raw_date):
+    """Start date label the dashboards group by"""
+    if not raw_date:
+        return None
+    if isinstance(raw_date, datetime):
+        return raw_date.strftime("%d-%m-%Y")
+    return str(raw_date).strip() or None
+
+
+def booking_part(doc):
+    """(counter increments, extra fields) contributed by one fancy booking"""
+    inc = {}
+
+    def add(p, v):
+        if v:
+            inc[p] = inc.get(p, 0) + v
+
+    price = price_value(doc.get("price"))
+    taken = bool(doc.get("taken"))
+    returned = bool(doc.get("returned"))
+
+    add("totals.bookings", 1)
+    add("totals.revenue", price)
+    add("totals.returned", int(returned))
+    add("totals.taken", int(taken))
+    add("totals.not_returned", int(taken and not returned))
+
+    if doc.get("mobile"):
+        add(path("mobiles", doc.get("mobile")), 1)
+
+    for field, bucket in (("details", "details"), ("school", "schools"), ("costume", "costumes")):
+        key = doc.get(field)
+        add(path(bucket, key, "count"), 1)
+        add(path(bucket, key, "revenue"), price)
+
+    start = start_date_key(doc.get("start_date"))
+    if start:
+        add(path("starts", start, "count"), 1)
+        add(path("starts", start, "revenue"), price)
+
+    costume = str(doc.get("costume") or "").strip().title()
+    sd = parse_booking_date(doc.get("start_date"))
+    ed = parse_booking_date(doc.get("end_date"))
+    if sd and ed and ed >= sd:
+        add(path("durations", costume, "days"), (ed - sd).days + 1)
+        add(path("durations", costume, "count"), 1)
+
+    return inc, {}
+
+
+def get_fancy_summary(collection):
+    return get_summary(collection, KIND, booking_part, SUMMARY_PROJECTION)
+
+
+def rebuild_fancy_summary(collection):
+    return rebuild_summary(collection, KIND, booking_part, SUMMARY_PROJECTION)
+
+
+def sync_booking_summary(collection, booking_id):
+    sync_summary_part(collection, booking_id, booking_part, SUMMARY_PROJECTION)
+
+
+def summary_kpis(collection):
+    """
+    Fancy KPIs (totals, active customers and the per-details, school,
+    costume and start date counters) read from the cycle summary document
+    instead of aggregating the bookings.
+    """
+    summary = get_fancy_summary(collection)
+    totals = dict(summary.get("totals", {}))
+    for k in ("bookings", "revenue", "returned", "taken", "not_returned"):
+        totals.setdefault(k, 0)
+    totals["active_customers"] = len(positive(summary.get("mobiles")))
+
+    def counters(bucket):
+        return [
+            {"key": k, "count": v.get("count", 0), "revenue": v.get("revenue", 0)}
+            for k, v in positive(summary.get(bucket), "count").items()
+        ]
+
+    return {
+        "totals": totals,
+        "by_details": counters("details"),
+        "by_school": counters("schools"),
+        "by_costume": counters("costumes"),
+        "by_start_date": counters("starts"),
+        "durations": [
+            {"costume": k, "days": v.get("days", 0), "count": v.get("count", 0)}
+            for k, v in positive(summary.get("durations"), "count").items()
+        ]
+    }
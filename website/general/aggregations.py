@@ -0,0 +1,39 @@
+# aggregations.py
+#
+# Server-side reductions for the dashboard figures the cycle summaries
+# (summaries.py) do not keep, mostly those spanning every cycle. Each
+# helper runs a $group pipeline per collection and hands back plain Python
+# values, so only the grouped rows travel from the cluster instead of
+# every booking document.
+
+def customer_totals(collections, limit=None):
+    """
+    [{name, mobile, total_amount, total_bookings}] of the customers of the
+    given fancy cycle collections, by mobile number, highest total first.
+    The name is the one on the customer's first booking.
+    """
+    pipeline = [
+        {"$match": {"mobile": {"$nin": [None, ""]}}},
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": "$mobile",
+            "name": {"$first": {"$ifNull": ["$name", "Unknown"]}},
+            "total_amount": {"$sum": "$price"},
+            "total_bookings": {"$sum": 1}
+        }}
+    ]
+
+    totals = {}
+    for collection in collections:
+        for row in collection.aggregate(pipeline, allowDiskUse=True):
+            entry = totals.setdefault(row["_id"], {
+                "name": row["name"],
+                "mobile": row["_id"],
+                "total_amount": 0,
+                "total_bookings": 0
+            })
+            entry["total_amount"] += row["total_amount"]
+            entry["total_bookings"] += row["total_bookings"]
+
+    ranked = sorted(totals.values(), key=lambda c: c["total_amount"], reverse=True)
+    return ranked[:limit] if limit else ranked
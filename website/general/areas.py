@@ -0,0 +1,184 @@
+# areas.py
+#
+# Localities of the customer directories (Navaratri_Customers and
+# Fancy_Customers).
+#
+# Every customer record stores what it resolves to against the gazetteer:
+# `resolved_locality`, `resolved_coords` and `locality_version`, the stamp
+# of the gazetteer it was resolved with. Records are re-resolved when their
+# address is written (on_customer_address_write) and, in the background,
+# when the gazetteer's stamp no longer matches theirs. The area analytics
+# are then a $group over the indexed field, cached until
+# directory_changed() bumps the directory or Custom_Localities.
+
+import logging
+import threading
+
+from pymongo import UpdateOne
+
+from website.general.autocomplete import autocomplete_changed
+from website.general.cache import bump_cycle_version, cached_result
+from website.general.db import custom_localities
+from website.general.gazetteer import get_gazetteer
+
+logger = logging.getLogger(__name__)
+
+TOP_AREAS = 5
+RERESOLVE_BATCH = 500
+
+# Customer fields a resolution reads
+RESOLVE_FIELDS = {"address": 1, "locality": 1}
+
+_reresolving = set()
+_reresolving_lock = threading.Lock()
+
+
+# ------------------ STORED RESOLUTION ------------------
+
+def clean_address(address):
+    return (address or "").replace('\r', ' ').replace('\n', ' ').strip()
+
+
+def resolved_fields(gazetteer, customer):
+    """The stored resolution of a customer document"""
+    loc = gazetteer.matcher.resolve(dict(customer, address=clean_address(customer.get("address"))))
+    return {
+        "resolved_locality": loc or None,
+        "resolved_coords": gazetteer.coords(loc),
+        "locality_version": gazetteer.stamp
+    }
+
+
+def on_customer_address_write(customers, query):
+    """
+    Re-resolves the customers matching `query` after their address or
+    locality was written, then marks the directory as changed.
+    """
+    try:
+        gazetteer = get_gazetteer()
+        for doc in customers.find(query, RESOLVE_FIELDS):
+            customers.update_one({"_id": doc["_id"]}, {"$set": resolved_fields(gazetteer, doc)})
+    except Exception as e:
+        logger.warning("Could not resolve the locality of %s %s: %s", customers.name, query, e)
+    directory_changed(customers)
+
+
+def stale_query(stamp):
+    return {"locality_version": {"$ne": stamp}}
+
+
+def reresolve_stale(customers, batch_size=RERESOLVE_BATCH):
+    """
+    Re-resolves every record not stamped with the current gazetteer, in
+    batches. Returns the number of records updated.
+    """
+    gazetteer = get_gazetteer()
+    updated = 0
+    while True:
+        docs = list(customers.find(stale_query(gazetteer.stamp), RESOLVE_FIELDS).limit(batch_size))
+        if not docs:
+            break
+        customers.bulk_write(
+            [UpdateOne({"_id": d["_id"]}, {"$set": resolved_fields(gazetteer, d)}) for d in docs],
+            ordered=False
+        )
+        updated += len(docs)
+
+    if updated:
+        directory_changed(customers)
+    return updated
+
+
+def schedule_reresolve(customers):
+    """
+    Runs reresolve_stale() on a background thread, one at a time per
+    directory in this process. Returns False when one is already running.
+    """
+    with _reresolving_lock:
+        if customers.name in _reresolving:
+            return False
+        _reresolving.add(customers.name)
+
+    def run():
+        try:
+            count = reresolve_stale(customers)
+            if count:
+                logger.info("Re-resolved %d localities in %s", count, customers.name)
+        except Exception as e:
+            logger.warning("Re-resolving localities of %s failed: %s", customers.name, e)
+        finally:
+            with _reresolving_lock:
+                _reresolving.discard(customers.name)
+
+    threading.Thread(target=run, name=f"reresolve-{customers.name}", daemon=True).start()
+    return True
+
+
+# ------------------ AREA ANALYTICS ------------------
+
+def _build(customers, gazetteer):
+    # Stale records count as stored until the job is done; it bumps the
+    # directory then, which rebuilds this
+    if customers.count_documents(stale_query(gazetteer.stamp), limit=1):
+        schedule_reresolve(customers)
+
+    counts = {}
+    total = 0
+    for row in customers.aggregate([
+        {"$sort": {"resolved_locality": 1}},
+        {"$group": {"_id": "$resolved_locality", "count": {"$sum": 1}}}
+    ]):
+        total += row["count"]
+        if row["_id"]:
+            counts[row["_id"]] = row["count"]
+
+    total_with_addr = sum(counts.values())
+    top_areas = []
+    map_localities = []
+    for loc, count in sorted(counts.items(), key=lambda x: x[1], reverse=True):
+        item = {"area": loc, "count": count, "percentage": round((count / max(total_with_addr, 1)) * 100, 1)}
+        if len(top_areas) < TOP_AREAS:
+            top_areas.append(item)
+        latlng = gazetteer.coords(loc)
+        if latlng:
+            map_localities.append(dict(item, lat=latlng[0], lng=latlng[1]))
+
+    return {
+        "total": total,
+        "total_with_addr": total_with_addr,
+        "unmapped_count": total - total_with_addr,
+        "top_areas": top_areas,
+        "map_localities": map_localities,
+        "localities": list(gazetteer.names)
+    }
+
+
+def area_analytics(customers):
+    """
+    Cached area analytics of a customer directory. The returned dict is
+    shared between requests and must not be modified.
+    """
+    return cached_result(
+        f"areas:{customers.name}",
+        [customers.name, custom_localities.name],
+        lambda: _build(customers, get_gazetteer())
+    )
+
+
+def area_query(area):
+    """Filter of the customers resolved to `area`"""
+    return {"resolved_locality": area}
+
+
+def unmapped_query():
+    return {"resolved_locality": None}
+
+
+def directory_changed(*collections):
+    """Call after writing to a customer directory or to Custom_Localities"""
+    for coll in collections:
+        try:
+            bump_cycle_version(coll.name)
+        except Exception:
+            pass
+    autocomplete_changed()
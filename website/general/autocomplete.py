@@ -0,0 +1,258 @@
+# autocomplete.py
+#
+# Typeahead for the booking forms: prefix tries over product codes
+# (Storage, or the inventory codes while it is empty), customer mobiles and
+# normalized customer names of Navaratri_Customers and Fancy_Customers.
+#
+# The tries live in process memory, so a keypress is answered without a
+# database read. The version counters of the three collections are checked
+# at most every AUTOCOMPLETE_RECHECK seconds (right away after a write made
+# by this process); when a directory's moved, only the customers written
+# since the last load (by updated_at) are merged in, and a directory whose
+# size no longer matches is reloaded whole, which is how deletes show up.
+
+import os
+import re
+import threading
+import time
+
+from website.general.cache import get_cycle_versions
+from website.general.db import ncustomers, fcustomers, products
+from website.navaratri.nindex import INVENTORY_CODES, normalize_product_code
+
+AUTOCOMPLETE_RECHECK = float(os.environ.get("AUTOCOMPLETE_RECHECK", 2))
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+CUSTOMER_FIELDS = {"name": 1, "Name": 1, "mobile": 1, "address": 1, "group": 1, "reference": 1, "updated_at": 1}
+
+_index = None
+_index_lock = threading.Lock()
+
+
+# ------------------ TRIE ------------------
+
+class PrefixTrie:
+    """
+    Keys mapped to {ident: payload}. top() walks the subtree of a prefix in
+    key order and stops after n distinct idents.
+    """
+
+    _END = ""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, key, ident, payload):
+        node = self.root
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node.setdefault(self._END, {})[ident] = payload
+
+    def discard(self, key, ident):
+        path = [self.root]
+        for ch in key:
+            node = path[-1].get(ch)
+            if node is None:
+                return
+            path.append(node)
+        entries = path[-1].get(self._END)
+        if not entries:
+            return
+        entries.pop(ident, None)
+        if not entries:
+            del path[-1][self._END]
+        # Prune the branch back up to the last node still in use
+        for ch, parent in zip(reversed(key), reversed(path[:-1])):
+            if parent[ch]:
+                break
+            del parent[ch]
+
+    def top(self, prefix, n):
+        """[(key, ident, payload)] of the first n idents under `prefix`"""
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+
+        found = []
+        seen = set()
+        stack = [(prefix, node)]
+        while stack and len(found) < n:
+            key, node = stack.pop()
+            for ident, payload in node.get(self._END, {}).items():
+                if ident not in seen:
+                    seen.add(ident)
+                    found.append((key, ident, payload))
+                    if len(found) >= n:
+                        break
+            children = sorted((ch for ch in node if ch != self._END), reverse=True)
+            stack.extend((key + ch, node[ch]) for ch in children)
+        return found
+
+
+# ------------------ KEYS ------------------
+
+def normalize_name(name):
+    """Lowercase words of a name, single spaced"""
+    return " ".join(re.findall(r'[0-9a-z]+', str(name or "").lower()))
+
+
+def name_keys(name):
+    """The normalized name and each of its trailing word runs ("patel" of "ramesh patel")"""
+    words = normalize_name(name).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def mobile_key(mobile):
+    digits = re.sub(r'\D', '', str(mobile or ""))
+    return digits[-10:] if len(digits) > 10 else digits
+
+
+# ------------------ INDEX ------------------
+
+class AutocompleteIndex:
+    """Product code, mobile and name tries of this process"""
+
+    def __init__(self):
+        self.products = PrefixTrie()
+        self.mobiles = PrefixTrie()
+        self.names = PrefixTrie()
+        self.sources = {ncustomers.name: ("Navaratri", ncustomers), fcustomers.name: ("Fancy Dress", fcustomers)}
+
+        self._keys = {}
+        self._idents = {name: set() for name in self.sources}
+        self._watermarks = {}
+        self._versions = {}
+        self._product_codes = []
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    # ---- loading ----
+
+    def _forget(self, ident):
+        for trie, key in self._keys.pop(ident, ()):
+            trie.discard(key, ident)
+
+    def _add_customer(self, coll_name, system, doc):
+        ident = (coll_name, str(doc["_id"]))
+        self._forget(ident)
+        self._idents[coll_name].add(ident)
+
+        name = (doc.get("name") or doc.get("Name") or "").strip()
+        payload = {
+            "name": name,
+            "mobile": doc.get("mobile", ""),
+            "address": doc.get("address", ""),
+            "group": doc.get("group", ""),
+            "reference": doc.get("reference", ""),
+            "system": system
+        }
+        keys = []
+        mobile = mobile_key(doc.get("mobile"))
+        if mobile:
+            keys.append((self.mobiles, mobile))
+        keys.extend((self.names, key) for key in name_keys(name))
+        for trie, key in keys:
+            trie.add(key, ident, payload)
+        self._keys[ident] = keys
+
+        updated_at = doc.get("updated_at")
+        if updated_at and (coll_name not in self._watermarks or updated_at > self._watermarks[coll_name]):
+            self._watermarks[coll_name] = updated_at
+
+    def _load_customers(self, coll_name):
+        system, coll = self.sources[coll_name]
+        watermark = self._watermarks.get(coll_name)
+        if watermark is not None:
+            # Written since the last load; >= as writes can share a timestamp
+            for doc in coll.find({"updated_at": {"$gte": watermark}}, CUSTOMER_FIELDS):
+                self._add_customer(coll_name, system, doc)
+            if coll.count_documents({}) == len(self._idents[coll_name]):
+                return
+
+        for ident in self._idents[coll_name]:
+            self._forget(ident)
+        self._idents[coll_name] = set()
+        self._watermarks.pop(coll_name, None)
+        for doc in coll.find({}, CUSTOMER_FIELDS):
+            self._add_customer(coll_name, system, doc)
+
+    def _load_products(self):
+        codes = sorted({str(p["_id"]) for p in products.find({}, {"_id": 1})}) or list(INVENTORY_CODES)
+        self.products = PrefixTrie()
+        for code in codes:
+            self.products.add(normalize_product_code(code).lower(), code, code)
+        self._product_codes = codes
+
+    def refresh(self, force=False):
+        """Merges in what changed, at most every AUTOCOMPLETE_RECHECK seconds"""
+        if not force and time.monotonic() - self._checked_at < AUTOCOMPLETE_RECHECK:
+            return
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < AUTOCOMPLETE_RECHECK:
+                return
+            versions = get_cycle_versions([products.name] + list(self.sources))
+            for name, version in versions.items():
+                if self._versions.get(name) == version:
+                    continue
+                if name == products.name:
+                    self._load_products()
+                else:
+                    self._load_customers(name)
+                self._versions[name] = version
+            self._checked_at = time.monotonic()
+
+    def mark_stale(self):
+        """Makes the next lookup re-check the version counters"""
+        self._checked_at = 0
+
+    # ---- lookups ----
+
+    def product_codes(self):
+        self.refresh()
+        return list(self._product_codes)
+
+    def suggest_products(self, prefix, limit=DEFAULT_LIMIT):
+        self.refresh()
+        key = normalize_product_code(prefix).lower()
+        return [code for _, _, code in self.products.top(key, limit)]
+
+    def suggest_customers(self, prefix, limit=DEFAULT_LIMIT, system=None):
+        """
+        Customers whose mobile (for a numeric prefix) or one of whose name
+        words starts with `prefix`, optionally of one system only.
+        """
+        self.refresh()
+        digits = re.sub(r'\D', '', prefix or "")
+        if digits and digits == re.sub(r'\s', '', prefix or ""):
+            trie, key = self.mobiles, digits
+        else:
+            trie, key = self.names, normalize_name(prefix)
+        if not key:
+            return []
+
+        wanted = limit if system is None else limit * 4
+        found = [payload for _, _, payload in trie.top(key, wanted)]
+        if system is not None:
+            found = [p for p in found if p["system"] == system]
+        return found[:limit]
+
+
+def get_autocomplete():
+    """The AutocompleteIndex of this process, loaded on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = AutocompleteIndex()
+                index.refresh(force=True)
+                _index = index
+    return _index
+
+
+def autocomplete_changed():
+    """Call after writing a customer directory or Storage from this process"""
+    if _index is not None:
+        _index.mark_stale()
@@ -0,0 +1,185 @@
+# cache.py
+#
+# Process-local result cache for the dashboards. Entries expire after a TTL,
+# the least recently used entry is evicted when the cache is full, and every
+# key carries the version counters of the cycles it was computed from, so a
+# write anywhere (any worker) makes the old entry unreachable.
+#
+# Also home of the per-request memo on flask.g and the process-wide cycle
+# registries used by ncycle/fcycle.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from bson import ObjectId
+from flask import g, has_request_context
+from pymongo import ReturnDocument
+
+from website.general.db import db
+
+cycle_versions = db["cycle_versions"]
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=32, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+dashboard_cache = TTLCache(
+    maxsize=int(os.environ.get("DASHBOARD_CACHE_SIZE", 32)),
+    ttl=float(os.environ.get("DASHBOARD_CACHE_TTL", 60))
+)
+
+
+# ------------------ VERSION COUNTERS ------------------
+
+def get_cycle_version(name):
+    doc = cycle_versions.find_one({"_id": name}, {"v": 1})
+    return doc["v"] if doc else 0
+
+
+def get_cycle_versions(names):
+    """{name: version} for several cycles in one query"""
+    names = list(names)
+    found = {d["_id"]: d["v"] for d in cycle_versions.find({"_id": {"$in": names}}, {"v": 1})}
+    return {name: found.get(name, 0) for name in names}
+
+
+def bump_cycle_version(name):
+    """Marks everything derived from `name` as stale; returns the new version"""
+    doc = cycle_versions.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"v": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["v"]
+
+
+def cached_result(kind, names, builder):
+    """
+    Returns builder() for the given cycle collection names, reusing a
+    cached result while none of their versions has moved.
+    """
+    if isinstance(names, str):
+        names = [names]
+    versions = get_cycle_versions(names)
+    key = (kind,) + tuple(sorted(versions.items()))
+
+    result = dashboard_cache.get(key)
+    if result is None:
+        result = builder()
+        dashboard_cache.set(key, result)
+    return result
+
+
+# ------------------ REQUEST MEMO ------------------
+
+def request_memo():
+    """Dict living on flask.g for the current request, or None outside one"""
+    if not has_request_context():
+        return None
+    if not hasattr(g, "_memo"):
+        g._memo = {}
+    return g._memo
+
+
+# ------------------ CYCLE REGISTRY ------------------
+
+class CycleRegistry:
+    """
+    Process-wide copy of a cycles collection (a handful of small documents).
+
+    The copy is reloaded when the collection's version counter has moved,
+    checked at most once per request, or after `max_age` seconds as a
+    safety net for edits made outside the app.
+    """
+
+    def __init__(self, cycles_collection, max_age=300):
+        self.collection = cycles_collection
+        self.key = cycles_collection.name
+        self.max_age = max_age
+        self._cycles = None
+        self._version = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        memo = request_memo()
+        if memo is None:
+            return get_cycle_version(self.key)
+        memo_key = ("cycle_registry_version", self.key)
+        if memo_key not in memo:
+            memo[memo_key] = get_cycle_version(self.key)
+        return memo[memo_key]
+
+    def _load(self):
+        version = self._current_version()
+        with self._lock:
+            stale = (
+                self._cycles is None
+                or self._version != version
+                or time.monotonic() - self._loaded_at > self.max_age
+            )
+            if stale:
+                self._cycles = list(self.collection.find().sort("created_at", -1))
+                self._version = version
+                self._loaded_at = time.monotonic()
+            return self._cycles
+
+    def all(self):
+        return [dict(c) for c in self._load()]
+
+    def find(self, **fields):
+        """First cycle whose fields equal `fields`, or None"""
+        for cycle in self._load():
+            if all(cycle.get(k) == v for k, v in fields.items()):
+                return dict(cycle)
+        return None
+
+    def by_id(self, cycle_id):
+        try:
+            return self.find(_id=ObjectId(cycle_id))
+        except Exception:
+            return None
+
+    def invalidate(self):
+        """Call after any write to the cycles collection"""
+        bump_cycle_version(self.key)
+        with self._lock:
+            self._cycles = None
+        memo = request_memo()
+        if memo is not None:
+            memo.clear()
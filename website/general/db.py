@@ -1,14 +1,15 @@
 import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
 
+from website.general.mongo import get_client, get_db
+
 load_dotenv()
 
 mongo_url = os.environ.get("client")
 
-client = MongoClient(mongo_url, tls=True, tlsAllowInvalidCertificates=True)
+client = get_client()
 
-db = client["Image_Traditional"]
+db = get_db()
 
 collection = db["Form"]
 fancy_2024_2025 = db["Fancy"]
@@ -0,0 +1,192 @@
+# gazetteer.py
+#
+# Every locality the app knows: data/localities.json (the Ahmedabad areas,
+# then the Gujarat towns, in matching priority) plus Custom_Localities,
+# which come first and override the dataset.
+#
+# A Gazetteer holds case-folded name -> canonical name / coordinates maps
+# for O(1) lookups, a grid of 0.05 degree cells for nearest-locality
+# queries, and the compiled LocalityMatcher over its names. One instance
+# is shared per process and rebuilt only when Custom_Localities' version
+# moves.
+
+import hashlib
+import json
+import math
+import os
+import threading
+from functools import lru_cache
+
+from website.general.cache import get_cycle_version, request_memo
+from website.general.db import custom_localities
+from website.general.utils import LocalityMatcher
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'localities.json')
+
+# Fallback position for a locality without coordinates (Ahmedabad centre)
+DEFAULT_COORDS = [23.0225, 72.5714]
+
+GRID_DEG = 0.05
+KM_PER_DEG = 111.32
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def base_localities():
+    """((name, [lat, lng])...) of the shipped dataset, in priority order"""
+    with open(GAZETTEER_FILE, 'r', encoding='utf-8') as f:
+        rows = json.load(f)
+    return tuple((row["name"], [float(row["lat"]), float(row["lng"])]) for row in rows)
+
+
+def custom_entries():
+    """[(name, [lat, lng] or None)] of Custom_Localities"""
+    entries = []
+    try:
+        for cloc in custom_localities.find({}, {"name": 1, "lat": 1, "lng": 1}):
+            name = (cloc.get("name") or "").strip()
+            if not name:
+                continue
+            latlng = None
+            if cloc.get("lat") is not None and cloc.get("lng") is not None:
+                latlng = [float(cloc["lat"]), float(cloc["lng"])]
+            entries.append((name, latlng))
+    except Exception:
+        pass
+    return entries
+
+
+def _cell(lat, lng):
+    return int(math.floor(lat / GRID_DEG)), int(math.floor(lng / GRID_DEG))
+
+
+def distance_km(a, b):
+    """Great-circle distance between two [lat, lng] points"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(min(1.0, math.sqrt(h)))
+
+
+class Gazetteer:
+    """
+    Lookups over one set of localities. `entries` are (name, [lat, lng] or
+    None) in priority order; the first spelling of a name is canonical and
+    the first coordinates given for it are kept.
+    """
+
+    def __init__(self, entries, version=None):
+        self.version = version
+        self.names = []
+        self._canonical = {}
+        self._coords = {}
+        for name, latlng in entries:
+            key = name.casefold()
+            if key not in self._canonical:
+                self._canonical[key] = name
+                self.names.append(name)
+            if latlng and key not in self._coords:
+                self._coords[key] = latlng
+
+        self._grid = {}
+        for key, latlng in self._coords.items():
+            self._grid.setdefault(_cell(*latlng), []).append(self._canonical[key])
+        rows = [i for i, _ in self._grid] or [0]
+        cols = [j for _, j in self._grid] or [0]
+        self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+        coords = {self._canonical[k]: v for k, v in self._coords.items()}
+        raw = json.dumps([self.names, sorted(coords.items())])
+        self.stamp = hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+        self._matcher = None
+        self._matcher_lock = threading.Lock()
+
+    def __contains__(self, name):
+        return bool(name) and name.casefold() in self._canonical
+
+    def canonical(self, name):
+        """Canonical spelling of a locality name, or None when unknown"""
+        return self._canonical.get(name.casefold()) if name else None
+
+    def coords(self, name):
+        """[lat, lng] of a locality name in any case, or None"""
+        return self._coords.get(name.casefold()) if name else None
+
+    def coordinates(self):
+        """{canonical name: [lat, lng]} of every locality with a position"""
+        return {self._canonical[k]: v for k, v in self._coords.items()}
+
+    @property
+    def matcher(self):
+        """LocalityMatcher over the names, compiled on first use"""
+        if self._matcher is None:
+            with self._matcher_lock:
+                if self._matcher is None:
+                    self._matcher = LocalityMatcher(self.names, self.version)
+        return self._matcher
+
+    def nearest(self, lat, lng, max_km=None):
+        """
+        (name, km) of the locality closest to a point, or None when there is
+        none (within `max_km`). Scans the grid in rings of cells around the
+        point and stops once no further ring can hold anything closer.
+        """
+        if not self._grid:
+            return None
+        origin = [float(lat), float(lng)]
+        ci, cj = _cell(*origin)
+        # Width of one ring in km, taken along the narrower longitude axis
+        ring_km = GRID_DEG * KM_PER_DEG * max(math.cos(math.radians(origin[0])), 0.01)
+        lo_i, hi_i, lo_j, hi_j = self._bounds
+        last_ring = max(abs(ci - lo_i), abs(ci - hi_i), abs(cj - lo_j), abs(cj - hi_j))
+        if max_km is not None:
+            last_ring = min(last_ring, int(max_km / ring_km) + 1)
+
+        best = None
+        for r in range(last_ring + 1):
+            for i in range(ci - r, ci + r + 1):
+                for j in range(cj - r, cj + r + 1):
+                    if r and abs(i - ci) != r and abs(j - cj) != r:
+                        continue
+                    for name in self._grid.get((i, j), ()):
+                        km = distance_km(origin, self._coords[name.casefold()])
+                        if best is None or km < best[1]:
+                            best = (name, km)
+            if best and best[1] <= r * ring_km:
+                break
+
+        if best is None or (max_km is not None and best[1] > max_km):
+            return None
+        return best[0], round(best[1], 2)
+
+
+def gazetteer_version():
+    """Version of Custom_Localities, read at most once per request"""
+    memo = request_memo()
+    if memo is None:
+        return get_cycle_version(custom_localities.name)
+    key = ("gazetteer_version",)
+    if key not in memo:
+        memo[key] = get_cycle_version(custom_localities.name)
+    return memo[key]
+
+
+def get_gazetteer():
+    """The shared Gazetteer of the current Custom_Localities version"""
+    global _gazetteer
+    version = gazetteer_version()
+    current = _gazetteer
+    if current is not None and current.version == version:
+        return current
+
+    with _gazetteer_lock:
+        if _gazetteer is None or _gazetteer.version != version:
+            _gazetteer = Gazetteer(custom_entries() + list(base_localities()), version)
+        return _gazetteer
+
+
+def get_locality_matcher():
+    """The compiled matcher of the current gazetteer"""
+    return get_gazetteer().matcher
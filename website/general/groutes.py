@@ -17,6 +17,18 @@ from website.navaratri.ncycle import (
     get_selected_cycle as get_selected_nav_cycle,
     get_active_cycle as get_active_nav_cycle
 )
+from website.general.areas import (
+    area_analytics,
+    clean_address,
+    directory_changed,
+    on_customer_address_write,
+    unmapped_query
+)
+from website.general.autocomplete import DEFAULT_LIMIT, MAX_LIMIT, get_autocomplete
+from website.general.gazetteer import DEFAULT_COORDS, get_gazetteer
+from website.general.jobs import get_job, job_status
+from website.general.pagination import keyset_page, page_size
+from website.general.projections import projection
 
 general = Blueprint('general',__name__)
 
@@ -166,93 +178,109 @@ def fancy_sub(sub):
 
 
 # ------------------ Page: Unified Address Resolver & Geocoding Manager ------------------
+UNMAPPED_SYSTEMS = [("Navaratri", "n"), ("Fancy Dress", "f")]
+
+
+def unmapped_systems():
+    """{system: customer collection} of the directories the resolver covers"""
+    from website.general.db import ncustomers, fcustomers
+
+    return {"Navaratri": ncustomers, "Fancy Dress": fcustomers}
+
+
+def unmapped_page(args):
+    """
+    One page of unmapped customers, navaratri ones first, then fancy.
+    The cursor is "<system key>:<keyset cursor within that system>".
+    Returns (customers, next_cursor).
+    """
+    systems = unmapped_systems()
+    chosen = [(name, key) for name, key in UNMAPPED_SYSTEMS if args.get("system", "all") in ("all", name)]
+    per_page = page_size(args.get("per_page"))
+    search = args.get("search", "").strip()
+
+    after = args.get("after") or ""
+    if after:
+        start_key, _, keyset_after = after.partition(":")
+    else:
+        start_key, keyset_after = chosen[0][1] if chosen else "", ""
+    keys = [key for _, key in chosen]
+    if chosen and start_key not in keys:
+        raise ValueError("Invalid page cursor")
+
+    customers = []
+    next_cursor = None
+    for i, (name, key) in enumerate(chosen):
+        if keys.index(key) < keys.index(start_key):
+            continue
+        coll = systems[name]
+        query = unmapped_query()
+        if search:
+            query["$or"] = [
+                {"name": {"$regex": search, "$options": "i"}},
+                {"mobile": {"$regex": search, "$options": "i"}},
+                {"address": {"$regex": search, "$options": "i"}}
+            ]
+
+        docs, keyset_next = keyset_page(
+            coll, query, projection("unmapped_customers"),
+            per_page - len(customers), (keyset_after or None) if key == start_key else None
+        )
+        for c in docs:
+            c['address'] = clean_address(c.get("address"))
+            c['_id_str'] = str(c['_id'])
+            c['system'] = name
+        customers.extend(docs)
+
+        if keyset_next:
+            next_cursor = f"{key}:{keyset_next}"
+            break
+        if len(customers) >= per_page:
+            if i + 1 < len(chosen):
+                next_cursor = f"{chosen[i + 1][1]}:"
+            break
+    return customers, next_cursor
+
+
 @general.route("/address_manager")
 def address_manager():
     if not session.get('logged_in'):
         return redirect(url_for('auth.login'))
 
-    from website.general.db import ncustomers, fcustomers, custom_localities
-    from website.navaratri.nroutes import KNOWN_LOCALITIES
-
-    merged_localities = list(KNOWN_LOCALITIES)
+    systems = {name: area_analytics(coll) for name, coll in unmapped_systems().items()}
     try:
-        for cloc in custom_localities.find():
-            cname = cloc.get("name")
-            if cname and cname not in merged_localities:
-                merged_localities.insert(0, cname)
-    except Exception:
-        pass
-
-    from website.general.utils import resolve_customer_locality
-
-    n_custs = list(ncustomers.find().sort("updated_at", -1))
-    f_custs = list(fcustomers.find().sort("updated_at", -1))
-
-    unmapped_navaratri = []
-    for c in n_custs:
-        raw_addr = (c.get("address") or "").replace('\r', ' ').replace('\n', ' ').strip()
-        c['address'] = raw_addr
-        matched_loc = resolve_customer_locality(c, merged_localities)
-        if not matched_loc:
-            c['_id_str'] = str(c['_id'])
-            c['system'] = 'Navaratri'
-            unmapped_navaratri.append(c)
-
-    unmapped_fancy = []
-    for c in f_custs:
-        raw_addr = (c.get("address") or "").replace('\r', ' ').replace('\n', ' ').strip()
-        c['address'] = raw_addr
-        matched_loc = resolve_customer_locality(c, merged_localities)
-        if not matched_loc:
-            c['_id_str'] = str(c['_id'])
-            c['system'] = 'Fancy Dress'
-            unmapped_fancy.append(c)
-
-    all_unmapped = unmapped_navaratri + unmapped_fancy
+        unmapped_customers, next_cursor = unmapped_page(request.args)
+    except ValueError:
+        return redirect(url_for('general.address_manager'))
 
     return render_template(
         "general/address_manager.html",
-        unmapped_customers=all_unmapped,
-        navaratri_count=len(unmapped_navaratri),
-        fancy_count=len(unmapped_fancy),
-        known_localities=merged_localities
+        unmapped_customers=unmapped_customers,
+        next_cursor=next_cursor,
+        per_page=page_size(request.args.get("per_page")),
+        navaratri_count=systems["Navaratri"]["unmapped_count"],
+        fancy_count=systems["Fancy Dress"]["unmapped_count"],
+        known_localities=systems["Navaratri"]["localities"]
     )
 
 
-GUJARAT_TOWNS_MATRIX = {
-    'patan': [23.8493, 72.1266], 'palanpur': [24.1724, 72.4346], 'unjha': [23.8043, 72.3942],
-    'visnagar': [23.6961, 72.5484], 'mehsana': [23.5880, 72.3693], 'kalol': [23.2393, 72.4962],
-    'chhatral': [23.2800, 72.4500], 'kadi': [23.3000, 72.3300], 'dehgam': [23.1670, 72.8120],
-    'himmatnagar': [23.5979, 72.9698], 'himatnagar': [23.5979, 72.9698], 'modasa': [23.4667, 73.3000],
-    'idar': [23.8340, 73.0030], 'deesa': [24.2587, 72.1804], 'disa': [24.2587, 72.1804],
-    'radhanpur': [23.8333, 71.6000], 'siddhpur': [23.9167, 72.3833], 'sidhpur': [23.9167, 72.3833],
-    'chanasma': [23.7170, 72.1150], 'gandhinagar': [23.2156, 72.6369], 'nadiad': [22.6916, 72.8634],
-    'anand': [22.5645, 72.9289], 'bakrol': [22.5480, 72.9350], 'vadtal': [22.5920, 72.8880],
-    'petlad': [22.4748, 72.8020], 'khambhat': [22.3131, 72.6192], 'vadodara': [22.3072, 73.1812],
-    'baroda': [22.3072, 73.1812], 'bharuch': [21.7051, 72.9959], 'ankleshwar': [21.6264, 73.0152],
-    'surat': [21.1702, 72.8311], 'navsari': [20.9467, 72.9520], 'valsad': [20.6100, 72.9300],
-    'vapi': [20.3719, 72.9044], 'godhra': [22.7758, 73.6149], 'dahod': [22.8378, 74.2565],
-    'halol': [22.5024, 73.4735], 'rajkot': [22.3039, 70.8022], 'morbi': [22.8173, 70.8368],
-    'gondal': [21.9619, 70.7932], 'bhavnagar': [21.7645, 72.1519], 'botad': [22.1700, 71.6700],
-    'amreli': [21.6032, 71.2221], 'junagadh': [21.5222, 70.4579], 'veraval': [20.9000, 70.3700],
-    'porbandar': [21.6417, 69.6292], 'jamnagar': [22.4707, 70.0577], 'bhuj': [23.2420, 69.6669],
-    'gandhidham': [23.0753, 70.1337], 'anjar': [23.1132, 70.0270], 'mandvi': [22.8354, 69.3563],
-    'sanand': [22.9910, 72.3810], 'dholka': [22.7200, 72.4700], 'bavla': [22.8300, 72.3600],
-    'aslali': [22.9210, 72.6010], 'bareja': [22.8850, 72.6050], 'changodar': [22.9230, 72.4410],
-    'kheda': [22.7500, 72.6800], 'vastral': [23.0041, 72.6617], 'maninagar': [22.9976, 72.6009],
-    'khokhra': [22.9983, 72.6167], 'isanpur': [22.9731, 72.5976], 'amraiwadi': [23.0039, 72.6288],
-    'vatva': [22.9554, 72.6240], 'lambha': [22.9238, 72.5843], 'odhav': [23.0232, 72.6698],
-    'hatkeshwar': [23.0012, 72.6225], 'ctm': [22.9908, 72.6321], 'nikol': [23.0483, 72.6717],
-    'ramol': [22.9840, 72.6582], 'narol': [22.9634, 72.5891], 'bapunagar': [23.0371, 72.6231],
-    'saraspur': [23.0298, 72.6080], 'asarwa': [23.0494, 72.6033], 'shahibaug': [23.0560, 72.5925],
-    'naroda': [23.0725, 72.6656], 'rakhial': [23.0180, 72.6210], 'navrangpura': [23.0366, 72.5611],
-    'satellite': [23.0300, 72.5176], 'satelite': [23.0300, 72.5176], 'vastrapur': [23.0350, 72.5293],
-    'bodakdev': [23.0410, 72.5115], 'thaltej': [23.0500, 72.5070], 'sola': [23.0680, 72.5180],
-    'gota': [23.0970, 72.5310], 'ghatlodia': [23.0682, 72.5358], 'ghatlodiya': [23.0682, 72.5358],
-    'naranpura': [23.0520, 72.5530], 'paldi': [23.0120, 72.5620], 'vasna': [22.9980, 72.5520],
-    'ranip': [23.0800, 72.5710], 'sabarmati': [23.0845, 72.5802], 'chandkheda': [23.1114, 72.5835],
-    'saijpur': [23.0640, 72.6280], 'jivraj park': [23.0010, 72.5410], 'bopal': [23.0300, 72.4640]
-}
+@general.route("/api/address_manager/unmapped")
+def address_manager_page():
+    """Next page of unmapped customers for infinite scroll"""
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    try:
+        unmapped_customers, next_cursor = unmapped_page(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "html": render_template("general/address_manager_rows.html", unmapped_customers=unmapped_customers),
+        "count": len(unmapped_customers),
+        "next": next_cursor
+    })
 
 
 @general.route("/api/update_customer_address", methods=["POST"])
@@ -297,14 +325,11 @@ def update_customer_address():
         # Determine real street address and assigned locality
         final_street_addr = new_address if new_address else existing_addr
         final_locality = assigned_locality
+        gazetteer = get_gazetteer()
 
         # If locality not explicitly passed, auto-detect from address string
         if not final_locality:
-            addr_lower = final_street_addr.lower()
-            for town, coords in GUJARAT_TOWNS_MATRIX.items():
-                if town in addr_lower:
-                    final_locality = town.title()
-                    break
+            final_locality = gazetteer.matcher.find(final_street_addr) or ""
 
         if final_locality:
             final_locality = to_title_case(final_locality)
@@ -321,27 +346,7 @@ def update_customer_address():
 
         # Register custom locality in Custom_Localities if needed
         if final_locality:
-            coords = GUJARAT_TOWNS_MATRIX.get(final_locality.lower())
-            if not coords:
-                try:
-                    from website.navaratri.nroutes import AREA_COORDINATES
-                    for k, v in AREA_COORDINATES.items():
-                        if k.lower() == final_locality.lower():
-                            coords = v
-                            break
-                except Exception:
-                    pass
-            if not coords:
-                try:
-                    from website.fancy.froutes import AREA_COORDINATES_FANCY
-                    for k, v in AREA_COORDINATES_FANCY.items():
-                        if k.lower() == final_locality.lower():
-                            coords = v
-                            break
-                except Exception:
-                    pass
-            if not coords:
-                coords = [23.0225, 72.5714]
+            coords = gazetteer.coords(final_locality) or DEFAULT_COORDS
 
             try:
                 custom_localities.update_one(
@@ -359,6 +364,8 @@ def update_customer_address():
         }
 
         col.update_one(query, {"$set": upd})
+        directory_changed(custom_localities)
+        on_customer_address_write(col, query)
 
         return jsonify({
             "status": "success",
@@ -393,21 +400,99 @@ def add_custom_locality():
         return jsonify({"status": "error", "message": "Latitude and Longitude must be valid decimal numbers."}), 400
 
     try:
+        # Known locality closest to the new one, for the admin to double-check
+        nearest = get_gazetteer().nearest(lat, lng)
+
         custom_localities.update_one(
             {"name": name},
             {"$set": {"name": name, "lat": lat, "lng": lng, "created_at": datetime.now()}},
             upsert=True
         )
+        directory_changed(custom_localities)
 
         return jsonify({
             "status": "success",
             "message": f"Successfully created new custom locality '{name}' at [{lat}, {lng}]!",
-            "locality": {"name": name, "lat": lat, "lng": lng}
+            "locality": {"name": name, "lat": lat, "lng": lng},
+            "nearest": {"name": nearest[0], "km": nearest[1]} if nearest else None
         })
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@general.route("/api/nearest_locality")
+def nearest_locality():
+    """Known locality closest to ?lat=&lng=, optionally within ?max_km="""
+    if not session.get('logged_in'):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+
+    try:
+        lat = float(request.args.get("lat", ""))
+        lng = float(request.args.get("lng", ""))
+        max_km = float(request.args["max_km"]) if request.args.get("max_km") else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Latitude and Longitude must be valid decimal numbers."}), 400
+
+    gazetteer = get_gazetteer()
+    nearest = gazetteer.nearest(lat, lng, max_km)
+    if not nearest:
+        return jsonify({"status": "success", "locality": None})
+
+    return jsonify({
+        "status": "success",
+        "locality": {"name": nearest[0], "km": nearest[1], "coords": gazetteer.coords(nearest[0])}
+    })
+
+
+# ------------------ API: Background jobs ------------------
+@general.route("/api/jobs/<job_id>")
+def job_status_route(job_id):
+    """Status and progress of a background job (see jobs.py)"""
+    if not session.get('logged_in'):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    response = jsonify({"status": "success", "job": job_status(job)})
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+# ------------------ API: Typeahead ------------------
+AUTOCOMPLETE_KINDS = ("customers", "products")
+
+
+@general.route("/api/autocomplete")
+def autocomplete():
+    """
+    Top suggestions for ?q= from the in-memory tries: kind=customers
+    (mobile or name prefix, optionally ?system=) or kind=products.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    kind = request.args.get("kind", "customers")
+    if kind not in AUTOCOMPLETE_KINDS:
+        return jsonify({"success": False, "message": f"Unknown kind '{kind}'"}), 400
+    prefix = request.args.get("q", "").strip()
+    try:
+        limit = max(1, min(int(request.args.get("limit", DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+
+    index = get_autocomplete()
+    if kind == "products":
+        suggestions = index.suggest_products(prefix, limit)
+    else:
+        suggestions = index.suggest_customers(prefix, limit, request.args.get("system") or None)
+
+    response = jsonify({"success": True, "kind": kind, "q": prefix, "suggestions": suggestions})
+    # Repeated keystrokes within a few seconds are served by the browser
+    response.headers["Cache-Control"] = "private, max-age=10"
+    return response
+
+
 # ==========================================
 # INTERNAL CATALOG MANAGEMENT WORKSPACE API
 # ==========================================
@@ -0,0 +1,188 @@
+# indexes.py
+#
+# Indexes the app relies on, declared per collection family and applied
+# idempotently: create_index() is a no-op when the same index exists.
+# Applied at create_app() and by create_cycle() for a new cycle collection.
+#
+# Derived per-cycle collections ({name}_lines, {name}_summary_parts,
+# {name}_search) still create their own indexes when they are first built,
+# as do `jobs` and `invoices`, whose TTL indexes take options.
+
+import logging
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure
+
+from website.general.db import db, collection, fancy_collection
+
+logger = logging.getLogger(__name__)
+
+CYCLE_INDEXES = {
+    "navaratri": [
+        [("mobile", ASCENDING)],
+        [("Name", ASCENDING), ("_id", ASCENDING)]
+    ],
+    # end_at leads the date indexes: most bookings ended long ago
+    "fancy": [
+        [("mobile", ASCENDING)],
+        [("end_at", ASCENDING), ("start_at", ASCENDING)],
+        [("returned", ASCENDING), ("end_at", ASCENDING)]
+    ]
+}
+
+LOG_INDEXES = [
+    [("timestamp", DESCENDING)]
+]
+
+# (updated_at, _id) backs the keyset-paginated directories, also per
+# resolved locality for the map filter and the unmapped list
+CUSTOMER_INDEXES = [
+    [("mobile", ASCENDING)],
+    [("updated_at", DESCENDING), ("_id", DESCENDING)],
+    [("resolved_locality", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)],
+    [("locality_version", ASCENDING)]
+]
+
+STATIC_INDEXES = {
+    "navaratri_cycles": [[("status", ASCENDING)], [("created_at", DESCENDING)]],
+    "fancy_cycles": [[("status", ASCENDING)], [("created_at", DESCENDING)]],
+    "Navaratri_Customers": CUSTOMER_INDEXES,
+    "Fancy_Customers": CUSTOMER_INDEXES,
+    "Fancy_Customer_History": [
+        [("mobile", ASCENDING), ("timestamp", DESCENDING)],
+        [("collection_name", ASCENDING)]
+    ],
+    "School_Master": [[("name", ASCENDING)]],
+    "Costume_Category_Master": [[("name", ASCENDING)]],
+    "Storage": [[("bag_id", ASCENDING)]],
+    "bags": [[("name", ASCENDING)]]
+}
+
+# Collections that predate the cycles and are still read directly
+LEGACY_CYCLE_COLLECTIONS = {
+    "navaratri": collection.name,
+    "fancy": fancy_collection.name
+}
+
+
+def apply_indexes(coll, specs):
+    for keys in specs:
+        coll.create_index(keys)
+
+
+def ensure_cycle_indexes(kind, collection_name):
+    """
+    Indexes of one navaratri/fancy cycle collection and its logs. A failure
+    is logged and returns False, so creating a cycle never fails on it.
+    """
+    try:
+        apply_indexes(db[collection_name], CYCLE_INDEXES[kind])
+        apply_indexes(db[f"{collection_name}_logs"], LOG_INDEXES)
+    except Exception as e:
+        logger.warning("Could not create indexes on %s: %s", collection_name, e)
+        return False
+    return True
+
+
+def cycle_collection_names():
+    """[(kind, collection_name)] of every known cycle collection"""
+    names = []
+    for kind in CYCLE_INDEXES:
+        for cycle in db[f"{kind}_cycles"].find({}, {"collection_name": 1}):
+            if cycle.get("collection_name"):
+                names.append((kind, cycle["collection_name"]))
+        legacy = (kind, LEGACY_CYCLE_COLLECTIONS[kind])
+        if legacy not in names:
+            names.append(legacy)
+    return names
+
+
+def ensure_all_indexes():
+    """
+    Applies every declared index. Failures are logged and skipped so a
+    bad collection never keeps the app from starting.
+    Returns the number of collections that failed.
+    """
+    failed = 0
+    targets = [(db[name], specs) for name, specs in STATIC_INDEXES.items()]
+    try:
+        cycle_names = cycle_collection_names()
+    except ConnectionFailure as e:
+        # Every collection would wait out the same server selection timeout
+        logger.warning("MongoDB unreachable, skipping index creation: %s", e)
+        return len(targets) + 1
+    except Exception as e:
+        failed += 1
+        cycle_names = []
+        logger.warning("Could not list the cycle collections: %s", e)
+    for kind, name in cycle_names:
+        targets.append((db[name], CYCLE_INDEXES[kind]))
+        targets.append((db[f"{name}_logs"], LOG_INDEXES))
+
+    for i, (coll, specs) in enumerate(targets):
+        try:
+            apply_indexes(coll, specs)
+        except ConnectionFailure as e:
+            logger.warning("MongoDB unreachable, skipping index creation: %s", e)
+            return failed + len(targets) - i
+        except Exception as e:
+            failed += 1
+            logger.warning("Could not create indexes on %s: %s", coll.name, e)
+    return failed
+
+
+# ------------------ EXPLAIN REPORT ------------------
+
+def representative_queries():
+    """(collection, filter, sort) for the hot query shapes of every family"""
+    queries = [
+        (db["Navaratri_Customers"], {"mobile": "0000000000"}, None),
+        (db["Navaratri_Customers"], {}, [("updated_at", DESCENDING), ("_id", DESCENDING)]),
+        (db["Fancy_Customers"], {"mobile": "0000000000"}, None),
+        (db["Fancy_Customers"], {}, [("updated_at", DESCENDING), ("_id", DESCENDING)]),
+        (db["Fancy_Customer_History"], {"mobile": "0000000000"}, [("timestamp", DESCENDING)]),
+        (db["School_Master"], {"name": ""}, None),
+        (db["Costume_Category_Master"], {"name": ""}, None),
+        (db["Storage"], {"bag_id": ""}, None),
+        (db["bags"], {"name": ""}, None)
+    ]
+    for kind, name in cycle_collection_names():
+        queries.append((db[name], {"mobile": "0000000000"}, None))
+        queries.append((db[f"{name}_logs"], {}, [("timestamp", DESCENDING)]))
+    return queries
+
+
+def _stages(plan):
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def explain_report():
+    """
+    Runs explain() on every representative query. Returns rows of
+    {collection, filter, sort, stages, collscan}.
+    """
+    rows = []
+    for coll, query, sort in representative_queries():
+        cursor = coll.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+            stages = list(_stages(plan))
+        except Exception as e:
+            stages = [f"error: {e}"]
+        rows.append({
+            "collection": coll.name,
+            "filter": query,
+            "sort": sort,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages
+        })
+    return rows
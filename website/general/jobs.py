@@ -0,0 +1,297 @@
+# jobs.py
+#
+# Background jobs for work that should not hold a gunicorn worker, such as
+# calls to the WhatsApp Cloud API. A job is a document in `jobs`; a pool of
+# JOB_WORKERS threads in each web process claims queued jobs with one
+# atomic find_one_and_update and runs the handler registered for the job's
+# kind, inside an app context.
+#
+# A claim holds a lease of JOB_LEASE seconds, so a job whose worker died is
+# picked up again once the lease runs out. A handler that raises RetryJob
+# (or anything unexpected) is re-queued with exponential backoff until
+# `max_attempts`. JobFailed ends the job for good. Jobs enqueued with the
+# same dedupe_key while one is still queued or running share that job.
+#
+# Handlers report progress with job.progress(...), which GET /api/jobs/<id>
+# shows. Finished jobs are dropped after JOB_RETENTION_DAYS.
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from bson import ObjectId
+from flask import current_app, has_app_context
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from website.general.db import db
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_POLL = float(os.environ.get("JOB_POLL", 2))
+JOB_LEASE = float(os.environ.get("JOB_LEASE", 120))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+JOB_BACKOFF = float(os.environ.get("JOB_BACKOFF", 5))
+JOB_BACKOFF_MAX = float(os.environ.get("JOB_BACKOFF_MAX", 600))
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", 7))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+jobs = db["jobs"]
+
+_handlers = {}
+_indexed = False
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class RetryJob(Exception):
+    """Try the job again later, after `delay` seconds or the usual backoff"""
+
+    def __init__(self, message, delay=None):
+        super().__init__(message)
+        self.delay = delay
+
+
+class JobFailed(Exception):
+    """The job cannot succeed; fail it without further attempts"""
+
+
+def job_handler(kind):
+    """Registers the decorated function as the handler of `kind` jobs"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+# ------------------ QUEUE ------------------
+
+def ensure_job_indexes():
+    global _indexed
+    if _indexed:
+        return
+    jobs.create_index([("status", ASCENDING), ("run_at", ASCENDING)])
+    jobs.create_index([("active_key", ASCENDING)], unique=True, sparse=True)
+    jobs.create_index([("finished_at", ASCENDING)], expireAfterSeconds=JOB_RETENTION_DAYS * 86400)
+    _indexed = True
+
+
+def backoff_delay(attempts):
+    """Seconds before retry number `attempts`, doubling from JOB_BACKOFF, with jitter"""
+    delay = min(JOB_BACKOFF * 2 ** max(attempts - 1, 0), JOB_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def enqueue(kind, payload, dedupe_key=None, max_attempts=JOB_MAX_ATTEMPTS, delay=0):
+    """
+    Queues a job and returns its id (a string). With a dedupe_key, the id
+    of the queued or running job holding that key is returned instead when
+    there is one.
+    """
+    ensure_job_indexes()
+    now = datetime.utcnow()
+    doc = {
+        "kind": kind,
+        "payload": payload,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": now + timedelta(seconds=delay),
+        "created_at": now,
+        "updated_at": now,
+        "progress": {}
+    }
+    if dedupe_key:
+        doc["active_key"] = dedupe_key
+    try:
+        job_id = jobs.insert_one(doc).inserted_id
+    except DuplicateKeyError:
+        existing = jobs.find_one({"active_key": dedupe_key}, {"_id": 1})
+        if existing is None:
+            # Finished between the insert and the lookup
+            return enqueue(kind, payload, dedupe_key, max_attempts, delay)
+        job_id = existing["_id"]
+
+    if has_app_context():
+        ensure_workers(current_app._get_current_object()).wake()
+    return str(job_id)
+
+
+def get_job(job_id):
+    try:
+        return jobs.find_one({"_id": ObjectId(job_id)})
+    except Exception:
+        return None
+
+
+def job_status(job):
+    """Public view of a job document"""
+    return {
+        "id": str(job["_id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "max_attempts": job.get("max_attempts"),
+        "progress": job.get("progress", {}),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"].isoformat(),
+        "next_attempt_at": job["run_at"].isoformat() if job["status"] == QUEUED else None,
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None
+    }
+
+
+# ------------------ RUNNING ------------------
+
+class Job:
+    """What a handler gets: the job's id, payload and attempt number"""
+
+    def __init__(self, doc, worker):
+        self.id = doc["_id"]
+        self.kind = doc["kind"]
+        self.payload = doc.get("payload", {})
+        self.attempts = doc.get("attempts", 1)
+        self.worker = worker
+
+    def progress(self, **fields):
+        """Merges fields into the progress shown by the status endpoint"""
+        now = datetime.utcnow()
+        update = {f"progress.{k}": v for k, v in fields.items()}
+        update["updated_at"] = now
+        update["lease_until"] = now + timedelta(seconds=JOB_LEASE)
+        jobs.update_one({"_id": self.id, "worker": self.worker}, {"$set": update})
+
+
+def claim_job(worker):
+    """Marks the next due job (or an expired claim) as ours and returns it, or None"""
+    now = datetime.utcnow()
+    return jobs.find_one_and_update(
+        {"$or": [
+            {"status": QUEUED, "run_at": {"$lte": now}},
+            {"status": RUNNING, "lease_until": {"$lt": now}}
+        ]},
+        {
+            "$set": {
+                "status": RUNNING,
+                "worker": worker,
+                "started_at": now,
+                "updated_at": now,
+                "lease_until": now + timedelta(seconds=JOB_LEASE)
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _finish(doc, worker, status, result=None, error=None):
+    now = datetime.utcnow()
+    jobs.update_one(
+        {"_id": doc["_id"], "worker": worker},
+        {
+            "$set": {"status": status, "result": result, "error": error, "updated_at": now, "finished_at": now},
+            "$unset": {"active_key": "", "lease_until": ""}
+        }
+    )
+
+
+def _retry(doc, worker, error, delay=None):
+    attempts = doc.get("attempts", 1)
+    if attempts >= doc.get("max_attempts", JOB_MAX_ATTEMPTS):
+        _finish(doc, worker, FAILED, error=error)
+        return
+    now = datetime.utcnow()
+    delay = backoff_delay(attempts) if delay is None else delay
+    jobs.update_one(
+        {"_id": doc["_id"], "worker": worker},
+        {
+            "$set": {"status": QUEUED, "error": error, "run_at": now + timedelta(seconds=delay), "updated_at": now},
+            "$unset": {"lease_until": ""}
+        }
+    )
+
+
+def run_job(doc, worker):
+    """Runs a claimed job and records its outcome"""
+    if doc.get("attempts", 1) > doc.get("max_attempts", JOB_MAX_ATTEMPTS):
+        _finish(doc, worker, FAILED, error=doc.get("error") or "Worker lost")
+        return
+    handler = _handlers.get(doc["kind"])
+    if handler is None:
+        _finish(doc, worker, FAILED, error=f"No handler for {doc['kind']} jobs")
+        return
+
+    try:
+        result = handler(Job(doc, worker))
+    except JobFailed as e:
+        _finish(doc, worker, FAILED, error=str(e))
+    except RetryJob as e:
+        _retry(doc, worker, str(e), e.delay)
+    except Exception as e:
+        logger.exception("Job %s (%s) raised", doc["_id"], doc["kind"])
+        _retry(doc, worker, f"{type(e).__name__}: {e}")
+    else:
+        _finish(doc, worker, DONE, result=result)
+
+
+class WorkerPool:
+    """Daemon threads claiming and running jobs until the process exits"""
+
+    def __init__(self, app, size=JOB_WORKERS):
+        self.app = app
+        self.pid = os.getpid()
+        # Stamped on the jobs a worker claims; PIDs repeat across containers
+        self.id = f"{socket.gethostname()}-{self.pid}-{uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self.threads = []
+        for i in range(size):
+            name = f"job-worker-{self.id}-{i}"
+            thread = threading.Thread(target=self._loop, args=(name,), name=name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def wake(self):
+        """Makes idle workers look for a job now instead of at the next poll"""
+        self._wakeup.set()
+        return self
+
+    def _loop(self, name):
+        while True:
+            try:
+                with self.app.app_context():
+                    doc = claim_job(name)
+                    if doc is not None:
+                        run_job(doc, name)
+                        continue
+            except Exception:
+                logger.exception("Job worker %s failed to claim or run a job", name)
+                time.sleep(JOB_POLL)
+            self._wakeup.wait(JOB_POLL)
+            self._wakeup.clear()
+
+
+def ensure_workers(app, size=JOB_WORKERS):
+    """
+    The WorkerPool of this process, started on first use (and again in a
+    forked child). With JOB_WORKERS=0 nothing is started here and the jobs
+    wait for scratch/run_jobs.py.
+    """
+    global _pool
+    if _pool is not None and _pool.pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            ensure_job_indexes()
+            _pool = WorkerPool(app, size)
+        return _pool
@@ -0,0 +1,109 @@
+# mongo.py
+#
+# The one place a MongoClient is built. The app (through db.py), gunicorn
+# workers and the scratch scripts all share a single client per process,
+# whose pool, timeouts and wire compression come from the environment.
+
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = os.environ.get("MONGO_DB", "Image_Traditional")
+
+# Compressor -> module it needs; zlib ships with Python
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    try:
+        return int(value) if value not in (None, "") else default
+    except ValueError:
+        logger.warning("Ignoring %s=%r, not an integer", name, value)
+        return default
+
+
+def available_compressors(requested):
+    """The requested compressors whose Python module can be imported, in order"""
+    usable = []
+    for name in (c.strip().lower() for c in requested.split(",")):
+        module = _COMPRESSOR_MODULES.get(name)
+        if not module:
+            continue
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        usable.append(name)
+    return usable
+
+
+def client_options():
+    """MongoClient keyword arguments read from the environment"""
+    options = {
+        "tls": True,
+        "tlsAllowInvalidCertificates": True,
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 20),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 2),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_MS", 300000),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_MS", 10000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 10000),
+        "appname": os.environ.get("MONGO_APP_NAME", "image-traditional")
+    }
+    compressors = available_compressors(os.environ.get("MONGO_COMPRESSORS", "zstd,snappy,zlib"))
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return options
+
+
+def new_client(**overrides):
+    """A fresh client with the configured options; for one-off scripts"""
+    options = client_options()
+    options.update(overrides)
+    return MongoClient(os.environ.get("client"), **options)
+
+
+def get_client():
+    """
+    The shared client of this process. A client inherited through fork
+    is replaced, since its pool and monitor threads belong to the parent.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = new_client()
+            _client_pid = pid
+    return _client
+
+
+def get_db(name=None):
+    return get_client()[name or DB_NAME]
+
+
+def warm_up():
+    """
+    Opens the pool before the first request: server selection, the TLS
+    handshake and auth happen here instead of on a user's request.
+    Returns True when the server answered.
+    """
+    try:
+        get_client().admin.command("ping")
+        return True
+    except Exception as e:
+        logger.warning("MongoDB warm-up failed: %s", e)
+        return False
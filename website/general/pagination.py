@@ -0,0 +1,84 @@
+# pagination.py
+#
+# Keyset pagination for the customer directories, newest first on
+# (updated_at, _id), and for the booking roster, by (Name, _id). A page
+# asks for the documents strictly after the last one it showed, so every
+# page is an index range scan whatever its depth, and rows written
+# meanwhile never shift the pages that follow.
+#
+# The cursor handed to the browser is the (sort field, _id) of the last
+# row, as Extended JSON in URL-safe base64.
+
+import base64
+import binascii
+
+from bson import json_util
+from pymongo import DESCENDING
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """per_page request argument clamped to 1..MAX_PAGE_SIZE"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(doc, field="updated_at"):
+    raw = json_util.dumps([doc.get(field), doc["_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """(sort value, _id) of a cursor; raises ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, _id = json_util.loads(raw)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid page cursor: {e}")
+    return value, _id
+
+
+def after_query(token, field="updated_at", direction=DESCENDING):
+    """
+    Filter for the documents that sort after the cursor on (field, _id).
+    Documents without the field sort last in descending order and first
+    in ascending order, and are paged on _id alone among themselves.
+    """
+    value, _id = decode_cursor(token)
+    op = "$lt" if direction == DESCENDING else "$gt"
+    if value is None:
+        missing = {field: None, "_id": {op: _id}}
+        if direction == DESCENDING:
+            return missing
+        return {"$or": [missing, {field: {"$ne": None}}]}
+    clauses = [
+        {field: {op: value}},
+        {field: value, "_id": {op: _id}}
+    ]
+    if direction == DESCENDING:
+        clauses.append({field: None})
+    return {"$or": clauses}
+
+
+def keyset_page(collection, query=None, projection=None, per_page=DEFAULT_PAGE_SIZE, after=None,
+                field="updated_at", direction=DESCENDING):
+    """
+    One page of `collection` matching `query`, ordered on (field, _id),
+    newest first by default. Returns (docs, next_cursor); next_cursor is
+    None on the last page.
+    """
+    query = query or {}
+    if after:
+        after = after_query(after, field, direction)
+        query = {"$and": [query, after]} if query else after
+
+    sort = [(field, direction), ("_id", direction)]
+    docs = list(collection.find(query, projection).sort(sort).limit(per_page + 1))
+    if len(docs) > per_page:
+        docs = docs[:per_page]
+        return docs, encode_cursor(docs[-1], field)
+    return docs, None
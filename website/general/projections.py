@@ -0,0 +1,55 @@
+# projections.py
+#
+# Field sets the listing views actually render, one entry per view.
+# Listing reads go through find_view() so whole documents (the `bookings`
+# maps, qr_url, ...) are only fetched where a template needs them.
+
+PROJECTIONS = {
+    # navaratri_booking sidebar roster, also served by /api/navaratri_booking/roster
+    "navaratri_roster": {
+        "Name": 1, "mobile": 1, "group": 1, "reference": 1,
+        "total_price": 1, "given_price": 1
+    },
+    # navaratri_booking grid without a selected customer (item counts)
+    "navaratri_booking_grid": {
+        "Name": 1, "mobile": 1, "group": 1, "reference": 1,
+        "total_price": 1, "given_price": 1, "bookings": 1
+    },
+    "dashboard_listing": {
+        "Name": 1, "mobile": 1, "group": 1, "reference": 1,
+        "total_price": 1, "given_price": 1, "deposit": 1, "bookings": 1
+    },
+    "fancy_listing": {
+        "name": 1, "Name": 1, "mobile": 1, "address": 1, "school": 1,
+        "costume": 1, "details": 1, "price": 1, "start_date": 1, "end_date": 1
+    },
+    "navaratri_customers": {
+        "name": 1, "mobile": 1, "address": 1, "locality": 1, "resolved_locality": 1, "updated_at": 1
+    },
+    "fancy_customers": {
+        "name": 1, "mobile": 1, "address": 1, "locality": 1, "resolved_locality": 1, "school": 1,
+        "updated_at": 1
+    },
+    # address_manager rows (navaratri customers have group/reference, fancy ones a school)
+    "unmapped_customers": {
+        "name": 1, "mobile": 1, "address": 1, "school": 1, "group": 1, "reference": 1, "updated_at": 1
+    }
+}
+
+
+def projection(view):
+    """Copy of the projection registered for `view`"""
+    return dict(PROJECTIONS[view])
+
+
+def find_view(collection, view, query=None):
+    """collection.find(query) limited to the fields `view` renders"""
+    return collection.find(query or {}, projection(view))
+
+
+def with_remaining(docs):
+    """List of docs with the `remaining` amount the navaratri listings show"""
+    docs = list(docs)
+    for d in docs:
+        d['remaining'] = d.get('total_price', 0) - d.get('given_price', 0)
+    return docs
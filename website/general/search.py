@@ -0,0 +1,265 @@
+# search.py
+#
+# Token index behind the /search page, one companion collection per cycle
+# collection: f"{collection_name}_search" holds, for every source document,
+# the lowercased tokens of its searchable fields (`tokens`, multikey
+# indexed) and the weight of the field each token came from (`weights`).
+#
+# A query is split into terms and every term has to be the prefix of some
+# token, so "98250" finds a mobile number and "c1" product C12. Each term
+# is an anchored regex on `tokens`, which the index answers as a range
+# scan; candidates are ranked by the weights of the tokens they matched,
+# an exact token counting double.
+#
+# Rows are kept in step by on_customer_write() / on_booking_write() and the
+# collection is rebuilt on first use in a process when its size no longer
+# matches the source. A rebuild upserts every row in place and then drops
+# the rows of deleted documents, so searches made meanwhile still see the
+# whole index and concurrent rebuilds cannot collide.
+
+import logging
+import re
+import threading
+
+from pymongo import ASCENDING, ReplaceOne
+
+from website.navaratri.nindex import normalize_product_code
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = 200
+MAX_TERMS = 8
+
+# Field -> weight of the tokens it contributes, per portal
+SEARCH_FIELDS = {
+    "navaratri": {"Name": 4, "mobile": 5, "group": 2, "reference": 2, "address": 1},
+    "fancy": {"name": 4, "mobile": 5, "costume": 3, "address": 1, "Address": 1, "details": 1}
+}
+PRODUCT_WEIGHT = 5
+MOBILE_FIELDS = ("mobile",)
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+# ------------------ TOKENS ------------------
+
+def text_tokens(value):
+    """
+    Words of a text value, plus each whitespace separated chunk with its
+    punctuation dropped, so "C-12" and "12/B" are also found whole.
+    """
+    text = str(value or "").lower()
+    tokens = re.findall(r'[0-9a-z]+', text)
+    for chunk in re.split(r'[\s,;]+', text):
+        joined = re.sub(r'[^0-9a-z]', '', chunk)
+        if joined and joined not in tokens:
+            tokens.append(joined)
+    return tokens
+
+
+def mobile_tokens(value):
+    """Digits of a mobile number, and its last ten when it has a country code"""
+    digits = re.sub(r'\D', '', str(value or ""))
+    if not digits:
+        return []
+    return [digits, digits[-10:]] if len(digits) > 10 else [digits]
+
+
+def product_tokens(doc):
+    """Normalized product codes of a navaratri customer's bookings"""
+    codes = []
+    bookings = doc.get("bookings", {})
+    if not isinstance(bookings, dict):
+        return codes
+    for date_key, products in bookings.items():
+        if date_key in ("total_price", "given_price"):
+            continue
+        items = products if isinstance(products, list) else str(products or "").split(',')
+        for p in items:
+            code = normalize_product_code(p).lower()
+            if code and code not in codes:
+                codes.append(code)
+    return codes
+
+
+def document_weights(kind, doc):
+    """{token: weight} of a source document, the highest weight per token"""
+    weights = {}
+
+    def add(tokens, weight):
+        for t in tokens:
+            if weights.get(t, 0) < weight:
+                weights[t] = weight
+
+    for field, weight in SEARCH_FIELDS[kind].items():
+        value = doc.get(field)
+        add(mobile_tokens(value) if field in MOBILE_FIELDS else text_tokens(value), weight)
+    if kind == "navaratri":
+        add(product_tokens(doc), PRODUCT_WEIGHT)
+    return weights
+
+
+def phone_digits(digits):
+    """A mobile number's digits without its 91 or 0 prefix"""
+    if len(digits) == 12 and digits.startswith("91"):
+        return digits[2:]
+    if len(digits) == 11 and digits.startswith("0"):
+        return digits[1:]
+    return digits
+
+
+def digit_terms(chunks):
+    """
+    Terms of a run of all-digit query chunks. Consecutive chunks making up
+    a 10 digit mobile number ("98250 12345", "+91 98250 12345") become one
+    term; every other chunk stays a term of its own.
+    """
+    terms = []
+    i = 0
+    while i < len(chunks):
+        for j in range(len(chunks), i, -1):
+            number = phone_digits("".join(chunks[i:j]))
+            if len(number) == 10:
+                terms.append(number)
+                i = j
+                break
+        else:
+            terms.append(chunks[i])
+            i += 1
+    return terms
+
+
+def query_terms(query):
+    """
+    Search terms of a query: its chunks, lowercased, punctuation dropped,
+    with a mobile number typed in groups or with its country code read
+    as the ten digits mobile_tokens() indexes.
+    """
+    terms = []
+    run = []
+
+    def add(new_terms):
+        for t in new_terms:
+            if t not in terms:
+                terms.append(t)
+
+    for chunk in re.split(r'[\s,;]+', (query or "").lower()):
+        term = re.sub(r'[^0-9a-z]', '', chunk)
+        if not term:
+            continue
+        if term.isdigit():
+            run.append(term)
+            continue
+        add(digit_terms(run) + [term])
+        run = []
+    add(digit_terms(run))
+    return terms[:MAX_TERMS]
+
+
+def matches_all(tokens, terms):
+    """True when every term is the prefix of one of the tokens"""
+    return all(any(t.startswith(term) for t in tokens) for term in terms)
+
+
+# ------------------ INDEX ------------------
+
+def search_collection_for(collection):
+    return collection.database[f"{collection.name}_search"]
+
+
+def index_row(kind, doc):
+    weights = document_weights(kind, doc)
+    return {"_id": doc["_id"], "tokens": list(weights), "weights": weights}
+
+
+def rebuild_search_index(collection, kind):
+    """
+    Regenerates the search rows of a collection from its documents.
+    Returns the number of rows written.
+    """
+    search = search_collection_for(collection)
+    search.create_index([("tokens", ASCENDING)])
+
+    fields = dict.fromkeys(SEARCH_FIELDS[kind], 1)
+    if kind == "navaratri":
+        fields["bookings"] = 1
+
+    seen = set()
+    batch = []
+    for doc in collection.find({}, fields):
+        seen.add(doc["_id"])
+        batch.append(ReplaceOne({"_id": doc["_id"]}, index_row(kind, doc), upsert=True))
+        if len(batch) >= 1000:
+            search.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        search.bulk_write(batch, ordered=False)
+
+    # Rows of documents deleted since; anything inserted after the scan
+    # above is still in the source and keeps its row
+    extra = [r["_id"] for r in search.find({}, {"_id": 1}) if r["_id"] not in seen]
+    if extra:
+        alive = {d["_id"] for d in collection.find({"_id": {"$in": extra}}, {"_id": 1})}
+        search.delete_many({"_id": {"$in": [i for i in extra if i not in alive]}})
+    return len(seen)
+
+
+def get_search_index(collection, kind):
+    """
+    Returns the search collection of `collection`, rebuilding it on first
+    use in this process when it does not cover every source document.
+    """
+    search = search_collection_for(collection)
+    name = collection.name
+    if name in _ready:
+        return search
+
+    with _ready_lock:
+        if name not in _ready:
+            try:
+                search.create_index([("tokens", ASCENDING)])
+                if search.estimated_document_count() != collection.estimated_document_count():
+                    rebuild_search_index(collection, kind)
+                _ready.add(name)
+            except Exception as e:
+                # Search what is indexed so far; the next use tries again
+                logger.warning("Could not rebuild the search index of %s: %s", name, e)
+    return search
+
+
+def sync_search_document(collection, kind, doc_id):
+    """Replaces the search row of one document after a write, or drops it"""
+    search = get_search_index(collection, kind)
+    doc = collection.find_one({"_id": doc_id})
+    if doc:
+        search.replace_one({"_id": doc_id}, index_row(kind, doc), upsert=True)
+    else:
+        search.delete_one({"_id": doc_id})
+
+
+def search_documents(collection, kind, query, limit=SEARCH_LIMIT):
+    """
+    Source documents matching every term of `query`, best first.
+    Returns (documents, terms).
+    """
+    terms = query_terms(query)
+    if not terms:
+        return [], terms
+
+    search = get_search_index(collection, kind)
+    clauses = [{"tokens": {"$regex": "^" + re.escape(term)}} for term in terms]
+    scored = []
+    for row in search.find({"$and": clauses}, {"weights": 1}):
+        score = 0
+        for term in terms:
+            score += max(
+                w * (2 if token == term else 1)
+                for token, w in row.get("weights", {}).items() if token.startswith(term)
+            )
+        scored.append((score, row["_id"]))
+    scored.sort(key=lambda s: s[0], reverse=True)
+    scored = scored[:limit]
+
+    docs = {d["_id"]: d for d in collection.find({"_id": {"$in": [i for _, i in scored]}})}
+    return [docs[i] for _, i in scored if i in docs], terms
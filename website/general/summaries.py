@@ -0,0 +1,298 @@
+# summaries.py
+#
+# Incrementally maintained dashboard summaries, one document per cycle
+# collection in `cycle_summaries`.
+#
+# Every booking document contributes a "part": a flat map of dotted counter
+# paths to numbers. Parts are kept in f"{collection_name}_summary_parts", so
+# after a write the summary only needs `$inc` by (new part - old part).
+#
+# A cycle without a summary has it built by the first dashboard read;
+# later full rebuilds run off the request path (schedule_summary_rebuild,
+# or scratch/rebuild_cycle_summaries.py). One runs at a time per cycle.
+# The parts are built into a side collection renamed over the live one,
+# and writes made meanwhile are noted in f"{collection_name}_summary_dirty"
+# and replayed once the new summary is in place.
+
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from pymongo.errors import DuplicateKeyError
+
+from website.general.cache import bump_cycle_version
+from website.general.db import db
+
+logger = logging.getLogger(__name__)
+
+summaries = db["cycle_summaries"]
+
+# A rebuild not finished after this long is assumed dead and may be taken over
+REBUILD_LEASE = 900
+# How long a dashboard read waits for another worker's first build
+FIRST_BUILD_WAIT = 20
+
+_rebuilding = set()
+_rebuilding_lock = threading.Lock()
+
+_KEY_ESCAPES = {"%": "%25", ".": "%2E", "$": "%24"}
+_KEY_UNESCAPES = {v: k for k, v in _KEY_ESCAPES.items()}
+_NONE_KEY = "%00"
+_EMPTY_KEY = "%01"
+
+
+def encode_key(value):
+    """Turns any counter key into a safe MongoDB field name"""
+    if value is None:
+        return _NONE_KEY
+    value = str(value)
+    if value == "":
+        return _EMPTY_KEY
+    return re.sub(r"[%.$]", lambda m: _KEY_ESCAPES[m.group(0)], value)
+
+
+def decode_key(key):
+    if key == _NONE_KEY:
+        return None
+    if key == _EMPTY_KEY:
+        return ""
+    return re.sub(r"%(25|2E|24)", lambda m: _KEY_UNESCAPES[m.group(0)], key)
+
+
+def path(*segments):
+    """Dotted counter path; every segment after the first is encoded"""
+    return ".".join([segments[0]] + [encode_key(s) for s in segments[1:]])
+
+
+def decoded(mapping):
+    """{encoded key: value} -> {key: value}, in stored order"""
+    return {decode_key(k): v for k, v in (mapping or {}).items()}
+
+
+def parts_collection_for(collection):
+    return collection.database[f"{collection.name}_summary_parts"]
+
+
+def _delta(new_inc, old_inc):
+    delta = dict(new_inc)
+    for p, v in old_inc.items():
+        delta[p] = delta.get(p, 0) - v
+    return {p: v for p, v in delta.items() if v}
+
+
+def _nest(flat):
+    nested = {}
+    for p, v in flat.items():
+        node = nested
+        keys = p.split(".")
+        for k in keys[:-1]:
+            node = node.setdefault(k, {})
+        node[keys[-1]] = node.get(keys[-1], 0) + v
+    return nested
+
+
+def dirty_collection_for(collection):
+    return collection.database[f"{collection.name}_summary_dirty"]
+
+
+def ensure_part_indexes(parts, indexes):
+    for keys in indexes:
+        parts.create_index(keys)
+
+
+def claim_rebuild(collection, kind, token):
+    """
+    Marks the summary of a cycle as being rebuilt by `token`. False while
+    another rebuild holds it and its lease has not run out.
+    """
+    now = datetime.utcnow()
+    try:
+        summaries.update_one(
+            {
+                "_id": collection.name,
+                "$or": [{"building": None}, {"building_at": {"$lt": now - timedelta(seconds=REBUILD_LEASE)}}]
+            },
+            {"$set": {"kind": kind, "building": token, "building_at": now}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def rebuild_summary(collection, kind, part_fn, projection=None, indexes=()):
+    """
+    Regenerates the summary of one cycle collection and all its parts
+    from the raw booking documents. Returns the summary document, or None
+    when another rebuild of the cycle is already running.
+    """
+    token = uuid4().hex
+    if not claim_rebuild(collection, kind, token):
+        return None
+
+    parts = parts_collection_for(collection)
+    building = collection.database[f"{parts.name}_building"]
+    building.drop()
+    collection.database.create_collection(building.name)
+    ensure_part_indexes(building, indexes)
+
+    totals = {}
+    batch = []
+    for doc in collection.find({}, projection):
+        inc, fields = part_fn(doc)
+        for p, v in inc.items():
+            totals[p] = totals.get(p, 0) + v
+        batch.append(dict(fields, _id=doc["_id"], inc=list(inc.items())))
+        if len(batch) >= 1000:
+            building.insert_many(batch)
+            batch = []
+    if batch:
+        building.insert_many(batch)
+
+    summary = _nest(totals)
+    summary.update({"_id": collection.name, "kind": kind, "rebuilt_at": datetime.utcnow()})
+    building.rename(parts.name, dropTarget=True)
+    res = summaries.replace_one({"_id": collection.name, "building": token}, summary)
+    if res.matched_count == 0:
+        logger.warning("Summary rebuild of %s was taken over by another one", collection.name)
+        return None
+
+    replay_dirty(collection, part_fn, projection)
+    bump_cycle_version(collection.name)
+    return summary
+
+
+def replay_dirty(collection, part_fn, projection=None):
+    """Syncs the documents written while the summary was being rebuilt"""
+    dirty = dirty_collection_for(collection)
+    for row in dirty.find({}, {"_id": 1}):
+        sync_summary_part(collection, row["_id"], part_fn, projection)
+        dirty.delete_one({"_id": row["_id"]})
+
+
+def schedule_summary_rebuild(collection, kind, part_fn, projection=None, indexes=()):
+    """
+    Runs rebuild_summary() on a background thread, one at a time per
+    cycle in this process. Returns False when one is already running.
+    """
+    with _rebuilding_lock:
+        if collection.name in _rebuilding:
+            return False
+        _rebuilding.add(collection.name)
+
+    def run():
+        try:
+            if rebuild_summary(collection, kind, part_fn, projection, indexes) is not None:
+                logger.info("Rebuilt the summary of %s", collection.name)
+        except Exception as e:
+            logger.warning("Rebuilding the summary of %s failed: %s", collection.name, e)
+        finally:
+            with _rebuilding_lock:
+                _rebuilding.discard(collection.name)
+
+    threading.Thread(target=run, name=f"summary-{collection.name}", daemon=True).start()
+    return True
+
+
+def _stale_build(summary):
+    at = summary.get("building_at")
+    return at is None or at < datetime.utcnow() - timedelta(seconds=REBUILD_LEASE)
+
+
+def _has_figures(summary):
+    # Only a finished build stamps rebuilt_at; a claim alone leaves a stub
+    return summary is not None and "rebuilt_at" in summary
+
+
+def first_build(collection, kind, part_fn, projection=None, indexes=()):
+    """
+    Builds a missing summary in this request, or waits for the worker
+    already building it. Raises RuntimeError when that takes longer
+    than FIRST_BUILD_WAIT seconds.
+    """
+    deadline = time.monotonic() + FIRST_BUILD_WAIT
+    while True:
+        summary = rebuild_summary(collection, kind, part_fn, projection, indexes)
+        if summary is not None:
+            return summary
+        summary = summaries.find_one({"_id": collection.name})
+        if _has_figures(summary):
+            return summary
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"The summary of {collection.name} is still being built")
+        time.sleep(0.5)
+
+
+def get_summary(collection, kind, part_fn, projection=None, indexes=()):
+    """
+    Summary document of a cycle collection. A missing one is built before
+    returning; one whose rebuild died is rebuilt in the background, the
+    old figures being served meanwhile.
+    """
+    summary = summaries.find_one({"_id": collection.name})
+    if not _has_figures(summary):
+        return first_build(collection, kind, part_fn, projection, indexes)
+    if "building" in summary:
+        if _stale_build(summary):
+            schedule_summary_rebuild(collection, kind, part_fn, projection, indexes)
+    elif dirty_collection_for(collection).find_one({}, {"_id": 1}):
+        # Written just as a rebuild finished
+        replay_dirty(collection, part_fn, projection)
+    return summary
+
+
+def sync_summary_part(collection, doc_id, part_fn, projection=None):
+    """
+    Re-reads one booking document after a write and moves the cycle
+    summary by the difference between its new and previous parts.
+
+    The old part is swapped out atomically, so concurrent writes to the
+    same document still add up. While the summary is missing or being
+    rebuilt the document is only noted as dirty; the rebuild replays it.
+    """
+    summary = summaries.find_one({"_id": collection.name}, {"building": 1})
+    if summary is None or "building" in summary:
+        dirty_collection_for(collection).update_one({"_id": doc_id}, {"$set": {"at": datetime.utcnow()}}, upsert=True)
+        return
+
+    parts = parts_collection_for(collection)
+    doc = collection.find_one({"_id": doc_id}, projection)
+
+    if doc:
+        new_inc, fields = part_fn(doc)
+        old = parts.find_one_and_replace(
+            {"_id": doc_id},
+            dict(fields, _id=doc_id, inc=list(new_inc.items())),
+            upsert=True
+        )
+    else:
+        new_inc = {}
+        old = parts.find_one_and_delete({"_id": doc_id})
+
+    old_inc = dict(tuple(x) for x in old.get("inc", [])) if old else {}
+    delta = _delta(new_inc, old_inc)
+    if delta:
+        summaries.update_one({"_id": collection.name}, {"$inc": delta})
+
+
+def drop_summary(collection):
+    summaries.delete_one({"_id": collection.name})
+    parts_collection_for(collection).drop()
+    dirty_collection_for(collection).drop()
+
+
+def positive(mapping, field=None):
+    """
+    Decoded counters whose count is still above zero. With `field`, values
+    are sub-documents and the check applies to value[field].
+    """
+    out = {}
+    for k, v in decoded(mapping).items():
+        count = v.get(field, 0) if field else v
+        if count > 0:
+            out[k] = v
+    return out
+
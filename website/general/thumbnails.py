@@ -0,0 +1,113 @@
+# thumbnails.py
+#
+# Derivative images for the documents the app renders: a source photo
+# resized to the box it is drawn in, re-encoded as a small JPEG.
+#
+# Derivatives live in THUMBNAIL_CACHE_DIR named by the SHA-1 of the source
+# bytes and the derivative spec, so an edited photo or a new size never
+# serves a stale file and processes (or a build step, see
+# scratch/build_thumbnails.py) can share the directory. Each process
+# remembers the name per source path, re-hashing only when the file's
+# size or mtime changes.
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_CACHE_DIR = os.environ.get(
+    "THUMBNAIL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "image_traditional_thumbnails")
+)
+
+MM_PER_INCH = 25.4
+
+_known = {}
+_known_lock = threading.Lock()
+
+
+def box_pixels(width_mm, height_mm, dpi):
+    """Pixel size of a width x height mm box printed at `dpi`"""
+    return round(width_mm / MM_PER_INCH * dpi), round(height_mm / MM_PER_INCH * dpi)
+
+
+def has_alpha(img):
+    return img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+
+
+def thumbnail_bytes(img, size, quality, background=None):
+    """
+    (bytes, extension) of an open image resized to exactly `size`: a JPEG,
+    or a PNG when the image is transparent and no `background` colour to
+    flatten it onto is given.
+    """
+    out = io.BytesIO()
+    if has_alpha(img):
+        img = img.convert("RGBA").resize(size, Image.LANCZOS)
+        if background is None:
+            img.save(out, "PNG", optimize=True)
+            return out.getvalue(), "png"
+        flat = Image.new("RGB", size, background)
+        flat.paste(img, mask=img.getchannel("A"))
+        flat.save(out, "JPEG", quality=quality, optimize=True)
+        return out.getvalue(), "jpg"
+    img.draft("RGB", size)
+    img.convert("RGB").resize(size, Image.LANCZOS).save(out, "JPEG", quality=quality, optimize=True)
+    return out.getvalue(), "jpg"
+
+
+def thumbnail_path(source, width_mm, height_mm=None, dpi=150, quality=75, background=None):
+    """
+    Path of the derivative of `source` for a width x height mm box (height
+    from the aspect ratio when None), creating it on first use. A
+    transparent image drawn on a known colour can be flattened onto that
+    `background` (an RGB tuple) and stored as a JPEG. Returns
+    the source itself when it cannot be made (unreadable image, read-only
+    cache directory), or None when the source does not exist.
+    """
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return None
+
+    spec = f"{width_mm}x{height_mm}mm@{dpi}q{quality}bg{background}"
+    memo_key = (source, spec)
+    known = _known.get(memo_key)
+    if known and known[0] == (stat.st_size, stat.st_mtime_ns):
+        return known[1]
+
+    try:
+        with open(source, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw)
+        digest.update(spec.encode())
+        stem = os.path.join(THUMBNAIL_CACHE_DIR, digest.hexdigest())
+        path = next((stem + ext for ext in (".jpg", ".png") if os.path.exists(stem + ext)), None)
+
+        if path is None:
+            with Image.open(io.BytesIO(raw)) as img:
+                if height_mm is None:
+                    size = box_pixels(width_mm, width_mm * img.height / img.width, dpi)
+                else:
+                    size = box_pixels(width_mm, height_mm, dpi)
+                data, ext = thumbnail_bytes(img, size, quality, background)
+            path = f"{stem}.{ext}"
+            os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+            # Written aside and renamed so a reader never sees half a file
+            fd, tmp = tempfile.mkstemp(dir=THUMBNAIL_CACHE_DIR, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+    except Exception as e:
+        logger.warning("Could not make a thumbnail of %s: %s", source, e)
+        path = source
+
+    with _known_lock:
+        _known[memo_key] = ((stat.st_size, stat.st_mtime_ns), path)
+    return path
@@ -1,9 +1,9 @@
 import io
-import os
 import csv
 import re
 from datetime import datetime
 from collections import Counter
+from functools import lru_cache
 from flask import send_file, Response, current_app
 from fpdf import FPDF
 import qrcode
@@ -182,152 +182,138 @@ def generate_qr_code(url):
 # 💬 META WHATSAPP CLOUD API INTEGRATION
 # =========================
 
-import requests
+from website.general import whatsapp
+
 
 def send_whatsapp_pdf_cloud_api(mobile_number, pdf_url, customer_name, filename=None):
     """
     Sends a PDF document directly to a customer's WhatsApp inbox via Meta Cloud API.
     Requires WHATSAPP_TOKEN and WHATSAPP_PHONE_ID environment variables.
+    Blocks on the request; routes queue website/navaratri/ndispatch.py jobs instead.
     """
-    token = os.environ.get("WHATSAPP_TOKEN")
-    phone_id = os.environ.get("WHATSAPP_PHONE_ID")
-
-    if not token or not phone_id:
-        print("[WhatsApp API] Missing WHATSAPP_TOKEN or WHATSAPP_PHONE_ID in .env")
-        return False, "WhatsApp API credentials not configured."
-
-    # Ensure clean 10-digit mobile number with country code 91
-    clean_mobile = str(mobile_number).strip().replace("+", "").replace(" ", "").replace("-", "")
-    if len(clean_mobile) == 10:
-        clean_mobile = "91" + clean_mobile
-
-    url = f"https://graph.facebook.com/v18.0/{phone_id}/messages"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-
-    doc_filename = filename or f"{customer_name.strip().replace(' ', '_')}_Rental_Invoice.pdf"
-
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": clean_mobile,
-        "type": "document",
-        "document": {
-            "link": pdf_url,
-            "filename": doc_filename,
-            "caption": f"Hello {customer_name}, here is your rental invoice PDF from Image Traditional!"
-        }
-    }
-
-    try:
-        res = requests.post(url, json=payload, headers=headers, timeout=10)
-        res_data = res.json()
-
-        if res.status_code in (200, 201):
-            return True, res_data
-        else:
-            err_msg = res_data.get("error", {}).get("message", res.text)
-            print(f"[WhatsApp API Error]: {err_msg}")
-            return False, err_msg
-    except Exception as e:
-        print(f"[WhatsApp API Exception]: {str(e)}")
-        return False, str(e)
+    payload = whatsapp.document_payload(mobile_number, pdf_url, customer_name, filename)
+    ok, res_data, _ = whatsapp.post_message(payload)
+    if not ok:
+        print(f"[WhatsApp API Error]: {res_data}")
+    return ok, res_data
 
 
 def send_whatsapp_text_cloud_api(mobile_number, message_text):
     """
     Sends a text message directly to a customer's WhatsApp inbox via Meta Cloud API.
     """
-    token = os.environ.get("WHATSAPP_TOKEN")
-    phone_id = os.environ.get("WHATSAPP_PHONE_ID")
-
-    if not token or not phone_id:
-        return False, "WhatsApp API credentials not configured."
-
-    clean_mobile = str(mobile_number).strip().replace("+", "").replace(" ", "").replace("-", "")
-    if len(clean_mobile) == 10:
-        clean_mobile = "91" + clean_mobile
-
-    url = f"https://graph.facebook.com/v18.0/{phone_id}/messages"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": clean_mobile,
-        "type": "text",
-        "text": {
-            "preview_url": True,
-            "body": message_text
-        }
-    }
-
-    try:
-        res = requests.post(url, json=payload, headers=headers, timeout=10)
-        return res.status_code in (200, 201), res.json()
-    except Exception as e:
-        return False, str(e)
+    ok, res_data, _ = whatsapp.post_message(whatsapp.text_payload(mobile_number, message_text))
+    return ok, res_data
 
 
 # =========================
 # 📍 LOCALITY RESOLUTION
 # =========================
 
-BUILDING_SUFFIX_REGEX = re.compile(
-    r'^\s*(apartment|apartments|flat|flats|society|soc|villa|villas|complex|tower|towers|bhuvan|house|enclave|residency|plaza|arcade|heights|row\s*house|scheme|bungalow|bungalows|apt|apts)\b',
-    re.IGNORECASE
-)
+BUILDING_SUFFIXES = r'(?:apartment|apartments|flat|flats|society|soc|villa|villas|complex|tower|towers|bhuvan|house|enclave|residency|plaza|arcade|heights|row\s*house|scheme|bungalow|bungalows|apt|apts)'
+
+BUILDING_SUFFIX_REGEX = re.compile(r'^\s*' + BUILDING_SUFFIXES + r'\b', re.IGNORECASE)
+
+
+def _trie_pattern(words):
+    """Regex alternation of `words` shaped as a trie, longer continuations tried first"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        alt = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + alt + ')?' if '' in node else alt
+
+    return build(trie)
+
+
+class LocalityMatcher:
+    """
+    Every locality name compiled into one regex, so an address is scanned
+    once instead of once per locality.
+
+    The names form a trie tried at each word start; at a position the
+    longest name not followed by a building suffix matches ('Anand' in
+    'Anand Apartment' is skipped). Across positions the longest name wins,
+    ties going to the name listed first, as with the old per-name scan.
+    """
+
+    def __init__(self, localities, version=None):
+        self.version = version
+        self.names = {}
+        self._rank = {}
+        for name in localities:
+            if not name:
+                continue
+            low = name.lower()
+            if low not in self.names:
+                self.names[low] = name
+                self._rank[low] = len(self._rank)
+
+        self._pattern = None
+        if self.names:
+            self._pattern = re.compile(
+                r'\b(?=(' + _trie_pattern(self.names) + r')\b(?!\s*' + BUILDING_SUFFIXES + r'\b))'
+            )
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, text):
+        """Locality named in `text`, or None"""
+        if self._pattern is None or not text:
+            return None
+        best = None
+        for m in self._pattern.finditer(text.lower()):
+            low = m.group(1)
+            if best is None or len(low) > len(best) or (len(low) == len(best) and self._rank[low] < self._rank[best]):
+                best = low
+        return self.names[best] if best else None
+
+    def resolve(self, customer):
+        loc_val = (customer.get("locality") or "").strip()
+        addr_val = (customer.get("address") or "").strip()
+
+        # 1. First check explicit locality field
+        if loc_val:
+            loc_val_lower = loc_val.lower()
+            if loc_val_lower in self.names:
+                return self.names[loc_val_lower]
+
+            found = self.find(loc_val_lower)
+            if found:
+                return found
+
+            # Explicit locality is present on customer record - respect it as settled
+            if not BUILDING_SUFFIX_REGEX.match(loc_val_lower):
+                return loc_val
+
+        # 2. Check address field
+        if addr_val and addr_val != "-":
+            return self.find(addr_val)
+
+        return None
+
+
+@lru_cache(maxsize=8)
+def _list_matcher(localities):
+    return LocalityMatcher(localities)
+
 
 def resolve_customer_locality(customer, active_localities):
     """
     Resolves the exact locality of a customer from explicit locality or address text,
     ensuring building/society names (like 'Anand Apartment', 'Anand Flat', 'Anand Society')
     do not falsely match locality names ('Anand').
+    `active_localities` is a LocalityMatcher, or a list of names compiled into one (cached).
     """
-    loc_val = (customer.get("locality") or "").strip()
-    addr_val = (customer.get("address") or "").strip()
-
-    # 1. First check explicit locality field
-    if loc_val:
-        loc_val_lower = loc_val.lower()
-        # Exact match first
-        for loc in active_localities:
-            if loc.lower() == loc_val_lower:
-                return loc
-
-        # Word boundary match on explicit locality field (preferring longer locality names)
-        sorted_locs = sorted(active_localities, key=len, reverse=True)
-        for loc in sorted_locs:
-            pattern = r'\b' + re.escape(loc.lower()) + r'\b'
-            m = re.search(pattern, loc_val_lower)
-            if m:
-                remainder = loc_val_lower[m.end():]
-                if BUILDING_SUFFIX_REGEX.match(remainder):
-                    continue
-                return loc
-
-        # Explicit locality is present on customer record - respect it as settled
-        if not BUILDING_SUFFIX_REGEX.match(loc_val_lower):
-            return loc_val
-
-    # 2. Check address field
-    if addr_val and addr_val != "-":
-        addr_lower = addr_val.lower()
-        sorted_locs = sorted(active_localities, key=len, reverse=True)
-
-        for loc in sorted_locs:
-            pattern = r'\b' + re.escape(loc.lower()) + r'\b'
-            m = re.search(pattern, addr_lower)
-            if m:
-                remainder = addr_lower[m.end():]
-                if BUILDING_SUFFIX_REGEX.match(remainder):
-                    # Matched building/society prefix (e.g., "Anand Apartment"), skip it and look for actual locality name
-                    continue
-                return loc
-
-    return None
\ No newline at end of file
+    if not isinstance(active_localities, LocalityMatcher):
+        active_localities = _list_matcher(tuple(active_localities))
+    return active_localities.resolve(customer)
\ No newline at end of file
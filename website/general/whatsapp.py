@@ -0,0 +1,164 @@
+# whatsapp.py
+#
+# Meta WhatsApp Cloud API (Graph API) client shared by the utils helpers
+# and the dispatch jobs. WHATSAPP_GRAPH_URL points it somewhere other than
+# graph.facebook.com, e.g. scratch/fake_graph_api.py in a dry run.
+#
+# Calls go through pooled requests.Sessions, so a run of messages reuses
+# its TLS connections: one shared per process for single sends, and one
+# per broadcast sized to its concurrency, paced by a RateLimiter.
+#
+# post_message() reports whether a failure is worth retrying: RETRY when
+# Meta did not take the message (connect timeout, 429, most 5xx), UNKNOWN
+# when it may have (read timeout, dropped connection, gateway timeout) and
+# None for anything else (bad number, expired token), which will fail the
+# same way again.
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GRAPH_API_URL = os.environ.get("WHATSAPP_GRAPH_URL", "https://graph.facebook.com/v18.0").rstrip("/")
+WHATSAPP_TIMEOUT = float(os.environ.get("WHATSAPP_TIMEOUT", 10))
+
+WHATSAPP_POOL_SIZE = int(os.environ.get("WHATSAPP_POOL_SIZE", 8))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503}
+AMBIGUOUS_STATUS = {504}
+
+RETRY = "retry"
+UNKNOWN = "unknown"
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def credentials():
+    """(token, phone_id) from the environment, either may be None"""
+    return os.environ.get("WHATSAPP_TOKEN"), os.environ.get("WHATSAPP_PHONE_ID")
+
+
+def clean_mobile(mobile_number):
+    """Digits of a mobile number with the 91 country code of a 10 digit one"""
+    clean = str(mobile_number).strip().replace("+", "").replace(" ", "").replace("-", "")
+    if len(clean) == 10:
+        clean = "91" + clean
+    return clean
+
+
+def messages_url(phone_id):
+    return f"{GRAPH_API_URL}/{phone_id}/messages"
+
+
+def graph_session(pool_size=WHATSAPP_POOL_SIZE):
+    """New requests.Session keeping up to `pool_size` connections alive, without retries of its own"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def shared_session():
+    """The graph_session() of this process (a fresh one in a forked child)"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                _session = graph_session()
+                _session_pid = os.getpid()
+    return _session
+
+
+class RateLimiter:
+    """Spaces calls from any number of threads at least 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def invoice_filename(customer_name):
+    return f"{customer_name.strip().replace(' ', '_')}_Rental_Invoice.pdf"
+
+
+def document_payload(mobile_number, pdf_url, customer_name, filename=None):
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": clean_mobile(mobile_number),
+        "type": "document",
+        "document": {
+            "link": pdf_url,
+            "filename": filename or invoice_filename(customer_name),
+            "caption": f"Hello {customer_name}, here is your rental invoice PDF from Image Traditional!"
+        }
+    }
+
+
+def text_payload(mobile_number, message_text):
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": clean_mobile(mobile_number),
+        "type": "text",
+        "text": {
+            "preview_url": True,
+            "body": message_text
+        }
+    }
+
+
+def post_message(payload, http=None, timeout=WHATSAPP_TIMEOUT):
+    """
+    POSTs one message payload through `http` (a Session, the shared one
+    by default). Returns (ok, response data or error message, retry), retry
+    being RETRY, UNKNOWN or None.
+    """
+    token, phone_id = credentials()
+    if not token or not phone_id:
+        return False, "WhatsApp API credentials not configured.", None
+
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+    http = http or shared_session()
+    try:
+        res = http.post(messages_url(phone_id), json=payload, headers=headers, timeout=timeout)
+    except requests.ConnectTimeout as e:
+        return False, str(e), RETRY
+    except requests.RequestException as e:
+        return False, str(e), UNKNOWN
+
+    try:
+        res_data = res.json()
+    except ValueError:
+        res_data = {}
+    if res.status_code in (200, 201):
+        return True, res_data, None
+    err_msg = (res_data.get("error") or {}).get("message") or res.text or f"HTTP {res.status_code}"
+    if res.status_code in AMBIGUOUS_STATUS:
+        return False, err_msg, UNKNOWN
+    return False, err_msg, RETRY if res.status_code in RETRYABLE_STATUS else None
+
+
+def message_id(res_data):
+    """wamid of an accepted message, or None"""
+    messages = res_data.get("messages") if isinstance(res_data, dict) else None
+    return messages[0].get("id") if messages else None
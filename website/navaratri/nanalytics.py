@@ -0,0 +1,218 @@
+# nanalytics.py
+#
+# Navaratri dashboard figures shared by the cycle summaries (nsummary.py):
+# how a customer document's prices and bookings are read, and the stats
+# and product insights built from the summed counters.
+
+import heapq
+from datetime import datetime
+
+from website.navaratri.nindex import CHOLI_CODES, KEDIYA_CODES
+
+ANALYTICS_PROJECTION = {
+    "Name": 1, "name": 1, "mobile": 1, "address": 1,
+    "total_price": 1, "given_price": 1,
+    "group": 1, "reference": 1, "bookings": 1
+}
+
+# Offset the dashboards have always added to the cycle collection.
+COLLECTION_OFFSET = 29500
+
+
+def safe_int(val):
+    try:
+        return int(float(str(val).strip()))
+    except (ValueError, TypeError, AttributeError):
+        return 0
+
+
+def strict_int(val):
+    """int() the way find_highest_booking_customer always parsed prices"""
+    try:
+        return int(val or 0)
+    except Exception:
+        return 0
+
+
+def top_items(counts, n):
+    """
+    Same result as sorted(counts.items(), key=count, reverse=True)[:n],
+    ties kept in insertion order, without sorting the whole dict.
+    """
+    return heapq.nlargest(n, counts.items(), key=lambda x: x[1])
+
+
+def first_max(counts):
+    """(key, count) like max(counts, key=counts.get): first key wins ties"""
+    if not counts:
+        return "N/A", 0
+    best = max(counts, key=counts.get)
+    return best, counts[best]
+
+
+# ------------------ FIGURES ------------------
+
+def totals_stats(customers, collection, given, fully_paid, partially_paid, unpaid):
+    total_collection = collection + COLLECTION_OFFSET
+    return {
+        "total_customers_trad": customers,
+        "total_collection_trad": total_collection,
+        "total_given_trad": given,
+        "total_rem_trad": total_collection - given - COLLECTION_OFFSET,
+        "avg_trad": total_collection / customers if customers > 0 else 0,
+        "payment_status": {
+            "fully_paid": fully_paid,
+            "partially_paid": partially_paid,
+            "unpaid": unpaid
+        }
+    }
+
+
+class ProductAccumulator:
+    """Product popularity, bookings per date and choli/kediya pairings"""
+
+    def __init__(self):
+        self.product_counts = {}
+        self.choli_counts = {}
+        self.kediya_counts = {}
+        self.total_items = 0
+        self.by_date = {}
+        self.pairs = {}
+
+    def add(self, doc):
+        bookings = doc.get("bookings", {})
+        if not isinstance(bookings, dict):
+            return
+
+        for raw_date, products in bookings.items():
+            if not isinstance(products, list):
+                continue
+
+            cholis = []
+            kediyas = []
+            for p in products:
+                if not (isinstance(p, str) and p.strip()):
+                    continue
+                code = p.strip().upper()
+                self.product_counts[code] = self.product_counts.get(code, 0) + 1
+                self.total_items += 1
+                if code.startswith('C'):
+                    self.choli_counts[code] = self.choli_counts.get(code, 0) + 1
+                    cholis.append(code)
+                elif code.startswith('K'):
+                    self.kediya_counts[code] = self.kediya_counts.get(code, 0) + 1
+                    kediyas.append(code)
+
+            if products:
+                # Remove anything like ][][ or spaces
+                clean_date = raw_date.split('[')[0].strip()
+                if clean_date:
+                    self.by_date[clean_date] = self.by_date.get(clean_date, 0) + len(products)
+
+            if len(products) >= 2:
+                for c in cholis:
+                    for k in kediyas:
+                        self.pairs[(c, k)] = self.pairs.get((c, k), 0) + 1
+
+    def bookings_by_date(self):
+        items = []
+        for date_str, count in self.by_date.items():
+            parsed_date = None
+            for fmt in ["%d-%m-%y", "%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"]:
+                try:
+                    parsed_date = datetime.strptime(date_str, fmt)
+                    break
+                except ValueError:
+                    continue
+            items.append((parsed_date or datetime.min, date_str, count))
+        items.sort(key=lambda x: x[0])
+        return [{"date": item[1], "count": item[2]} for item in items]
+
+    def result(self):
+        best_c, best_c_count = first_max(self.choli_counts)
+        best_k, best_k_count = first_max(self.kediya_counts)
+        return {
+            "best_c": best_c,
+            "best_c_count": best_c_count,
+            "best_k": best_k,
+            "best_k_count": best_k_count,
+            "total_items_rented": self.total_items,
+            "choli_count": sum(self.choli_counts.values()),
+            "kediya_count": sum(self.kediya_counts.values()),
+            "top_cholis": top_items(self.choli_counts, 10),
+            "top_kediyas": top_items(self.kediya_counts, 10),
+            "top_products": top_items(self.product_counts, 15),
+            "bookings_by_date": self.bookings_by_date(),
+            "top_pairs": top_items(self.pairs, 10)
+        }
+
+
+def product_insights(stats, products):
+    """Adds the utilization, wear, pairing and rotation insights to `stats`"""
+    product_counts = products.product_counts
+    top_pairs = stats.pop("top_pairs")
+
+    # ── Product-Centric Analytical AI ──
+    # A. Stock Utilization & Capacity Analytics
+    total_choli_stock = len(CHOLI_CODES)
+    total_kediya_stock = len(KEDIYA_CODES)
+    total_stock = total_choli_stock + total_kediya_stock
+
+    rented_codes = set(product_counts.keys())
+    rented_cholis = {code for code in rented_codes if code.startswith('C')}
+    rented_kediyas = {code for code in rented_codes if code.startswith('K')}
+
+    stats["utilization"] = {
+        "choli_pct": round((len(rented_cholis) / total_choli_stock) * 100, 1) if total_choli_stock > 0 else 0,
+        "kediya_pct": round((len(rented_kediyas) / total_kediya_stock) * 100, 1) if total_kediya_stock > 0 else 0,
+        "overall_pct": round((len(rented_codes) / total_stock) * 100, 1) if total_stock > 0 else 0,
+        "total_stock": total_stock,
+        "rented_unique": len(rented_codes),
+        "product_counts": product_counts
+    }
+
+    # B. Wear and Tear Heuristics (Since products are unique, track usage levels)
+    wear_tear_alerts = []
+    for code, count in stats["top_products"]:
+        if count >= 3:
+            wear_tear_alerts.append({
+                "code": code,
+                "rentals": count,
+                "util_level": "High" if count >= 4 else "Medium",
+                "action": "Inspect fabric integrity. Consider maintenance or retirement. Replace with a new unique design to keep catalog fresh." if count >= 4 else "Perform standard fabric care, starching and button checks."
+            })
+    stats["wear_tear_alerts"] = wear_tear_alerts
+
+    # C. Cross-Selling Style Pairings (Items booked together on same date/account)
+    stats["style_pairings"] = [
+        {
+            "choli": pair[0],
+            "kediya": pair[1],
+            "count": count,
+            "suggestion": "Highly associated pair. Recommend displaying together in catalog as a pre-matched style."
+        }
+        for pair, count in top_pairs
+    ]
+
+    # D. Catalog Showcase Rotations (Identify idle unique garments)
+    unbooked_cholis = [code for code in CHOLI_CODES if code not in rented_cholis]
+    unbooked_kediyas = [code for code in KEDIYA_CODES if code not in rented_kediyas]
+
+    catalog_rotations = []
+    for code in unbooked_cholis[:4]:
+        catalog_rotations.append({
+            "code": code,
+            "type": "Choli",
+            "reason": "Idle this cycle (0 bookings).",
+            "action": "Rotate to homepage featured slider or display at entrance window."
+        })
+    for code in unbooked_kediyas[:4]:
+        catalog_rotations.append({
+            "code": code,
+            "type": "Kediya",
+            "reason": "Idle this cycle (0 bookings).",
+            "action": "Reposition in catalog list header or display as outfit alternative."
+        })
+    stats["catalog_rotations"] = catalog_rotations
+
+    return stats
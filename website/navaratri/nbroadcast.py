@@ -0,0 +1,282 @@
+# nbroadcast.py
+#
+# Closing-time WhatsApp broadcast: a reminder or the bill for every
+# customer of a cycle with bookings on a date (by default tomorrow), read
+# from the cycle's {name}_lines index, or for every customer of the cycle.
+#
+# A broadcast is a document in `broadcasts` plus one row per recipient
+# (one per mobile number) in broadcast_recipients, holding the outcome of
+# its send. It runs as one background job (website/general/jobs.py) that
+# sends to the recipients still pending, `concurrency` at a time through
+# one pooled graph_session() and paced by a RateLimiter at `rate`
+# messages per second. Recipients that failed in a retryable way stay
+# pending and the job is retried with backoff; a crashed worker's job is
+# picked up again when its lease runs out. Either way only the pending
+# rows are sent, and every message goes through ndispatch.deliver(), so
+# a retry does not resend what Meta already accepted. A recipient whose
+# send timed out waits for its delivery claim to expire (retry_at) before
+# it is tried again.
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import current_app
+from pymongo import ASCENDING
+
+from website.general.db import db
+from website.general.jobs import JobFailed, RetryJob, enqueue, job_handler
+from website.general.whatsapp import RateLimiter, clean_mobile, document_payload, graph_session, text_payload
+from website.navaratri.ndispatch import deliver, invoice_link
+from website.navaratri.ninvoice import store_invoice
+from website.navaratri.nlines import get_lines
+
+BROADCAST = "whatsapp_broadcast"
+MESSAGES = ("reminder", "bill")
+
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", 10))
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", 4))
+# Meta's default throughput is 80 messages per second per number
+MAX_RATE = 80
+MAX_CONCURRENCY = 32
+RECIPIENT_MAX_ATTEMPTS = 5
+BROADCAST_JOB_ATTEMPTS = 8
+
+PENDING = "pending"
+SENT = "sent"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+broadcasts = db["broadcasts"]
+recipients = db["broadcast_recipients"]
+
+_indexed = False
+
+
+def _ensure_indexes():
+    global _indexed
+    if not _indexed:
+        recipients.create_index([("broadcast_id", ASCENDING), ("status", ASCENDING)])
+        _indexed = True
+
+
+# ------------------ RECIPIENTS ------------------
+
+def next_date():
+    """ISO date of tomorrow, the default broadcast date"""
+    return (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def select_recipients(collection, date=None):
+    """
+    [{customer_id, name, mobile, products}] of the customers of a cycle
+    collection booked on ISO `date` (with that day's product codes), or of
+    all its customers with bookings. One entry per mobile number.
+    """
+    found = []
+    if date:
+        by_customer = {}
+        rows = get_lines(collection).find(
+            {"date": date}, {"customer_id": 1, "name": 1, "mobile": 1, "product_code": 1}
+        ).sort("product_code", ASCENDING)
+        for row in rows:
+            entry = by_customer.setdefault(row["customer_id"], {
+                "customer_id": row["customer_id"],
+                "name": row.get("name", "Customer"),
+                "mobile": row.get("mobile", ""),
+                "products": []
+            })
+            entry["products"].append(row["product_code"])
+        found = list(by_customer.values())
+    else:
+        for doc in collection.find({"bookings": {"$nin": [None, {}]}}, {"Name": 1, "mobile": 1}):
+            found.append({
+                "customer_id": doc["_id"],
+                "name": doc.get("Name", "Customer"),
+                "mobile": doc.get("mobile", ""),
+                "products": []
+            })
+
+    unique = {}
+    for entry in found:
+        mobile = clean_mobile(entry["mobile"]) if entry["mobile"] else ""
+        if mobile and mobile not in unique:
+            entry["mobile"] = mobile
+            unique[mobile] = entry
+    return list(unique.values())
+
+
+def reminder_text(name, date, products):
+    day = datetime.strptime(date, "%Y-%m-%d").strftime("%d-%m-%Y")
+    items = f" ({', '.join(products)})" if products else ""
+    return (
+        f"Hello {name}, a reminder from Image Traditional: your rental booking{items} "
+        f"is for {day}. Please collect your items from the shop."
+    )
+
+
+# ------------------ BROADCASTS ------------------
+
+def create_broadcast(collection_name, message, url_root, date=None, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY):
+    """
+    Records a broadcast and its recipients and queues the job sending it.
+    Returns the broadcast document.
+    """
+    if message not in MESSAGES:
+        raise ValueError(f"Unknown message {message!r}")
+    if message == "reminder" and not date:
+        raise ValueError("A reminder needs a date")
+    _ensure_indexes()
+
+    selected = select_recipients(db[collection_name], date)
+    now = datetime.utcnow()
+    broadcast = {
+        "collection": collection_name,
+        "message": message,
+        "date": date,
+        "url_root": url_root,
+        "rate": min(max(float(rate), 0.1), MAX_RATE),
+        "concurrency": min(max(int(concurrency), 1), MAX_CONCURRENCY),
+        "status": "queued",
+        "total": len(selected),
+        "created_at": now
+    }
+    broadcast_id = broadcasts.insert_one(broadcast).inserted_id
+    if selected:
+        recipients.insert_many([
+            dict(entry, _id=f"{broadcast_id}:{entry['mobile']}", broadcast_id=broadcast_id,
+                 status=PENDING, attempts=0, updated_at=now)
+            for entry in selected
+        ])
+    broadcast["job_id"] = queue_broadcast(broadcast_id)
+    return broadcast
+
+
+def queue_broadcast(broadcast_id):
+    """Queues (or finds) the job sending the pending recipients; returns its id"""
+    job_id = enqueue(
+        BROADCAST, {"broadcast_id": str(broadcast_id)},
+        dedupe_key=f"{BROADCAST}:{broadcast_id}", max_attempts=BROADCAST_JOB_ATTEMPTS
+    )
+    broadcasts.update_one({"_id": broadcast_id}, {"$set": {"job_id": job_id}})
+    return job_id
+
+
+def get_broadcast(broadcast_id):
+    try:
+        return broadcasts.find_one({"_id": ObjectId(broadcast_id)})
+    except Exception:
+        return None
+
+
+def broadcast_counts(broadcast_id):
+    """{pending, sent, skipped, failed} recipients of a broadcast"""
+    counts = dict.fromkeys((PENDING, SENT, SKIPPED, FAILED), 0)
+    for row in recipients.aggregate([
+        {"$match": {"broadcast_id": broadcast_id}},
+        {"$group": {"_id": "$status", "n": {"$sum": 1}}}
+    ]):
+        counts[row["_id"]] = row["n"]
+    return counts
+
+
+def failed_recipients(broadcast_id, limit=100):
+    return list(recipients.find(
+        {"broadcast_id": broadcast_id, "status": FAILED},
+        {"_id": 0, "name": 1, "mobile": 1, "error": 1, "attempts": 1}
+    ).limit(limit))
+
+
+# ------------------ SENDING ------------------
+
+def send_to(broadcast, recipient, http, limiter):
+    """Sends one recipient's message and records the outcome on its row"""
+    fields = {}
+    attempt = 1
+    try:
+        mobile = recipient["mobile"]
+        if broadcast["message"] == "bill":
+            customer = db[broadcast["collection"]].find_one({"_id": recipient["customer_id"]})
+            if not customer:
+                raise JobFailed("Customer not found")
+            key = store_invoice(customer, current_app.static_folder, broadcast["collection"])
+            payload = document_payload(mobile, invoice_link(key, broadcast["url_root"]), recipient["name"])
+            delivery_id = f"{key}:{mobile}"
+        else:
+            payload = text_payload(mobile, reminder_text(recipient["name"], broadcast["date"], recipient["products"]))
+            delivery_id = f"reminder:{broadcast['collection']}:{broadcast['date']}:{mobile}"
+
+        wamid, already_sent = deliver(delivery_id, str(broadcast["_id"]), payload, http, limiter)
+        status = SKIPPED if already_sent else SENT
+        fields.update(message_id=wamid, sent_at=datetime.utcnow(), error=None)
+    except RetryJob as e:
+        if e.delay is not None:
+            # Waiting for a delivery claim, not a failed attempt
+            attempt = 0
+            fields["retry_at"] = datetime.utcnow() + timedelta(seconds=e.delay)
+        last = recipient.get("attempts", 0) + attempt >= RECIPIENT_MAX_ATTEMPTS
+        status = FAILED if last else PENDING
+        fields["error"] = str(e)
+    except JobFailed as e:
+        status = FAILED
+        fields["error"] = str(e)
+
+    recipients.update_one(
+        {"_id": recipient["_id"]},
+        {"$set": dict(fields, status=status, updated_at=datetime.utcnow()), "$inc": {"attempts": attempt}}
+    )
+    return status
+
+
+def retry_delay(broadcast_id):
+    """
+    Seconds until the last pending recipient waiting for a delivery claim
+    may be tried again, or None (the usual backoff) when none is waiting.
+    """
+    now = datetime.utcnow()
+    waiting = recipients.find_one(
+        {"broadcast_id": broadcast_id, "status": PENDING, "retry_at": {"$gt": now}},
+        {"retry_at": 1}, sort=[("retry_at", -1)]
+    )
+    return (waiting["retry_at"] - now).total_seconds() if waiting else None
+
+
+@job_handler(BROADCAST)
+def run_broadcast_job(job):
+    broadcast = get_broadcast(job.payload["broadcast_id"])
+    if broadcast is None:
+        raise JobFailed("Broadcast not found")
+    broadcast_id = broadcast["_id"]
+    broadcasts.update_one({"_id": broadcast_id}, {"$set": {"status": "running", "started_at": datetime.utcnow()}})
+
+    pending = list(recipients.find({"broadcast_id": broadcast_id, "status": PENDING}))
+    app = current_app._get_current_object()
+    http = graph_session(broadcast["concurrency"])
+    limiter = RateLimiter(broadcast["rate"])
+
+    def task(recipient):
+        with app.app_context():
+            return send_to(broadcast, recipient, http, limiter)
+
+    try:
+        with ThreadPoolExecutor(max_workers=broadcast["concurrency"]) as pool:
+            futures = [pool.submit(task, r) for r in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if done % 10 == 0 or done == len(futures):
+                    job.progress(**broadcast_counts(broadcast_id))
+    finally:
+        http.close()
+
+    counts = broadcast_counts(broadcast_id)
+    job.progress(**counts)
+    if counts[PENDING]:
+        broadcasts.update_one({"_id": broadcast_id}, {"$set": {"status": "retrying", **counts}})
+        raise RetryJob(f"{counts[PENDING]} recipients left to retry", delay=retry_delay(broadcast_id))
+
+    broadcasts.update_one(
+        {"_id": broadcast_id},
+        {"$set": {"status": "done", "finished_at": datetime.utcnow(), **counts}}
+    )
+    return counts
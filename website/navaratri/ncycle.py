@@ -3,9 +3,24 @@ from flask import session
 from bson import ObjectId
 
 from website.general.db import db
+from website.general.cache import CycleRegistry, request_memo
+from website.general.indexes import ensure_cycle_indexes
 
 navaratri_cycles = db["navaratri_cycles"]
 
+# Process-wide copy of navaratri_cycles; every write to it must call invalidate_cycles()
+cycle_registry = CycleRegistry(navaratri_cycles)
+
+SELECTED_MEMO_KEY = "navaratri_selected_cycle"
+
+
+def invalidate_cycles():
+    """
+    Drops every cached view of navaratri_cycles (this process, other workers
+    through the version counter, and the current request's memo)
+    """
+    cycle_registry.invalidate()
+
 
 def format_cycle_date(date_value):
     """
@@ -43,21 +58,14 @@ def get_active_cycle():
     Returns active cycle
     """
 
-    return navaratri_cycles.find_one(
-        {"status": "active"}
-    )
+    return cycle_registry.find(status="active")
 
 
 def get_cycle_by_id(cycle_id):
     """
     Returns cycle by ObjectId
     """
-    try:
-        return navaratri_cycles.find_one(
-            {"_id": ObjectId(cycle_id)}
-        )
-    except:
-        return None
+    return cycle_registry.by_id(cycle_id)
 
 
 def create_cycle(name, collection_name):
@@ -65,7 +73,7 @@ def create_cycle(name, collection_name):
     Creates new cycle
     """
 
-    active_cycle = get_active_cycle()
+    active_cycle = navaratri_cycles.find_one({"status": "active"})
 
     if active_cycle:
         raise Exception(
@@ -82,6 +90,8 @@ def create_cycle(name, collection_name):
     }
 
     result = navaratri_cycles.insert_one(cycle)
+    invalidate_cycles()
+    ensure_cycle_indexes("navaratri", collection_name)
 
     return result.inserted_id
 
@@ -110,6 +120,7 @@ def end_cycle(cycle_id=None):
             }
         }
     )
+    invalidate_cycles()
 
     return True
 
@@ -119,8 +130,11 @@ def reactivate_cycle(cycle_id):
     Reactivates a closed cycle IF AND ONLY IF no other cycle is currently active.
     Returns (success: bool, message: str)
     """
-    active_cycle = get_active_cycle()
-    target_cycle = get_cycle_by_id(cycle_id)
+    active_cycle = navaratri_cycles.find_one({"status": "active"})
+    try:
+        target_cycle = navaratri_cycles.find_one({"_id": ObjectId(cycle_id)})
+    except Exception:
+        target_cycle = None
 
     if not target_cycle:
         return False, "Cycle not found."
@@ -138,21 +152,33 @@ def reactivate_cycle(cycle_id):
             "$unset": {"end_date": "", "closed_at": ""}
         }
     )
+    invalidate_cycles()
     return True, f"Cycle '{target_cycle.get('name')}' successfully reactivated!"
 
 
 
+def set_cycle_edit_override(cycle_id, enabled):
+    """
+    Unlocks (True) or re-locks (False) a closed cycle for editing
+    """
+
+    navaratri_cycles.update_one(
+        {"_id": ObjectId(cycle_id)},
+        {
+            "$set": {
+                "edit_override": enabled
+            }
+        }
+    )
+    invalidate_cycles()
+
+
 def get_all_cycles():
     """
     Returns all cycles
     """
 
-    return list(
-        navaratri_cycles.find().sort(
-            "created_at",
-            -1
-        )
-    )
+    return cycle_registry.all()
 
 
 def set_selected_cycle(cycle_id):
@@ -164,12 +190,27 @@ def set_selected_cycle(cycle_id):
     else:
         session["navaratri_cycle_id"] = str(cycle_id)
 
+    memo = request_memo()
+    if memo is not None:
+        memo.pop(SELECTED_MEMO_KEY, None)
+
 
 def get_selected_cycle():
     """
-    Returns selected cycle
+    Returns selected cycle, resolved once per request
     """
 
+    memo = request_memo()
+    if memo is not None and SELECTED_MEMO_KEY in memo:
+        return memo[SELECTED_MEMO_KEY]
+
+    cycle = _resolve_selected_cycle()
+    if memo is not None:
+        memo[SELECTED_MEMO_KEY] = cycle
+    return cycle
+
+
+def _resolve_selected_cycle():
     cycle_id = session.get("navaratri_cycle_id")
 
     # If a specific cycle is selected
@@ -181,9 +222,7 @@ def get_selected_cycle():
     # Legacy support:
     # If "default" is selected, use the Form collection cycle from DB
     if cycle_id == "default":
-        form_cycle = navaratri_cycles.find_one(
-            {"collection_name": "Form"}
-        )
+        form_cycle = cycle_registry.find(collection_name="Form")
 
         if form_cycle:
             return form_cycle
@@ -194,9 +233,7 @@ def get_selected_cycle():
         return active
 
     # Final fallback: Form collection cycle
-    form_cycle = navaratri_cycles.find_one(
-        {"collection_name": "Form"}
-    )
+    form_cycle = cycle_registry.find(collection_name="Form")
 
     if form_cycle:
         return form_cycle
@@ -0,0 +1,142 @@
+# ndispatch.py
+#
+# WhatsApp delivery of navaratri invoices as background jobs
+# (website/general/jobs.py): /api/send-whatsapp-auto queues a job and
+# answers at once, a job worker renders the invoice and calls the Cloud API.
+#
+# The message links to /invoice/<key>.pdf, the invoice stored under its
+# content key (ninvoice.store_invoice), so Meta's fetch of the document
+# never renders anything.
+#
+# whatsapp_deliveries holds one row per delivery (an invoice version or a
+# broadcast reminder, to one number), claimed before the API call and kept
+# once the message is accepted, so pressing the button again, a retried
+# job or a broadcast (nbroadcast.py) including it does not send it again.
+#
+# A claim is only given up when Meta certainly did not take the message.
+# After a timeout or dropped connection it may have, so the claim stays
+# until its lease (JOB_LEASE) runs out and the next attempt sends again:
+# such a message can arrive twice, but it is never lost.
+
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import current_app, url_for
+from pymongo.errors import DuplicateKeyError
+
+from website.general.db import db
+from website.general.jobs import JOB_LEASE, JobFailed, RetryJob, enqueue, job_handler
+from website.general.whatsapp import RETRY, UNKNOWN, clean_mobile, document_payload, message_id, post_message
+from website.navaratri.ninvoice import store_invoice
+
+SEND_INVOICE = "whatsapp_invoice"
+
+deliveries = db["whatsapp_deliveries"]
+
+
+# ------------------ DELIVERIES ------------------
+
+def claim_delivery(delivery_id, owner):
+    """
+    True when `owner` (a job or broadcast id) may send the delivery: nobody
+    claimed it yet, or the claim of a worker that died has expired.
+    """
+    now = datetime.utcnow()
+    try:
+        deliveries.insert_one({"_id": delivery_id, "status": "sending", "owner": owner, "claimed_at": now})
+        return True
+    except DuplicateKeyError:
+        pass
+    res = deliveries.update_one(
+        {"_id": delivery_id, "status": "sending", "claimed_at": {"$lt": now - timedelta(seconds=JOB_LEASE)}},
+        {"$set": {"owner": owner, "claimed_at": now}}
+    )
+    return res.modified_count == 1
+
+
+def release_delivery(delivery_id, owner):
+    """Drops our claim after a failed send so a retry can take it"""
+    deliveries.delete_one({"_id": delivery_id, "status": "sending", "owner": owner})
+
+
+def lease_left(delivery):
+    """Seconds until the claim on a delivery may be taken over"""
+    claimed_at = delivery.get("claimed_at") or datetime.utcnow()
+    left = (claimed_at + timedelta(seconds=JOB_LEASE) - datetime.utcnow()).total_seconds()
+    return max(left, 0) + 1
+
+
+def deliver(delivery_id, owner, payload, http=None, limiter=None):
+    """
+    Sends a message payload once per delivery_id. Returns (message id,
+    already_sent); raises RetryJob or JobFailed when the send failed.
+    RetryJob.delay is set when the retry has to wait for a claim's lease.
+    """
+    if not claim_delivery(delivery_id, owner):
+        delivery = deliveries.find_one({"_id": delivery_id}) or {}
+        if delivery.get("status") == "sent":
+            return delivery.get("message_id"), True
+        raise RetryJob("Another attempt is sending this message", delay=lease_left(delivery))
+
+    if limiter is not None:
+        limiter.wait()
+    ok, res_data, retry = post_message(payload, http)
+    if not ok:
+        if retry == UNKNOWN:
+            # Meta may have the message; keep the claim until its lease ends
+            deliveries.update_one({"_id": delivery_id, "owner": owner}, {"$set": {"error": str(res_data)}})
+            raise RetryJob(f"Meta WhatsApp API, outcome unknown: {res_data}", delay=JOB_LEASE + 1)
+        release_delivery(delivery_id, owner)
+        if retry == RETRY:
+            raise RetryJob(f"Meta WhatsApp API: {res_data}")
+        raise JobFailed(f"Meta WhatsApp API: {res_data}")
+
+    wamid = message_id(res_data)
+    deliveries.update_one(
+        {"_id": delivery_id},
+        {"$set": {"status": "sent", "message_id": wamid, "sent_at": datetime.utcnow()}, "$unset": {"error": ""}}
+    )
+    return wamid, False
+
+
+def invoice_link(key, url_root):
+    """External /invoice/<key>.pdf URL on the host the request came in on"""
+    with current_app.test_request_context(base_url=url_root):
+        return url_for("navaratri.invoice_file", key=key, _external=True)
+
+
+# ------------------ JOBS ------------------
+
+def queue_invoice_message(collection_name, customer, url_root, mobile=None):
+    """
+    Queues the WhatsApp invoice of a customer of `collection_name` and
+    returns the job id. A job already queued for the same customer and
+    number is reused.
+    """
+    mobile = clean_mobile(mobile or customer.get("mobile", ""))
+    payload = {
+        "collection": collection_name,
+        "customer_id": str(customer["_id"]),
+        "mobile": mobile,
+        "name": customer.get("Name", "Customer"),
+        "url_root": url_root
+    }
+    return enqueue(SEND_INVOICE, payload, dedupe_key=f"{SEND_INVOICE}:{collection_name}:{customer['_id']}:{mobile}")
+
+
+@job_handler(SEND_INVOICE)
+def send_invoice_job(job):
+    p = job.payload
+    customer = db[p["collection"]].find_one({"_id": ObjectId(p["customer_id"])})
+    if not customer:
+        raise JobFailed("Customer not found")
+
+    job.progress(step="rendering")
+    key = store_invoice(customer, current_app.static_folder, p["collection"])
+
+    job.progress(step="sending", invoice=key)
+    payload = document_payload(p["mobile"], invoice_link(key, p["url_root"]), p["name"])
+    wamid, already_sent = deliver(f"{key}:{p['mobile']}", job.id, payload)
+
+    job.progress(step="sent")
+    return {"invoice": key, "message_id": wamid, "already_sent": already_sent}
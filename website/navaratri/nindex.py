@@ -0,0 +1,192 @@
+# nindex.py
+
+import re
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+from website.general.cache import get_cycle_version
+
+CHOLI_CODES = [f"C{i}" for i in range(1, 151)]
+KEDIYA_CODES = [f"K{i}" for i in range(1, 174)]
+INVENTORY_CODES = CHOLI_CODES + KEDIYA_CODES
+
+
+def normalize_product_code(code):
+    """Normalize product code by stripping hyphens, spaces, and converting to uppercase."""
+    if not code:
+        return ""
+    return re.sub(r'[^A-Z0-9]', '', str(code).strip().upper())
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_string(s):
+    for fmt in ("%d-%m-%y", "%d-%m-%Y", "%Y-%m-%d", "%d/%m/%y", "%d/%m/%Y", "%Y/%m/%d"):
+        try:
+            dt = datetime.strptime(s, fmt)
+            return (dt.year, dt.month, dt.day)
+        except ValueError:
+            pass
+    m = re.match(r'^(\d{1,4})[\-/](\d{1,2})[\-/](\d{1,4})$', s)
+    if m:
+        p1, p2, p3 = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        if p1 > 1000:
+            return (p1, p2, p3)
+        else:
+            yr = p3 if p3 > 100 else (2000 + p3 if p3 < 70 else 1900 + p3)
+            return (yr, p2, p1)
+    return None
+
+
+def parse_date_tuple(date_input):
+    """Extract (year, month, day) tuple from various date string formats."""
+    if not date_input:
+        return None
+    return _parse_date_string(str(date_input).strip())
+
+
+def canonical_date_key(date_input):
+    """
+    Key under which a booking date is indexed: the (year, month, day)
+    tuple when the date parses, otherwise the raw stripped string.
+    """
+    return parse_date_tuple(date_input) or str(date_input).strip()
+
+
+# ------------------ BOOKING INDEX ------------------
+
+class BookingIndex:
+    """
+    (canonical date, normalized product code) -> customers holding it,
+    for one cycle collection.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self._slots = {}
+        self._customer_slots = {}
+        self._customers = {}
+        self._lock = threading.Lock()
+
+    def add_customer(self, doc):
+        cust_id = str(doc.get("_id"))
+        bookings = doc.get("bookings", {})
+        slots = set()
+
+        if isinstance(bookings, dict):
+            for d_key, p_list in bookings.items():
+                date_key = canonical_date_key(d_key)
+                p_items = p_list if isinstance(p_list, list) else [p_list]
+                for p in p_items:
+                    p_norm = normalize_product_code(p)
+                    if p_norm:
+                        slots.add((date_key, p_norm))
+
+        with self._lock:
+            self._remove(cust_id)
+            self._customers[cust_id] = (
+                doc.get("Name", "Unknown"),
+                str(doc.get("mobile", "")).strip()
+            )
+            self._customer_slots[cust_id] = slots
+            for slot in slots:
+                self._slots.setdefault(slot, {})[cust_id] = None
+
+    def remove_customer(self, customer_id):
+        with self._lock:
+            self._remove(str(customer_id))
+
+    def _remove(self, cust_id):
+        for slot in self._customer_slots.pop(cust_id, ()):
+            holders = self._slots.get(slot)
+            if holders is not None:
+                holders.pop(cust_id, None)
+                if not holders:
+                    del self._slots[slot]
+        self._customers.pop(cust_id, None)
+
+    def find(self, date, product, exclude_mobile=None):
+        """
+        Returns (name, mobile) of the first customer holding `product`
+        on `date`, skipping `exclude_mobile`, or None.
+        """
+        p_norm = normalize_product_code(product)
+        if not p_norm:
+            return None
+
+        exclude = str(exclude_mobile).strip() if exclude_mobile else None
+        with self._lock:
+            holders = self._slots.get((canonical_date_key(date), p_norm), {})
+            for cust_id in holders:
+                name, mobile = self._customers[cust_id]
+                if exclude and mobile == exclude:
+                    continue
+                return name, mobile
+        return None
+
+
+_INDEX_PROJECTION = {"Name": 1, "mobile": 1, "bookings": 1}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_booking_index(collection):
+    """
+    Returns the booking index of a cycle collection, building it with a
+    single scan on first use.
+
+    The index remembers the cycle's write counter it was built at and is
+    rebuilt when the counter has moved, so bookings written by other
+    workers are never missed by the conflict check.
+    """
+    name = collection.name
+    version = get_cycle_version(name)
+    index = _indexes.get(name)
+    if index is not None and index.version == version:
+        return index
+
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None or index.version != version:
+            index = BookingIndex(version)
+            for doc in collection.find({}, _INDEX_PROJECTION):
+                index.add_customer(doc)
+            _indexes[name] = index
+    return index
+
+
+def refresh_booking_index(collection, customer_id):
+    """
+    Re-reads one customer document after a write and replaces its
+    entries. Missing documents (deleted customers) are dropped.
+    """
+    index = _indexes.get(collection.name)
+    if index is None:
+        return
+
+    doc = collection.find_one({"_id": customer_id}, _INDEX_PROJECTION)
+    if doc:
+        index.add_customer(doc)
+    else:
+        index.remove_customer(customer_id)
+
+
+def advance_booking_index(collection_name, version):
+    """
+    Called after this process bumped the cycle to `version` for a write it
+    already applied to the index. An index that missed an intermediate
+    version (someone else wrote) is dropped and rebuilt on next use.
+    """
+    index = _indexes.get(collection_name)
+    if index is None:
+        return
+    if index.version + 1 == version:
+        index.version = version
+    else:
+        drop_booking_index(collection_name)
+
+
+def drop_booking_index(collection_name):
+    with _indexes_lock:
+        _indexes.pop(collection_name, None)
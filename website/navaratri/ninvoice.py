@@ -0,0 +1,423 @@
+# ninvoice.py
+#
+# Rental booking invoice of a navaratri customer (/download-customer).
+#
+# What every invoice shares is prepared once per process in InvoiceLayers:
+# the parsed logo and product photos (fpdf2 parses an image per document
+# otherwise, which dominated the render time) and the line-broken address
+# and terms blocks. Images are embedded as thumbnails sized to the box
+# they are drawn in (website/general/thumbnails.py), not the full-size
+# catalogue files. fpdf2 has no form XObjects to reuse drawn content
+# across documents, so the header, footer and terms are still drawn on
+# each page, from these prepared pieces; only the customer rows are
+# computed per invoice.
+#
+# scratch/bench_invoice.py compares the old per-request cost (fresh
+# layers, full-size photos) with the shared thumbnail layers.
+#
+# Rendered invoices are stored in `invoices` under a content key,
+# "{customer id}-{version}", the version hashing the fields the invoice
+# shows (INVOICE_FIELDS) and INVOICE_TEMPLATE_VERSION. Any write that
+# changes what the bill says gives a new key, so a stored PDF never needs
+# invalidating and the key doubles as the ETag of /download-customer.
+# The issue date printed is the day a version was first rendered.
+
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime
+
+from bson import Binary, json_util
+from fpdf import FPDF
+from fpdf.enums import MethodReturnValue, XPos, YPos
+from fpdf.image_datastructures import RasterImageInfo
+from fpdf.image_parsing import get_img_info
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from website.general.db import db
+from website.general.thumbnails import thumbnail_path
+from website.general.utils import sanitize_latin1
+
+SHOP_ADDRESS = (
+    "Nr. Laxminarayan Bus-stand, Opp Prarabdh Soc.\n"
+    "Maninagar(E), Ahmedabad-08"
+)
+
+TERMS = (
+    "1. Please verify the condition of all rental items before leaving the shop.\n"
+    "2. Rental items must be returned on the scheduled return date. Delayed returns may incur penalty fees.\n"
+    "3. The security deposit is fully refundable upon returning all items without damage.\n"
+    "4. Thank you for choosing Image Traditional!"
+)
+
+PRODUCT_IMAGE_DIRS = {"K": "KediyaJpg", "C": "CholiJpg", "G": "GroupJpg"}
+
+# Boxes (mm) the logo and product photos are drawn in
+LOGO_WIDTH = 22
+PRODUCT_IMAGE_BOX = (36, 21)
+
+NAVY = (10, 17, 32)
+GOLD = (212, 175, 55)
+WHITE_SMOKE = (241, 245, 249)
+SLATE = (15, 23, 42)
+MUTED = (100, 116, 139)
+FAINT = (148, 163, 184)
+BORDER = (226, 232, 240)
+
+# Bump when the layout, the shop details or the photos change, so every
+# stored invoice is rendered again
+INVOICE_TEMPLATE_VERSION = 1
+
+# Customer fields render_invoice() shows, in the order they are hashed
+INVOICE_FIELDS = ("Name", "group", "mobile", "reference", "deposit", "address", "bookings", "total_price", "given_price")
+
+# Old versions are only fetched while a message about them is fresh
+INVOICE_RETENTION_DAYS = 30
+
+INVOICE_KEY_REGEX = re.compile(r'^[0-9a-f]{24}-[0-9a-f]{16}$')
+
+invoices = db["invoices"]
+
+_layers = {}
+_layers_lock = threading.Lock()
+_indexed = False
+
+
+# ------------------ STATIC LAYERS ------------------
+
+class InvoiceLayers:
+    """Parsed images and line-broken text blocks shared by every invoice"""
+
+    def __init__(self, static_folder, thumbnails=True):
+        self.static_folder = static_folder
+        self.thumbnails = thumbnails
+        # The logo only ever sits on the navy banner, so it is flattened onto it
+        self.logo_path = self._derivative(
+            os.path.join(static_folder, "Home_Img", "favicon.png"), LOGO_WIDTH, background=NAVY
+        )
+        self._images = {}
+        self._lock = threading.Lock()
+
+        scratch = FPDF('P', 'mm', 'A4')
+        scratch.add_page()
+        scratch.set_font('helvetica', '', 9)
+        self.address_lines = scratch.multi_cell(
+            95, 4.5, SHOP_ADDRESS, dry_run=True, output=MethodReturnValue.LINES
+        )
+        scratch.set_font('helvetica', '', 7.5)
+        self.terms_lines = scratch.multi_cell(
+            180, 3.5, TERMS, dry_run=True, output=MethodReturnValue.LINES
+        )
+
+    def _derivative(self, source, *box, background=None):
+        if not self.thumbnails:
+            return source
+        return thumbnail_path(source, *box, background=background)
+
+    def image_info(self, path):
+        """Parsed image at `path`, or None when the file does not exist"""
+        info = self._images.get(path)
+        if info is None and path not in self._images:
+            info = get_img_info(path) if path and os.path.exists(path) else None
+            with self._lock:
+                self._images[path] = info
+        return info
+
+    def product_image_path(self, code):
+        """Invoice thumbnail of a product code's photo, or None without one"""
+        folder = PRODUCT_IMAGE_DIRS.get(code[:1])
+        if not folder:
+            return None
+        return self._derivative(os.path.join(self.static_folder, folder, f"{code}.jpg"), *PRODUCT_IMAGE_BOX)
+
+
+def invoice_layers(static_folder):
+    """The InvoiceLayers of this process for an app's static folder"""
+    layers = _layers.get(static_folder)
+    if layers is None:
+        with _layers_lock:
+            layers = _layers.get(static_folder)
+            if layers is None:
+                layers = _layers[static_folder] = InvoiceLayers(static_folder)
+    return layers
+
+
+# ------------------ DOCUMENT ------------------
+
+class InvoicePDF(FPDF):
+    """A4 invoice with the navy header banner and the page footer"""
+
+    def __init__(self, layers):
+        super().__init__('P', 'mm', 'A4')
+        self.layers = layers
+        self.issued_on = datetime.now().strftime('%d-%b-%Y')
+
+    def place_image(self, path, x, y, w, h):
+        """
+        Draws an image from the shared layers, handing fpdf2 the parsed
+        data so it does not read the file again. False when it is missing.
+        """
+        images = self.image_cache.images
+        if path not in images:
+            base = self.layers.image_info(path)
+            if base is None:
+                return False
+            info = RasterImageInfo(base)
+            info["i"] = len(images) + 1
+            info["usages"] = 0
+            info["iccp_i"] = None
+            if info.get("iccp") is not None:
+                profiles = self.image_cache.icc_profiles
+                info["iccp_i"] = profiles.setdefault(info["iccp"], len(profiles))
+                info["iccp"] = None
+            images[path] = info
+        self.image(path, x, y, w, h)
+        return True
+
+    def header(self):
+        # Background navy banner
+        self.set_fill_color(*NAVY)
+        self.rect(0, 0, 210, 42, 'F')
+
+        # Shop Logo
+        if self.layers.logo_path:
+            self.place_image(self.layers.logo_path, 15, 10, LOGO_WIDTH, 0)
+
+        # Title
+        self.set_text_color(*GOLD)
+        self.set_font('helvetica', 'B', 22)
+        self.set_xy(42, 10)
+        self.cell(0, 10, 'IMAGE TRADITIONAL', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        # Address info (white text)
+        self.set_text_color(*WHITE_SMOKE)
+        self.set_font('helvetica', '', 9)
+        self.set_xy(42, 20)
+        for line in self.layers.address_lines:
+            self.cell(95, 4.5, line, new_x=XPos.LEFT, new_y=YPos.NEXT)
+
+        # Owner & Meta Details (Right Side)
+        self.set_text_color(*GOLD)
+        self.set_font('helvetica', 'B', 10)
+        self.set_xy(140, 11)
+        self.cell(55, 5, "Prakash Mandali: 9428610384", align='R')
+
+        self.set_text_color(*WHITE_SMOKE)
+        self.set_font('helvetica', '', 9)
+        self.set_xy(140, 17)
+        self.cell(55, 5, "Rental Booking Invoice", align='R')
+
+        self.set_xy(140, 23)
+        self.cell(55, 5, f"Date: {self.issued_on}", align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        # Space below header banner
+        self.ln(25)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('helvetica', 'I', 8)
+        self.set_text_color(*FAINT)
+        self.cell(0, 10, f'Page {self.page_no()}/{{nb}} | Image Traditional Rental Receipt', align='C')
+
+
+def _section_heading(pdf, title):
+    pdf.set_font('helvetica', 'B', 11)
+    pdf.set_text_color(*SLATE)
+    pdf.cell(0, 8, title, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    # Gold separator line
+    pdf.set_draw_color(*GOLD)
+    pdf.line(15, pdf.get_y(), 195, pdf.get_y())
+    pdf.ln(4)
+
+
+def _detail_row(pdf, label1, val1, label2, val2):
+    y = pdf.get_y()
+    pdf.set_xy(15, y)
+    for label, value, label_w, value_w in ((label1, val1, 32, 63), (label2, val2, 28, 57)):
+        pdf.set_font('helvetica', 'B', 9)
+        pdf.set_text_color(*MUTED)
+        pdf.cell(label_w, 6, sanitize_latin1(label) + ":", border=0)
+        pdf.set_font('helvetica', '', 9.5)
+        pdf.set_text_color(*SLATE)
+        pdf.cell(value_w, 6, sanitize_latin1(str(value)), border=0)
+    pdf.ln(7.5)
+
+
+def _total_row(pdf, x, label, amount, color):
+    pdf.set_x(x)
+    pdf.set_font("helvetica", "B", 9.5)
+    pdf.set_text_color(*MUTED)
+    pdf.cell(45, 6, label, align="R")
+    pdf.set_font("helvetica", "B", 10.5)
+    pdf.set_text_color(*color)
+    pdf.cell(35, 6, f"Rs. {amount}", align="R", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+
+def render_invoice(customer, layers):
+    """PDF bytes of a customer's rental booking invoice"""
+    pdf = InvoicePDF(layers)
+    pdf.alias_nb_pages()
+    pdf.add_page()
+
+    # ------- Customer Details -------
+    pdf.set_y(46)
+    pdf.set_line_width(0.5)
+    _section_heading(pdf, "CUSTOMER & BOOKING DETAILS")
+
+    _detail_row(pdf, "Customer Name", customer.get("Name", "N/A"), "Group Name", customer.get("group", "N/A"))
+    _detail_row(pdf, "Mobile Number", customer.get("mobile", "N/A"), "Reference", customer.get("reference", "N/A"))
+    _detail_row(pdf, "Security Deposit", customer.get('deposit', 'N/A'), "Address", customer.get("address", "N/A"))
+    pdf.ln(2)
+
+    # ------- Items Table -------
+    _section_heading(pdf, "RENTAL ITEMS")
+
+    pdf.set_font('helvetica', 'B', 10)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_fill_color(*NAVY)
+    pdf.set_draw_color(*NAVY)
+    pdf.set_x(15)
+    for width, title in ((15, "Sr."), (50, "Product Code"), (60, "Product Preview"), (55, "Booking Date")):
+        pdf.cell(width, 9, title, border=1, align="C", fill=True)
+    pdf.ln()
+
+    pdf.set_font("helvetica", "", 10)
+    pdf.set_text_color(*SLATE)
+    pdf.set_draw_color(*BORDER)
+
+    sr = 1
+    for date, codes in customer.get("bookings", {}).items():
+        for code in codes:
+            pdf.set_x(15)
+            # Row height 25 to fit image
+            pdf.cell(15, 25, str(sr), border=1, align="C")
+            pdf.cell(50, 25, f"  {code}", border=1, align="L")
+
+            x = pdf.get_x()
+            y = pdf.get_y()
+            pdf.cell(60, 25, "", border=1)
+
+            # Image centred in the 60x25 cell
+            path = layers.product_image_path(code)
+            if not (path and pdf.place_image(path, x + 12, y + 2, *PRODUCT_IMAGE_BOX)):
+                pdf.set_xy(x, y + 10)
+                pdf.set_font("helvetica", "I", 8.5)
+                pdf.set_text_color(*FAINT)
+                pdf.cell(60, 5, "No Preview Available", border=0, align="C")
+                pdf.set_font("helvetica", "", 10)
+                pdf.set_text_color(*SLATE)
+                pdf.set_xy(x + 60, y)
+
+            pdf.cell(55, 25, date, border=1, align="C")
+            pdf.ln()
+            sr += 1
+
+    # ------- Totals Card -------
+    pdf.ln(5)
+    totals_x = 115
+    total_price = customer.get("total_price", 0)
+    given_price = customer.get("given_price", 0)
+    remaining = total_price - given_price
+
+    _total_row(pdf, totals_x, "Total Amount:", total_price, SLATE)
+    _total_row(pdf, totals_x, "Amount Paid:", given_price, (16, 185, 129))
+
+    pdf.set_draw_color(*BORDER)
+    pdf.line(totals_x, pdf.get_y() + 1, 195, pdf.get_y() + 1)
+    pdf.ln(2.5)
+
+    # Balance due box, red while anything is owed
+    pdf.set_x(totals_x)
+    if remaining > 0:
+        pdf.set_fill_color(254, 242, 242)
+        pdf.set_draw_color(239, 68, 68)
+        pdf.set_text_color(220, 38, 38)
+    else:
+        pdf.set_fill_color(240, 253, 250)
+        pdf.set_draw_color(16, 185, 129)
+        pdf.set_text_color(13, 148, 136)
+
+    y = pdf.get_y()
+    pdf.rect(totals_x, y, 80, 8.5, 'DF')
+    pdf.set_xy(totals_x, y + 1.25)
+    pdf.set_font("helvetica", "B", 9.5)
+    pdf.cell(45, 6, "Balance Due:", align="R")
+    pdf.set_font("helvetica", "B", 11.5)
+    pdf.cell(30, 6, f"Rs. {remaining}", align="R")
+    pdf.ln(13)
+
+    # ------- Terms & Conditions -------
+    pdf.set_x(15)
+    pdf.set_font("helvetica", "B", 8.5)
+    pdf.set_text_color(*MUTED)
+    pdf.cell(0, 4, "Terms & Conditions:", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    pdf.set_font("helvetica", "", 7.5)
+    pdf.set_text_color(*FAINT)
+    for line in layers.terms_lines:
+        pdf.set_x(15)
+        pdf.cell(180, 3.5, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    return bytes(pdf.output())
+
+
+# ------------------ STORE ------------------
+
+def invoice_version(customer):
+    """Digest of the invoice fields of a customer and the template version"""
+    # Field order is fixed and bookings keep their stored order, which is the row order
+    raw = json_util.dumps([INVOICE_TEMPLATE_VERSION] + [[f, customer.get(f)] for f in INVOICE_FIELDS])
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def invoice_key(customer):
+    return f"{customer['_id']}-{invoice_version(customer)}"
+
+
+def stored_invoice(key):
+    """PDF bytes stored under `key`, or None"""
+    if not INVOICE_KEY_REGEX.match(key or ""):
+        return None
+    doc = invoices.find_one({"_id": key}, {"pdf": 1})
+    return bytes(doc["pdf"]) if doc else None
+
+
+def _render_and_store(key, customer, static_folder, collection_name):
+    global _indexed
+    if not _indexed:
+        invoices.create_index([("created_at", ASCENDING)], expireAfterSeconds=INVOICE_RETENTION_DAYS * 86400)
+        _indexed = True
+
+    pdf_bytes = render_invoice(customer, invoice_layers(static_folder))
+    try:
+        invoices.insert_one({
+            "_id": key,
+            "customer_id": customer["_id"],
+            "collection": collection_name,
+            "pdf": Binary(pdf_bytes),
+            "size": len(pdf_bytes),
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        pass  # rendered by another worker meanwhile
+    return pdf_bytes
+
+
+def cached_invoice(customer, static_folder, collection_name=None):
+    """(key, PDF bytes) of the current version of a customer's invoice, rendered on a miss"""
+    key = invoice_key(customer)
+    pdf_bytes = stored_invoice(key)
+    if pdf_bytes is None:
+        pdf_bytes = _render_and_store(key, customer, static_folder, collection_name)
+    return key, pdf_bytes
+
+
+def store_invoice(customer, static_folder, collection_name=None):
+    """Key of the current version of a customer's invoice, rendered on a miss"""
+    key = invoice_key(customer)
+    if not invoices.count_documents({"_id": key}, limit=1):
+        _render_and_store(key, customer, static_folder, collection_name)
+    return key
@@ -0,0 +1,158 @@
+# nlines.py
+#
+# Materialized booking lines: one row per (customer_id, ISO date, product_code)
+# stored next to each cycle collection as f"{collection_name}_lines".
+#
+# A row's _id is made of that triple (line_id), and rows are only ever
+# upserted by it, so concurrent syncs and backfills cannot leave the same
+# line twice.
+
+import threading
+
+from pymongo import ASCENDING, ReplaceOne
+
+from website.navaratri.nindex import normalize_product_code, parse_date_tuple
+
+LINE_PROJECTION = {"Name": 1, "mobile": 1, "bookings": 1}
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def iso_date(date_input):
+    """
+    Convert a stored booking date key ("DD-MM-YY" and friends) to YYYY-MM-DD
+    """
+    parts = parse_date_tuple(date_input)
+    if not parts:
+        return None
+    return "%04d-%02d-%02d" % parts
+
+
+def line_id(customer_id, date, product_code):
+    return f"{customer_id}:{date}:{product_code}"
+
+
+def customer_lines(doc):
+    """
+    Flattens a customer document into booking line rows
+    """
+    rows = []
+    seen = set()
+    bookings = doc.get("bookings", {})
+    if not isinstance(bookings, dict):
+        return rows
+
+    for date_key, products in bookings.items():
+        date = iso_date(date_key)
+        if not date:
+            continue
+        if isinstance(products, str):
+            items = [p.strip() for p in products.split(',') if p.strip()]
+        elif isinstance(products, list):
+            items = products
+        else:
+            items = []
+        for p in items:
+            code = normalize_product_code(p)
+            if not code or (date, code) in seen:
+                continue
+            seen.add((date, code))
+            rows.append({
+                "_id": line_id(doc["_id"], date, code),
+                "customer_id": doc["_id"],
+                "date": date,
+                "date_key": str(date_key).strip(),
+                "product_code": code,
+                "name": doc.get("Name", "Unknown"),
+                "mobile": doc.get("mobile", "")
+            })
+    return rows
+
+
+def lines_collection_for(collection):
+    return collection.database[f"{collection.name}_lines"]
+
+
+def ensure_line_indexes(lines):
+    lines.create_index([("date", ASCENDING), ("product_code", ASCENDING)])
+    lines.create_index([("product_code", ASCENDING), ("date", ASCENDING)])
+    lines.create_index("customer_id")
+
+
+def _upsert(lines, rows):
+    if rows:
+        lines.bulk_write([ReplaceOne({"_id": r["_id"]}, r, upsert=True) for r in rows], ordered=False)
+
+
+def _sync(lines, collection, customer_id):
+    doc = collection.find_one({"_id": customer_id}, LINE_PROJECTION)
+    rows = customer_lines(doc) if doc else []
+    _upsert(lines, rows)
+    lines.delete_many({"customer_id": customer_id, "_id": {"$nin": [r["_id"] for r in rows]}})
+
+
+def rebuild_lines(collection):
+    """
+    Regenerates the lines collection of a cycle from its customer documents.
+    Returns the number of rows written.
+    """
+    lines = lines_collection_for(collection)
+    ensure_line_indexes(lines)
+
+    seen = set()
+    batch = []
+    for doc in collection.find({}, LINE_PROJECTION):
+        rows = customer_lines(doc)
+        seen.update(r["_id"] for r in rows)
+        batch.extend(rows)
+        if len(batch) >= 1000:
+            _upsert(lines, batch)
+            batch = []
+    _upsert(lines, batch)
+
+    # Rows the scan did not produce: lines removed since, or of customers
+    # written after it; re-syncing their customers settles both
+    stale = {r["customer_id"] for r in lines.find({}, {"customer_id": 1}) if r["_id"] not in seen}
+    for customer_id in stale:
+        _sync(lines, collection, customer_id)
+    return len(seen)
+
+
+def get_lines(collection):
+    """
+    Returns the lines collection of a cycle, creating its indexes and
+    backfilling it on first use in this process when it is still empty.
+    """
+    lines = lines_collection_for(collection)
+    name = collection.name
+    if name in _ready:
+        return lines
+
+    with _ready_lock:
+        if name not in _ready:
+            ensure_line_indexes(lines)
+            if lines.estimated_document_count() == 0 and collection.estimated_document_count() > 0:
+                rebuild_lines(collection)
+            _ready.add(name)
+    return lines
+
+
+def sync_customer_lines(collection, customer_id):
+    """
+    Replaces the rows of one customer after a write. Deleted customers
+    simply lose their rows.
+    """
+    _sync(get_lines(collection), collection, customer_id)
+
+
+def lines_by_date(lines, dates):
+    """
+    {iso_date: [rows]} for the given ISO dates, served by the (date, product) index
+    """
+    grouped = {d: [] for d in dates}
+    for row in lines.find({"date": {"$in": list(dates)}}).sort(
+        [("date", ASCENDING), ("product_code", ASCENDING)]
+    ):
+        grouped.setdefault(row["date"], []).append(row)
+    return grouped
@@ -1,17 +1,38 @@
 import csv
 import io
-import os
 
 from bson import ObjectId
+from pymongo import ASCENDING
 from flask import Blueprint, Response, current_app, render_template, request, redirect, send_file, url_for, session, flash, jsonify
 from datetime import datetime
-from fpdf import FPDF
 import qrcode
 from werkzeug.local import LocalProxy
 
 from .nmodels import *
 from ..general.db import *
 from .nservices import *
+from .nindex import normalize_product_code
+from .nlines import get_lines, lines_by_date, iso_date
+from .ninvoice import cached_invoice, invoice_key, stored_invoice
+from .ndispatch import queue_invoice_message
+from .nbroadcast import (
+    BROADCAST_CONCURRENCY,
+    BROADCAST_RATE,
+    broadcast_counts,
+    create_broadcast,
+    failed_recipients,
+    get_broadcast,
+    next_date,
+    queue_broadcast
+)
+from .nsummary import summary_analytics
+from ..fancy.fsummary import summary_kpis
+from ..general.cache import cached_result
+from ..general.projections import find_view, projection, with_remaining
+from ..general.pagination import keyset_page, page_size
+from ..general.areas import area_analytics, area_query, directory_changed, on_customer_address_write
+from ..general.autocomplete import autocomplete_changed, get_autocomplete
+from ..general.search import MOBILE_FIELDS, SEARCH_FIELDS, matches_all, mobile_tokens, search_documents, text_tokens
 from website.navaratri.ncycle import (
     get_active_cycle,
     get_selected_cycle,
@@ -21,8 +42,9 @@ from website.navaratri.ncycle import (
     end_cycle,
     reactivate_cycle,
     get_selected_collection,
+    get_cycle_by_id,
     is_selected_cycle_locked,
-    navaratri_cycles
+    set_cycle_edit_override
 )
 
 collection = LocalProxy(lambda: get_selected_collection())
@@ -146,6 +168,7 @@ def book():
             },
             upsert=True
         )
+        on_customer_address_write(ncustomers, {"mobile": mobile})
 
         # Find the customer to get the generated ObjectId
         cust_record = collection.find_one({"mobile": mobile})
@@ -157,6 +180,7 @@ def book():
             {"_id": cust_record["_id"]},
             {"$set": {"qr_url": qr_url}}
         )
+        on_customer_write(cust_record["_id"])
 
         try:
             details_list = [f"{b['date']}: {b['products']}" for b in bookings_data]
@@ -183,19 +207,12 @@ def calendar():
 
     date = request.args.get('date') or request.form.get('date')
     bookings_on_date = []
+    lines = get_lines(collection)
 
     # Gather all booked dates for highlights
     booked_dates = set()
     try:
-        for doc in collection.find():
-            bookings = doc.get("bookings", {})
-            for date_key in bookings.keys():
-                if date_key not in ("given_price", "total_price"):
-                    try:
-                        date_obj = datetime.strptime(date_key, "%d-%m-%y")
-                        booked_dates.add(date_obj.strftime("%Y-%m-%d"))
-                    except ValueError:
-                        pass
+        booked_dates = set(lines.distinct("date"))
     except Exception as e:
         current_app.logger.error(f"Error gathering booked dates: {e}")
 
@@ -204,48 +221,46 @@ def calendar():
         try:
             # Convert YYYY-MM-DD → Date object
             selected_date_obj = datetime.strptime(date, "%Y-%m-%d")
-            formatted_date = selected_date_obj.strftime("%d-%m-%y")
         except ValueError:
             try:
                 selected_date_obj = datetime.strptime(date, "%d-%m-%y")
-                formatted_date = date
             except ValueError:
                 selected_date_obj = None
-                formatted_date = date
 
         if selected_date_obj:
             from datetime import timedelta
-            yesterday_date_str = (selected_date_obj - timedelta(days=1)).strftime("%d-%m-%y")
-            tomorrow_date_str = (selected_date_obj + timedelta(days=1)).strftime("%d-%m-%y")
-            
-            # Fetch bookings for yesterday and tomorrow to map back-to-back rentals
-            yesterday_customers = list(collection.find({f"bookings.{yesterday_date_str}": {"$exists": True}}))
-            tomorrow_customers = list(collection.find({f"bookings.{tomorrow_date_str}": {"$exists": True}}))
-            
+            selected_iso = selected_date_obj.strftime("%Y-%m-%d")
+            yesterday_iso = (selected_date_obj - timedelta(days=1)).strftime("%Y-%m-%d")
+            tomorrow_iso = (selected_date_obj + timedelta(days=1)).strftime("%Y-%m-%d")
+
+            # One indexed lookup covers yesterday, the selected day and tomorrow
+            rows = lines_by_date(lines, [yesterday_iso, selected_iso, tomorrow_iso])
+
+            # Map back-to-back rentals
             yesterday_map = {}
-            for yc in yesterday_customers:
-                y_prods = yc.get("bookings", {}).get(yesterday_date_str, [])
-                for yp in y_prods:
-                    yesterday_map[yp] = {
-                        "name": yc.get("Name", "Unknown"),
-                        "mobile": yc.get("mobile", ""),
-                        "id": str(yc["_id"])
-                    }
-                    
+            for r in rows[yesterday_iso]:
+                yesterday_map[r["product_code"]] = {
+                    "name": r.get("name", "Unknown"),
+                    "mobile": r.get("mobile", ""),
+                    "id": str(r["customer_id"])
+                }
+
             tomorrow_map = {}
-            for tc in tomorrow_customers:
-                t_prods = tc.get("bookings", {}).get(tomorrow_date_str, [])
-                for tp in t_prods:
-                    tomorrow_map[tp] = {
-                        "name": tc.get("Name", "Unknown"),
-                        "mobile": tc.get("mobile", ""),
-                        "id": str(tc["_id"])
-                    }
-            
+            for r in rows[tomorrow_iso]:
+                tomorrow_map[r["product_code"]] = {
+                    "name": r.get("name", "Unknown"),
+                    "mobile": r.get("mobile", ""),
+                    "id": str(r["customer_id"])
+                }
+
             # Fetch current day's bookings
-            customers = collection.find({f"bookings.{formatted_date}": {"$exists": True}})
+            day_products = {}
+            for r in rows[selected_iso]:
+                day_products.setdefault(r["customer_id"], []).append(r["product_code"])
+
+            customers = collection.find({"_id": {"$in": list(day_products)}})
             for c in customers:
-                prods = c["bookings"].get(formatted_date, [])
+                prods = day_products.get(c["_id"], [])
                 prods_details = []
                 for p in prods:
                     prods_details.append({
@@ -355,6 +370,7 @@ def modify():
                 "total_price": new_total_price
             }}
         )
+        on_customer_write(customer['_id'])
 
         try:
             log_action(customer.get("Name"), mobile, "edit", f"Modified booking on {date}. Replaced products {old_products} with {new_products}. Price difference: ₹{price_diff}. New total: ₹{new_total_price}.")
@@ -422,6 +438,7 @@ def pay_remaining():
             {"_id": customer["_id"]},
             {"$set": {"qr_url": qr_url}}
         )
+        on_customer_write(customer["_id"])
 
         try:
             log_action(customer.get("Name"), mobile, "payment", f"Paid remaining amount: ₹{pay_amount_val}. New given price: ₹{new_given_price} of total ₹{total_price}.")
@@ -520,6 +537,7 @@ def delete():
                 "total_price": new_price
             }}
         )
+        on_customer_write(customer['_id'])
 
         try:
             log_action(customer.get("Name"), mobile, "delete", f"Deleted product '{product}' on {date}. Reduced price by ₹{price_diff}. New total: ₹{new_price}.")
@@ -560,12 +578,71 @@ def navaratri_booking(customer_id=None):
 
     if customer:
         customer['remaining'] = customer.get('total_price', 0) - customer.get('given_price', 0)
+        # The roster next to a profile is loaded page by page from booking_roster()
+        bookings = []
+        roster_total = collection.count_documents({})
+    else:
+        bookings = with_remaining(find_view(collection, "navaratri_booking_grid"))
+        roster_total = len(bookings)
 
-    bookings = list(collection.find())
-    for b in bookings:
-        b['remaining'] = b.get('total_price', 0) - b.get('given_price', 0)
+    groups, references = roster_filters(collection)
 
-    return render_template("navaratri/navaratri_booking.html", customer=customer, error=error, bookings=bookings)
+    return render_template(
+        "navaratri/navaratri_booking.html",
+        customer=customer,
+        error=error,
+        bookings=bookings,
+        lazy_roster=bool(customer),
+        roster_total=roster_total,
+        groups=groups,
+        references=references
+    )
+
+
+def roster_filters(coll):
+    """Distinct groups and references offered by the roster filters"""
+    groups = [g for g in coll.distinct("group") if g]
+    if "N/A" not in groups and coll.count_documents({"group": {"$exists": False}}, limit=1):
+        groups.append("N/A")
+    references = [r for r in coll.distinct("reference") if r]
+    return groups, references
+
+
+# ------------------ API: Booking Roster ------------------
+@navaratri.route('/api/navaratri_booking/roster', methods=['GET'])
+def booking_roster():
+    """
+    Next page of the selected cycle's customers, by name, for the roster
+    beside a profile. Keyset paged like the customer directories.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    try:
+        docs, next_cursor = keyset_page(
+            collection, None, projection("navaratri_roster"),
+            page_size(request.args.get('per_page')), request.args.get('after') or None,
+            field="Name", direction=ASCENDING
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    customers = []
+    for d in with_remaining(docs):
+        customers.append({
+            "id": str(d["_id"]),
+            "name": d.get("Name", ""),
+            "mobile": d.get("mobile", ""),
+            "group": d.get("group") or "",
+            "reference": d.get("reference") or "",
+            "remaining": d["remaining"]
+        })
+
+    return jsonify({
+        "success": True,
+        "customers": customers,
+        "next": next_cursor
+    })
 
 # Redirect legacy /profile URLs to /navaratri_booking
 @navaratri.route('/profile', methods=['GET', 'POST'])
@@ -610,18 +687,56 @@ def api_check_product():
     else:
         return jsonify({"available": True})
 
+# ------------------ API: Bulk Availability Matrix ------------------
+@navaratri.route('/api/availability-matrix', methods=['GET'])
+def api_availability_matrix():
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    start_input = request.args.get('start', '').strip()
+    end_input = request.args.get('end', '').strip() or start_input
+    exclude_mobile = request.args.get('exclude_mobile', '').strip()
+
+    if not start_input:
+        return jsonify({"success": False, "error": "Start date is required"}), 400
+
+    parsed = []
+    for value in (start_input, end_input):
+        date_obj = None
+        for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d-%m-%y"):
+            try:
+                date_obj = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                pass
+        if not date_obj:
+            return jsonify({"success": False, "error": f"Invalid date: {value}"}), 400
+        parsed.append(date_obj)
+
+    start_obj, end_obj = parsed
+    if end_obj < start_obj:
+        return jsonify({"success": False, "error": "End date is before start date"}), 400
+    if (end_obj - start_obj).days > 62:
+        return jsonify({"success": False, "error": "Date range is limited to 63 days"}), 400
+
+    matrix = get_availability_matrix(
+        start_obj.strftime("%Y-%m-%d"),
+        end_obj.strftime("%Y-%m-%d"),
+        exclude_mobile=exclude_mobile or None
+    )
+    matrix["success"] = True
+    return jsonify(matrix)
+
 # ------------------ API: Product Code Suggestion ------------------
 @navaratri.route('/api/suggest-products', methods=['GET'])
 def api_suggest_products():
     if not session.get('logged_in'):
         return jsonify([]), 401
     try:
-        all_products = list(products.find({}, {"_id": 1}))
-        codes = [p["_id"] for p in all_products]
-        if not codes:
-            # Fallback if Storage collection has no entries yet
-            codes = [f'C{i}' for i in range(1, 151)] + [f'K{i}' for i in range(1, 174)]
-        return jsonify(sorted(list(set(codes))))
+        # Storage codes (or the inventory codes while it is empty), kept in memory
+        response = jsonify(get_autocomplete().product_codes())
+        response.headers["Cache-Control"] = "private, max-age=60"
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -747,6 +862,7 @@ def profile_update():
         collection.insert_one(customer_data)
         message = "✅ Customer profile created successfully!"
         ret_id = str(ret_id)
+    on_customer_write(ObjectId(ret_id))
 
     # Upsert customer record into Navaratri_Customers collection
     ncustomers.update_one(
@@ -763,6 +879,7 @@ def profile_update():
         },
         upsert=True
     )
+    on_customer_address_write(ncustomers, {"mobile": mobile})
 
     try:
         if customer_id and customer_id != 'new':
@@ -862,6 +979,7 @@ def profile_add_payment():
             {"_id": ObjectId(customer_id)},
             {"$set": {"given_price": new_given_price}}
         )
+        on_customer_write(ObjectId(customer_id))
 
         try:
             log_action(customer.get("Name"), customer.get("mobile"), "payment", f"Added payment of ₹{amount} via profile page. New given price: ₹{new_given_price} of total ₹{total_price}.")
@@ -940,6 +1058,7 @@ def profile_reassign():
         {"_id": ObjectId(customer_id)},
         {"$set": {"bookings": bookings, "total_price": new_total}}
     )
+    on_customer_write(ObjectId(customer_id))
 
     try:
         log_action(customer.get("Name"), customer.get("mobile"), "edit", f"Reassigned product from '{old_product}' on {old_date_formatted} to '{new_product}' on {new_date_formatted}. Price difference: ₹{price_diff_str}. New total: ₹{new_total}.")
@@ -996,6 +1115,7 @@ def profile_add_booking():
         {"_id": ObjectId(customer_id)},
         {"$set": {"bookings": bookings, "total_price": new_total}}
     )
+    on_customer_write(ObjectId(customer_id))
 
     try:
         log_action(customer.get("Name"), customer.get("mobile"), "book", f"Added booking of product '{product}' on {date_formatted} via profile page. Price difference: ₹{price_diff_str}. New total: ₹{new_total}.")
@@ -1049,6 +1169,7 @@ def profile_delete_booking():
         {"_id": ObjectId(customer_id)},
         {"$set": {"bookings": bookings, "total_price": new_total}}
     )
+    on_customer_write(ObjectId(customer_id))
 
     try:
         log_action(customer.get("Name"), customer.get("mobile"), "delete", f"Deleted booking row of product '{product}' on {date_formatted} via profile page. Price reduced by ₹{price_diff_str}. New total: ₹{new_total}.")
@@ -1098,6 +1219,7 @@ def profile_delete_customer():
 
     # 1. Delete document from active cycle collection ONLY (removes booking from current cycle)
     collection.delete_one({"_id": customer["_id"]})
+    on_customer_write(customer["_id"])
 
     # Note: Customer record in Navaratri_Customers is PRESERVED intact.
 
@@ -1146,295 +1268,25 @@ def check():
     return render_template("navaratri/check.html")
 
     
-# Helper functions to extract detailed analytics for the modern dashboard
-def get_navaratri_analytics(traditional_data):
-    def safe_int(val):
-        try:
-            return int(float(str(val).strip()))
-        except (ValueError, TypeError, AttributeError):
-            return 0
-
-    total_customers_trad = len(traditional_data)
-    total_collection_trad = sum(safe_int(b.get('total_price')) for b in traditional_data) + 29500
-    total_given_trad = sum(safe_int(b.get('given_price')) for b in traditional_data)
-    total_rem_trad = total_collection_trad - total_given_trad - 29500
-    avg_trad = total_collection_trad / total_customers_trad if total_customers_trad > 0 else 0
-
-    best_c, best_c_count, best_k, best_k_count = find_best_products_by_letter(traditional_data)
-    highest_booking_person, highest_booking_value = find_highest_booking_customer(traditional_data)
-
-    # Detailed statistics
-    product_counts = {}
-    choli_counts = {}
-    kediya_counts = {}
-    total_items_rented = 0
-
-    for customer in traditional_data:
-        bookings = customer.get("bookings", {})
-        if not isinstance(bookings, dict):
-            continue
-        for date, products in bookings.items():
-            if isinstance(products, list):
-                for p in products:
-                    if isinstance(p, str) and p.strip():
-                        code = p.strip().upper()
-                        product_counts[code] = product_counts.get(code, 0) + 1
-                        total_items_rented += 1
-                        if code.startswith('C'):
-                            choli_counts[code] = choli_counts.get(code, 0) + 1
-                        elif code.startswith('K'):
-                            kediya_counts[code] = kediya_counts.get(code, 0) + 1
-
-    top_cholis = sorted(choli_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-    top_kediyas = sorted(kediya_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-    top_products = sorted(product_counts.items(), key=lambda x: x[1], reverse=True)[:15]
-
-    # Aggregating bookings by date
-    bookings_by_date_dict = {}
-    for customer in traditional_data:
-        bookings = customer.get("bookings", {})
-        if not isinstance(bookings, dict):
-            continue
-        for raw_date, products in bookings.items():
-            if not isinstance(products, list) or not products:
-                continue
-            # Remove anything like ][][ or spaces
-            clean_date = raw_date.split('[')[0].strip()
-            if clean_date:
-                bookings_by_date_dict[clean_date] = bookings_by_date_dict.get(clean_date, 0) + len(products)
-
-    # Sort dates chronologically
-    sorted_date_items = []
-    for date_str, count in bookings_by_date_dict.items():
-        parsed_date = None
-        for fmt in ["%d-%m-%y", "%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"]:
-            try:
-                parsed_date = datetime.strptime(date_str, fmt)
-                break
-            except:
-                continue
-        if not parsed_date:
-            parsed_date = datetime.min
-        sorted_date_items.append((parsed_date, date_str, count))
-
-    sorted_date_items.sort(key=lambda x: x[0])
-    bookings_by_date = [{"date": item[1], "count": item[2]} for item in sorted_date_items]
-
-    # Payment Statuses
-    fully_paid = 0
-    partially_paid = 0
-    unpaid = 0
-    for customer in traditional_data:
-        tot = safe_int(customer.get('total_price'))
-        giv = safe_int(customer.get('given_price'))
-        if tot == 0:
-            continue
-        if giv >= tot:
-            fully_paid += 1
-        elif giv > 0:
-            partially_paid += 1
-        else:
-            unpaid += 1
-
-    payment_status = {
-        "fully_paid": fully_paid,
-        "partially_paid": partially_paid,
-        "unpaid": unpaid
-    }
-
-    # Top Customers & Top Debtors
-    top_customers = []
-    for customer in traditional_data:
-        tot = safe_int(customer.get('total_price'))
-        giv = safe_int(customer.get('given_price'))
-        rem = tot - giv
-        
-        item_count = 0
-        bookings = customer.get("bookings", {})
-        if isinstance(bookings, dict):
-            for products in bookings.values():
-                if isinstance(products, list):
-                    item_count += len(products)
-
-        top_customers.append({
-            "id": str(customer.get("_id")),
-            "name": customer.get("Name") or customer.get("name") or "Unknown",
-            "mobile": customer.get("mobile") or "",
-            "address": customer.get("address") or "",
-            "total_price": tot,
-            "given_price": giv,
-            "remaining": rem,
-            "item_count": item_count
-        })
-
-    top_customers.sort(key=lambda x: x['total_price'], reverse=True)
-    top_debtors = [c for c in top_customers if c['remaining'] > 0]
-    top_debtors.sort(key=lambda x: x['remaining'], reverse=True)
-
-    # Group & Reference Analysis
-    group_revenue = {}
-    reference_revenue = {}
-    for customer in traditional_data:
-        tot = safe_int(customer.get('total_price'))
-        group = customer.get('group', '-').strip()
-        ref = customer.get('reference', 'Self').strip()
-        if not group or group == '':
-            group = '-'
-        if not ref or ref == '':
-            ref = 'Self'
-        group_revenue[group] = group_revenue.get(group, 0) + tot
-        reference_revenue[ref] = reference_revenue.get(ref, 0) + tot
-
-    sorted_groups = sorted(group_revenue.items(), key=lambda x: x[1], reverse=True)[:10]
-    sorted_references = sorted(reference_revenue.items(), key=lambda x: x[1], reverse=True)[:10]
-
-    # ── Product-Centric Analytical AI ──
-    # A. Stock Utilization & Capacity Analytics
-    total_choli_stock = 150
-    total_kediya_stock = 173
-    total_stock = total_choli_stock + total_kediya_stock
-    
-    rented_codes = set(product_counts.keys())
-    rented_cholis = {code for code in rented_codes if code.startswith('C')}
-    rented_kediyas = {code for code in rented_codes if code.startswith('K')}
-    
-    utilization_choli_pct = round((len(rented_cholis) / total_choli_stock) * 100, 1) if total_choli_stock > 0 else 0
-    utilization_kediya_pct = round((len(rented_kediyas) / total_kediya_stock) * 100, 1) if total_kediya_stock > 0 else 0
-    overall_utilization_pct = round((len(rented_codes) / total_stock) * 100, 1) if total_stock > 0 else 0
-    
-    # B. Wear and Tear Heuristics (Since products are unique, track usage levels)
-    wear_tear_alerts = []
-    for code, count in top_products:
-        if count >= 3:
-            wear_tear_alerts.append({
-                "code": code,
-                "rentals": count,
-                "util_level": "High" if count >= 4 else "Medium",
-                "action": "Inspect fabric integrity. Consider maintenance or retirement. Replace with a new unique design to keep catalog fresh." if count >= 4 else "Perform standard fabric care, starching and button checks."
-            })
-            
-    # C. Cross-Selling Style Pairings (Items booked together on same date/account)
-    associations = {}
-    for customer in traditional_data:
-        bookings = customer.get("bookings", {})
-        if not isinstance(bookings, dict):
-            continue
-        for date, products in bookings.items():
-            if not isinstance(products, list) or len(products) < 2:
-                continue
-            cholis = [p.upper().strip() for p in products if isinstance(p, str) and p.strip().upper().startswith('C')]
-            kediyas = [p.upper().strip() for p in products if isinstance(p, str) and p.strip().upper().startswith('K')]
-            for c in cholis:
-                for k in kediyas:
-                    pair = (c, k)
-                    associations[pair] = associations.get(pair, 0) + 1
-                    
-    style_pairings = []
-    sorted_pairs = sorted(associations.items(), key=lambda x: x[1], reverse=True)[:10]
-    for pair, count in sorted_pairs:
-        style_pairings.append({
-            "choli": pair[0],
-            "kediya": pair[1],
-            "count": count,
-            "suggestion": "Highly associated pair. Recommend displaying together in catalog as a pre-matched style."
-        })
-
-    # D. Catalog Showcase Rotations (Identify idle unique garments)
-    choli_all_set = {f"C{i}" for i in range(1, 151)}
-    kediya_all_set = {f"K{i}" for i in range(1, 174)}
-    unbooked_cholis = list(choli_all_set - rented_cholis)
-    unbooked_kediyas = list(kediya_all_set - rented_kediyas)
-    unbooked_cholis.sort(key=lambda x: int(x[1:]) if x[1:].isdigit() else 0)
-    unbooked_kediyas.sort(key=lambda x: int(x[1:]) if x[1:].isdigit() else 0)
-    
-    catalog_rotations = []
-    for code in unbooked_cholis[:4]:
-        catalog_rotations.append({
-            "code": code,
-            "type": "Choli",
-            "reason": "Idle this cycle (0 bookings).",
-            "action": "Rotate to homepage featured slider or display at entrance window."
-        })
-    for code in unbooked_kediyas[:4]:
-        catalog_rotations.append({
-            "code": code,
-            "type": "Kediya",
-            "reason": "Idle this cycle (0 bookings).",
-            "action": "Reposition in catalog list header or display as outfit alternative."
-        })
+def get_fancy_analytics(fancy_collection):
+    kpis = summary_kpis(fancy_collection)
+    totals = kpis["totals"]
 
-    return {
-        "total_customers_trad": total_customers_trad,
-        "total_collection_trad": total_collection_trad,
-        "total_given_trad": total_given_trad,
-        "total_rem_trad": total_rem_trad,
-        "avg_trad": avg_trad,
-        "best_c": best_c,
-        "best_c_count": best_c_count,
-        "best_k": best_k,
-        "best_k_count": best_k_count,
-        "highest_booking_person": highest_booking_person,
-        "highest_booking_value": highest_booking_value,
-        "total_items_rented": total_items_rented,
-        "choli_count": sum(c for _, c in choli_counts.items()),
-        "kediya_count": sum(c for _, c in kediya_counts.items()),
-        "top_cholis": top_cholis,
-        "top_kediyas": top_kediyas,
-        "top_products": top_products,
-        "bookings_by_date": bookings_by_date,
-        "payment_status": payment_status,
-        "top_customers": top_customers[:15],
-        "top_debtors": top_debtors[:15],
-        "top_groups": sorted_groups,
-        "top_references": sorted_references,
-        
-        "utilization": {
-            "choli_pct": utilization_choli_pct,
-            "kediya_pct": utilization_kediya_pct,
-            "overall_pct": overall_utilization_pct,
-            "total_stock": total_stock,
-            "rented_unique": len(rented_codes),
-            "product_counts": product_counts
-        },
-        "wear_tear_alerts": wear_tear_alerts,
-        "style_pairings": style_pairings,
-        "catalog_rotations": catalog_rotations
-    }
-
-def get_fancy_analytics(fancy_data):
-    total_bookings = len(fancy_data)
-    total_revenue = sum(
-        int(b.get('price') or 0) for b in fancy_data if isinstance(b.get('price'), (int, float, str))
-    )
+    total_bookings = totals["bookings"]
+    total_revenue = totals["revenue"]
     avg_revenue = total_revenue / total_bookings if total_bookings > 0 else 0
 
-    returned_count = sum(1 for b in fancy_data if b.get("returned"))
-    taken_count = sum(1 for b in fancy_data if b.get("taken"))
-    not_returned = sum(
-        1 for b in fancy_data if b.get("taken") and not b.get("returned")
-    )
+    returned_count = totals["returned"]
+    taken_count = totals["taken"]
+    not_returned = totals["not_returned"]
 
-    costume_counter = {}
-    school_counter = {}
-    bookings_by_date_dict = {}
+    costume_counter = {r["key"]: r["count"] for r in kpis["by_costume"] if r["key"]}
+    school_counter = {r["key"]: r["count"] for r in kpis["by_school"] if r["key"]}
 
-    for b in fancy_data:
-        costume = b.get("costume")
-        school = b.get("school")
-        
-        if costume:
-            costume_counter[costume] = costume_counter.get(costume, 0) + 1
-        if school:
-            school_counter[school] = school_counter.get(school, 0) + 1
-
-        # Aggregating bookings by start date
-        raw_date = b.get("start_date")
-        if raw_date:
-            if isinstance(raw_date, datetime):
-                date_str = raw_date.strftime("%d-%m-%Y")
-            else:
-                date_str = str(raw_date).strip()
-            bookings_by_date_dict[date_str] = bookings_by_date_dict.get(date_str, 0) + 1
+    # Aggregating bookings by start date
+    bookings_by_date_dict = {}
+    for row in kpis["by_start_date"]:
+        bookings_by_date_dict[row["key"]] = row["count"]
 
     # Sort dates chronologically
     sorted_date_items = []
@@ -1485,11 +1337,15 @@ def dashboard_summary():
         except Exception as e:
             return f"Error: Database connection failed - {e}"
 
-        traditional_data = list(collection.find())
-        trad_analytics = get_navaratri_analytics(traditional_data)
+        trad_analytics = cached_result(
+            "navaratri_analytics", collection.name,
+            lambda: summary_analytics(collection)
+        )
 
-        fancy_data = list(fancy_collection.find())
-        fancy_analytics = get_fancy_analytics(fancy_data)
+        fancy_analytics = cached_result(
+            "fancy_analytics", fancy_collection.name,
+            lambda: get_fancy_analytics(fancy_collection)
+        )
 
         combined_collection = trad_analytics.get("total_collection_trad", 0) + fancy_analytics.get("total_collection_fancy", 0)
 
@@ -1558,252 +1414,16 @@ def download_customer():
     if not customer:
         return "Customer not found", 404
 
-    # Remaining price
-    customer['remaining'] = customer.get('total_price', 0) - customer.get('given_price', 0)
+    # The content key of the invoice is its ETag: unchanged bookings and
+    # prices mean the copy the client holds is still the bill
+    key = invoice_key(customer)
+    if request.method in ("GET", "HEAD") and key in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(key)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
 
-    class PDF(FPDF):
-        def header(self):
-            # Background navy banner
-            self.set_fill_color(10, 17, 32)  # #0a1120 Premium navy
-            self.rect(0, 0, 210, 42, 'F')
-            
-            # Shop Logo
-            logo_path = os.path.join(current_app.root_path, "static", "Home_Img", "favicon.png")
-            if os.path.exists(logo_path):
-                self.image(logo_path, 15, 10, 22)
-            
-            # Title
-            self.set_text_color(212, 175, 55)  # Gold #d4af37
-            self.set_font('helvetica', 'B', 22)
-            self.set_xy(42, 10)
-            self.cell(0, 10, 'IMAGE TRADITIONAL', ln=1)
-            
-            # Address info (white text)
-            self.set_text_color(241, 245, 249)
-            self.set_font('helvetica', '', 9)
-            self.set_xy(42, 20)
-            self.multi_cell(
-                95, 4.5,
-                "Nr. Laxminarayan Bus-stand, Opp Prarabdh Soc.\n"
-                "Maninagar(E), Ahmedabad-08",
-                align='L'
-            )
-            
-            # Owner & Meta Details (Right Side)
-            self.set_text_color(212, 175, 55)  # Gold
-            self.set_font('helvetica', 'B', 10)
-            self.set_xy(140, 11)
-            self.cell(55, 5, "Prakash Mandali: 9428610384", align='R', ln=1)
-            
-            self.set_text_color(241, 245, 249)
-            self.set_font('helvetica', '', 9)
-            self.set_xy(140, 17)
-            self.cell(55, 5, "Rental Booking Invoice", align='R', ln=1)
-            
-            self.set_xy(140, 23)
-            self.cell(55, 5, f"Date: {datetime.now().strftime('%d-%b-%Y')}", align='R', ln=1)
-            
-            # Space below header banner
-            self.ln(25)
-
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('helvetica', 'I', 8)
-            self.set_text_color(148, 163, 184)
-            self.cell(0, 10, f'Page {self.page_no()}/{{nb}} | Image Traditional Rental Receipt', align='C')
-
-    pdf = PDF('P', 'mm', 'A4')
-    pdf.alias_nb_pages()
-    pdf.add_page()
-
-    # ------- Customer Details Heading -------
-    pdf.set_y(46)
-    pdf.set_font('helvetica', 'B', 11)
-    pdf.set_text_color(15, 23, 42)  # Dark slate
-    pdf.cell(0, 8, "CUSTOMER & BOOKING DETAILS", ln=1)
-    
-    # Gold separator line
-    pdf.set_draw_color(212, 175, 55)
-    pdf.set_line_width(0.5)
-    pdf.line(15, pdf.get_y(), 195, pdf.get_y())
-    pdf.ln(4)
-
-    # ------- Two-Column Customer Details Grid -------
-    def render_row(label1, val1, label2, val2):
-        y = pdf.get_y()
-        # Col 1 Label
-        pdf.set_xy(15, y)
-        pdf.set_font('helvetica', 'B', 9)
-        pdf.set_text_color(100, 116, 139)  # Muted slate
-        pdf.cell(32, 6, sanitize_latin1(label1) + ":", border=0)
-        # Col 1 Value
-        pdf.set_font('helvetica', '', 9.5)
-        pdf.set_text_color(15, 23, 42)
-        pdf.cell(63, 6, sanitize_latin1(str(val1)), border=0)
-        
-        # Col 2 Label
-        pdf.set_font('helvetica', 'B', 9)
-        pdf.set_text_color(100, 116, 139)
-        pdf.cell(28, 6, sanitize_latin1(label2) + ":", border=0)
-        # Col 2 Value
-        pdf.set_font('helvetica', '', 9.5)
-        pdf.set_text_color(15, 23, 42)
-        pdf.cell(57, 6, sanitize_latin1(str(val2)), border=0)
-        pdf.ln(7.5)
-
-    render_row("Customer Name", customer.get("Name", "N/A"), "Group Name", customer.get("group", "N/A"))
-    render_row("Mobile Number", customer.get("mobile", "N/A"), "Reference", customer.get("reference", "N/A"))
-    render_row("Security Deposit", customer.get('deposit', 'N/A'), "Address", customer.get("address", "N/A"))
-    
-    pdf.ln(2)
-
-    # ------- Items Table Heading -------
-    pdf.set_font('helvetica', 'B', 11)
-    pdf.set_text_color(15, 23, 42)
-    pdf.cell(0, 8, "RENTAL ITEMS", ln=1)
-    
-    # Gold separator line
-    pdf.set_draw_color(212, 175, 55)
-    pdf.line(15, pdf.get_y(), 195, pdf.get_y())
-    pdf.ln(4)
-
-    # ------- Table Header -------
-    pdf.set_font('helvetica', 'B', 10)
-    pdf.set_text_color(255, 255, 255)  # White
-    pdf.set_fill_color(10, 17, 32)      # Navy
-    pdf.set_draw_color(10, 17, 32)      # Navy
-    
-    pdf.set_x(15)
-    pdf.cell(15, 9, "Sr.", border=1, align="C", fill=True)
-    pdf.cell(50, 9, "Product Code", border=1, align="C", fill=True)
-    pdf.cell(60, 9, "Product Preview", border=1, align="C", fill=True)
-    pdf.cell(55, 9, "Booking Date", border=1, align="C", fill=True)
-    pdf.ln()
-
-    # ------- Table Rows -------
-    pdf.set_font("helvetica", "", 10)
-    pdf.set_text_color(15, 23, 42)
-    pdf.set_draw_color(226, 232, 240)  # Soft grey borders
-    
-    sr = 1
-    bookings = customer.get("bookings", {})
-
-    for date, codes in bookings.items():
-        for code in codes:
-            pdf.set_x(15)
-            # Row height 25 to fit image
-            pdf.cell(15, 25, str(sr), border=1, align="C")
-            pdf.cell(50, 25, f"  {code}", border=1, align="L")
-
-            # Image Cell
-            x = pdf.get_x()
-            y = pdf.get_y()
-            pdf.cell(60, 25, "", border=1)
-
-            img_path = None
-            if code.startswith("K"):
-                img_path = os.path.join(current_app.static_folder, "KediyaJpg", f"{code}.jpg")
-            elif code.startswith("C"):
-                img_path = os.path.join(current_app.static_folder, "CholiJpg", f"{code}.jpg")
-            elif code.startswith("G"):
-                img_path = os.path.join(current_app.static_folder, "GroupJpg", f"{code}.jpg")
-
-            if img_path and os.path.exists(img_path):
-                # Center image inside cell: Cell width 60, height 25. Image width 36, height 21
-                pdf.image(img_path, x + 12, y + 2, 36, 21)
-            else:
-                curr_y = pdf.get_y()
-                pdf.set_xy(x, y + 10)
-                pdf.set_font("helvetica", "I", 8.5)
-                pdf.set_text_color(148, 163, 184)
-                pdf.cell(60, 5, "No Preview Available", border=0, align="C")
-                pdf.set_font("helvetica", "", 10)
-                pdf.set_text_color(15, 23, 42)
-                pdf.set_xy(x + 60, y)
-
-            pdf.cell(55, 25, date, border=1, align="C")
-            pdf.ln()
-
-            sr += 1
-
-    # ------- Totals Card Section -------
-    pdf.ln(5)
-    totals_start_x = 115
-    
-    total_price = customer.get("total_price", 0)
-    given_price = customer.get("given_price", 0)
-    remaining = total_price - given_price
-
-    # Row: Total Price
-    pdf.set_x(totals_start_x)
-    pdf.set_font("helvetica", "B", 9.5)
-    pdf.set_text_color(100, 116, 139)
-    pdf.cell(45, 6, "Total Amount:", align="R")
-    pdf.set_font("helvetica", "B", 10.5)
-    pdf.set_text_color(15, 23, 42)
-    pdf.cell(35, 6, f"Rs. {total_price}", align="R", ln=1)
-
-    # Row: Given Price
-    pdf.set_x(totals_start_x)
-    pdf.set_font("helvetica", "B", 9.5)
-    pdf.set_text_color(100, 116, 139)
-    pdf.cell(45, 6, "Amount Paid:", align="R")
-    pdf.set_font("helvetica", "B", 10.5)
-    pdf.set_text_color(16, 185, 129)  # Success Green
-    pdf.cell(35, 6, f"Rs. {given_price}", align="R", ln=1)
-
-    # Divider line
-    pdf.set_draw_color(226, 232, 240)
-    pdf.line(totals_start_x, pdf.get_y() + 1, 195, pdf.get_y() + 1)
-    pdf.ln(2.5)
-
-    # Row: Remaining (Balance Due Box)
-    pdf.set_x(totals_start_x)
-    if remaining > 0:
-        pdf.set_fill_color(254, 242, 242)  # Light Red background
-        pdf.set_draw_color(239, 68, 68)    # Red border
-        pdf.set_text_color(220, 38, 38)    # Red text
-    else:
-        pdf.set_fill_color(240, 253, 250)  # Light Green background
-        pdf.set_draw_color(16, 185, 129)   # Green border
-        pdf.set_text_color(13, 148, 136)   # Teal text
-
-    y = pdf.get_y()
-    pdf.rect(totals_start_x, y, 80, 8.5, 'DF')
-    pdf.set_xy(totals_start_x, y + 1.25)
-    pdf.set_font("helvetica", "B", 9.5)
-    pdf.cell(45, 6, "Balance Due:", align="R")
-    pdf.set_font("helvetica", "B", 11.5)
-    pdf.cell(30, 6, f"Rs. {remaining}", align="R")
-    pdf.ln(13)
-
-    # ------- Terms & Conditions -------
-    pdf.set_x(15)
-    pdf.set_font("helvetica", "B", 8.5)
-    pdf.set_text_color(100, 116, 139)
-    pdf.cell(0, 4, "Terms & Conditions:", ln=1)
-    
-    pdf.set_font("helvetica", "", 7.5)
-    pdf.set_text_color(148, 163, 184)
-    pdf.set_x(15)
-    pdf.multi_cell(
-        180, 3.5,
-        "1. Please verify the condition of all rental items before leaving the shop.\n"
-        "2. Rental items must be returned on the scheduled return date. Delayed returns may incur penalty fees.\n"
-        "3. The security deposit is fully refundable upon returning all items without damage.\n"
-        "4. Thank you for choosing Image Traditional!",
-        align="L"
-    )
-
-    # Output PDF as bytes
-    pdf_output = pdf.output(dest="S")
-    if isinstance(pdf_output, str):
-        pdf_bytes = pdf_output.encode("latin1")
-    else:
-        pdf_bytes = bytes(pdf_output)
-
-    pdf_buffer = io.BytesIO(pdf_bytes)
-    pdf_buffer.seek(0)
+    key, pdf_bytes = cached_invoice(customer, current_app.static_folder, collection.name)
 
     filename = f"{customer.get('Name', 'customer')}_Profile.pdf"
 
@@ -1812,12 +1432,15 @@ def download_customer():
     except Exception:
         pass
 
-    return send_file(
-        pdf_buffer,
+    response = send_file(
+        io.BytesIO(pdf_bytes),
         as_attachment=True,
         download_name=filename,
-        mimetype="application/pdf"
+        mimetype="application/pdf",
+        etag=key
     )
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @navaratri.route('/search', methods=['GET', 'POST'])
@@ -1835,33 +1458,28 @@ def search():
         # --------------------------
         # Normal Collection Search
         # --------------------------
-        normal_matches = collection.find({
-            "$or": [
-                {"Name": {"$regex": query, "$options": "i"}},
-                {"mobile": {"$regex": query, "$options": "i"}},
-                {"address": {"$regex": query, "$options": "i"}},
-                {"group": {"$regex": query, "$options": "i"}},
-                {"reference": {"$regex": query, "$options": "i"}},
-                {"bookings": {"$exists": True}}
-            ]
-        })
+        normal_matches, terms = search_documents(collection, "navaratri", query)
 
         for c in normal_matches:
             bookings = c.get("bookings", {})
             total_price = bookings.get("total_price", c.get("total_price", ""))
             given_price = bookings.get("given_price", c.get("given_price", ""))
 
+            # A customer found by its own fields lists every product, one
+            # found by product codes only the matching ones
+            customer_tokens = [
+                t for field in SEARCH_FIELDS["navaratri"]
+                for t in (mobile_tokens(c.get(field)) if field in MOBILE_FIELDS else text_tokens(c.get(field)))
+            ]
+            whole_customer = matches_all(customer_tokens, terms)
+
             for date_key, products in bookings.items():
                 if date_key in ["total_price", "given_price"]:
                     continue
                 if isinstance(products, list):
                     for product in products:
-                        if query.lower() in str(product).lower() \
-                           or query.lower() in c.get("Name", "").lower() \
-                           or query.lower() in c.get("mobile", "").lower() \
-                           or query.lower() in c.get("address", "").lower() \
-                           or query.lower() in c.get("group", "").lower() \
-                           or query.lower() in c.get("reference", "").lower():
+                        code = normalize_product_code(product).lower()
+                        if whole_customer or any(code.startswith(term) for term in terms):
                             normal_results.append({
                                 "name": c.get("Name", "N/A"),
                                 "mobile": c.get("mobile", "N/A"),
@@ -1877,16 +1495,7 @@ def search():
         # --------------------------
         # Fancy Collection Search
         # --------------------------
-        fancy_matches = fancy_collection.find({
-            "$or": [
-                {"name": {"$regex": query, "$options": "i"}},
-                {"mobile": {"$regex": query, "$options": "i"}},
-                {"address": {"$regex": query, "$options": "i"}},
-                {"Address": {"$regex": query, "$options": "i"}},  # handle capital A
-                {"costume": {"$regex": query, "$options": "i"}},
-                {"details": {"$regex": query, "$options": "i"}},
-            ]
-        })
+        fancy_matches, _ = search_documents(fancy_collection, "fancy", query)
 
         for f in fancy_matches:
             fancy_results.append({
@@ -1976,41 +1585,32 @@ def export_calendar_bookings():
     try:
         from datetime import timedelta
         date_obj = datetime.strptime(date, "%Y-%m-%d")
-        formatted_date = date_obj.strftime("%d-%m-%y")
     except ValueError:
         return "Invalid date format. Expected YYYY-MM-DD", 400
 
-    # Calculate yesterday's and tomorrow's date strings
-    yesterday_obj = date_obj - timedelta(days=1)
-    yesterday_date_str = yesterday_obj.strftime("%d-%m-%y")
-    
-    tomorrow_obj = date_obj + timedelta(days=1)
-    tomorrow_date_str = tomorrow_obj.strftime("%d-%m-%y")
+    # Calculate yesterday's and tomorrow's dates
+    selected_iso = date_obj.strftime("%Y-%m-%d")
+    yesterday_iso = (date_obj - timedelta(days=1)).strftime("%Y-%m-%d")
+    tomorrow_iso = (date_obj + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    # One indexed lookup on the booking lines for the day and its neighbours
+    rows = lines_by_date(get_lines(collection), [yesterday_iso, selected_iso, tomorrow_iso])
 
-    # Query MongoDB for bookings on formatted_date, yesterday, and tomorrow
-    customers = list(collection.find({f"bookings.{formatted_date}": {"$exists": True}}))
-    yesterday_customers = list(collection.find({f"bookings.{yesterday_date_str}": {"$exists": True}}))
-    tomorrow_customers = list(collection.find({f"bookings.{tomorrow_date_str}": {"$exists": True}}))
-    
     # Map product codes to yesterday's renter details
     yesterday_map = {}
-    for yc in yesterday_customers:
-        y_prods = yc.get("bookings", {}).get(yesterday_date_str, [])
-        for yp in y_prods:
-            yesterday_map[yp] = {
-                "name": yc.get("Name", "Unknown"),
-                "mobile": yc.get("mobile", "N/A")
-            }
-            
+    for r in rows[yesterday_iso]:
+        yesterday_map[r["product_code"]] = {
+            "name": r.get("name", "Unknown"),
+            "mobile": r.get("mobile") or "N/A"
+        }
+
     # Map product codes to tomorrow's renter details
     tomorrow_map = {}
-    for tc in tomorrow_customers:
-        t_prods = tc.get("bookings", {}).get(tomorrow_date_str, [])
-        for tp in t_prods:
-            tomorrow_map[tp] = {
-                "name": tc.get("Name", "Unknown"),
-                "mobile": tc.get("mobile", "N/A")
-            }
+    for r in rows[tomorrow_iso]:
+        tomorrow_map[r["product_code"]] = {
+            "name": r.get("name", "Unknown"),
+            "mobile": r.get("mobile") or "N/A"
+        }
 
     # Prepare CSV fieldnames matching the web dashboard
     fieldnames = [
@@ -2025,20 +1625,19 @@ def export_calendar_bookings():
     writer = csv.DictWriter(output, fieldnames=fieldnames)
     writer.writeheader()
 
-    for c in customers:
-        products = c.get("bookings", {}).get(formatted_date, [])
-        for product in products:
-            y_info = yesterday_map.get(product)
-            t_info = tomorrow_map.get(product)
-
-            row = {
-                "Customer Name": c.get("Name", "N/A"),
-                "Customer Mobile": c.get("mobile", "N/A"),
-                "Product Code": product,
-                "Booked Yesterday": f"{y_info['name']} - {y_info['mobile']}" if y_info else "",
-                "Booked Tomorrow": f"{t_info['name']} - {t_info['mobile']}" if t_info else ""
-            }
-            writer.writerow(row)
+    for r in rows[selected_iso]:
+        product = r["product_code"]
+        y_info = yesterday_map.get(product)
+        t_info = tomorrow_map.get(product)
+
+        row = {
+            "Customer Name": r.get("name", "N/A"),
+            "Customer Mobile": r.get("mobile") or "N/A",
+            "Product Code": product,
+            "Booked Yesterday": f"{y_info['name']} - {y_info['mobile']}" if y_info else "",
+            "Booked Tomorrow": f"{t_info['name']} - {t_info['mobile']}" if t_info else ""
+        }
+        writer.writerow(row)
 
     output.seek(0)
     filename = f"Bookings_{date}.csv"
@@ -2086,19 +1685,117 @@ def send_whatsapp_auto_route():
     if not customer:
         return jsonify({"success": False, "message": "Customer not found"}), 404
 
-    target_mobile = customer.get("mobile")
-    customer_name = customer.get("Name", "Customer")
-    
-    # Build public external PDF invoice download link
-    pdf_url = url_for('navaratri.download_customer', id=str(customer["_id"]), _external=True)
+    # Rendering and the Meta call happen in a job worker (ndispatch.py)
+    job_id = queue_invoice_message(collection.name, customer, request.url_root)
 
-    from website.general.utils import send_whatsapp_pdf_cloud_api
-    ok, response_data = send_whatsapp_pdf_cloud_api(target_mobile, pdf_url, customer_name)
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status_url": url_for('general.job_status_route', job_id=job_id),
+        "message": f"PDF invoice queued for WhatsApp (+91 {customer.get('mobile')})."
+    }), 202
+
+
+@navaratri.route("/invoice/<key>.pdf")
+def invoice_file(key):
+    """Invoice stored by ninvoice.store_invoice; the link sent on WhatsApp"""
+    pdf_bytes = stored_invoice(key)
+    if pdf_bytes is None:
+        return "Invoice not found", 404
+    response = send_file(io.BytesIO(pdf_bytes), mimetype="application/pdf", download_name=f"{key}.pdf")
+    # A key names one version of one invoice, its bytes never change
+    response.headers["Cache-Control"] = "public, max-age=86400, immutable"
+    return response
+
+# ------------------ WHATSAPP BROADCAST ------------------
+
+def broadcast_summary(broadcast):
+    counts = broadcast_counts(broadcast["_id"])
+    return {
+        "id": str(broadcast["_id"]),
+        "collection": broadcast["collection"],
+        "message": broadcast["message"],
+        "date": broadcast.get("date"),
+        "status": broadcast["status"],
+        "rate": broadcast["rate"],
+        "concurrency": broadcast["concurrency"],
+        "total": broadcast["total"],
+        "counts": counts,
+        "failed": failed_recipients(broadcast["_id"]),
+        "job_id": broadcast.get("job_id")
+    }
+
+
+@navaratri.route("/api/broadcast", methods=["POST"])
+def start_broadcast():
+    """
+    Sends a reminder (or the bill) on WhatsApp to every customer booked on
+    `date` (tomorrow by default), or with scope=cycle the bill to every
+    customer of the cycle. Answers at once; sending is a background job.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or request.form
+    message = data.get("message", "reminder")
+    scope = data.get("scope", "date")
+
+    target = collection
+    if data.get("cycle_id"):
+        cycle = get_cycle_by_id(data.get("cycle_id"))
+        if not cycle:
+            return jsonify({"success": False, "message": "Cycle not found"}), 404
+        target = db[cycle["collection_name"]]
+
+    date = None
+    if scope == "date":
+        date = iso_date(data.get("date")) if data.get("date") else next_date()
+        if not date:
+            return jsonify({"success": False, "message": "Invalid date"}), 400
+
+    try:
+        broadcast = create_broadcast(
+            target.name, message, request.url_root, date,
+            rate=data.get("rate") or BROADCAST_RATE,
+            concurrency=data.get("concurrency") or BROADCAST_CONCURRENCY
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "broadcast_id": str(broadcast["_id"]),
+        "job_id": broadcast["job_id"],
+        "recipients": broadcast["total"],
+        "status_url": url_for('navaratri.broadcast_status', broadcast_id=str(broadcast["_id"]))
+    }), 202
+
+
+@navaratri.route("/api/broadcast/<broadcast_id>")
+def broadcast_status(broadcast_id):
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    broadcast = get_broadcast(broadcast_id)
+    if broadcast is None:
+        return jsonify({"success": False, "message": "Broadcast not found"}), 404
+    response = jsonify({"success": True, "broadcast": broadcast_summary(broadcast)})
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@navaratri.route("/api/broadcast/<broadcast_id>/resume", methods=["POST"])
+def resume_broadcast(broadcast_id):
+    """Queues the broadcast's pending recipients again, e.g. after its job gave up"""
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    broadcast = get_broadcast(broadcast_id)
+    if broadcast is None:
+        return jsonify({"success": False, "message": "Broadcast not found"}), 404
+    job_id = queue_broadcast(broadcast["_id"])
+    return jsonify({"success": True, "job_id": job_id}), 202
 
-    if ok:
-        return jsonify({"success": True, "message": f"PDF invoice sent automatically to WhatsApp (+91 {target_mobile})!"})
-    else:
-        return jsonify({"success": False, "message": f"Meta WhatsApp API: {response_data}"}), 400
 
 @navaratri.route("/generate-qr/<mobile>")
 def generate_qr(mobile):
@@ -2192,54 +1889,41 @@ def code_detail(code):
     if not session.get('logged_in'):
         return redirect(url_for('navaratri.login'))
 
-    pipeline = [
-        {"$project": {
-            "Name": 1,
-            "mobile": 1,
-            "address": 1,
-            "deposit": 1,
-            "group": 1,
-            "reference": 1,
-            "given_price": 1,
-            "total_price": 1,
-            "bookingsArr": {"$objectToArray": "$bookings"}  # convert object to array
-        }},
-        {"$unwind": "$bookingsArr"},
-        {"$match": {"bookingsArr.v": {"$in": [code]}}}, 
-        {"$project": {
-            "dateStr": "$bookingsArr.k",
-            "day": {"$toInt": {"$substr": ["$bookingsArr.k", 0, 2]}},
-            "month": {"$toInt": {"$substr": ["$bookingsArr.k", 3, 2]}},
-            "year": {"$toInt": {"$concat": ["20", {"$substr": ["$bookingsArr.k", 6, 2]}]}},
-            "user": {
-                "id": {"$toString": "$_id"},
-                "Name": "$Name",
-                "mobile": "$mobile",
-                "address": "$address",
-                "group": "$group",
-                "reference": "$reference",
-                "deposit": "$deposit"
-            },
-            "given_price": "$given_price",
-            "total_price": "$total_price"
-        }},
-        {"$group": {
-            "_id": "$dateStr",
-            "year": {"$first": "$year"},
-            "month": {"$first": "$month"},
-            "day": {"$first": "$day"},
-            "bookings": {"$push": {
-                "user": "$user",
-                "given_price": "$given_price",
-                "total_price": "$total_price"
-            }}
-        }}
-    ]
+    # Served by the (product, date) index on the cycle's booking lines
+    rows = list(
+        get_lines(collection).find({"product_code": normalize_product_code(code)}).sort("date", 1)
+    )
 
-    results = list(collection.aggregate(pipeline))
+    customer_ids = list({r["customer_id"] for r in rows})
+    customers = {
+        c["_id"]: c
+        for c in collection.find(
+            {"_id": {"$in": customer_ids}},
+            {"Name": 1, "mobile": 1, "address": 1, "deposit": 1, "group": 1,
+             "reference": 1, "given_price": 1, "total_price": 1}
+        )
+    }
 
-    # Sort in Python by year, month, day
-    results.sort(key=lambda r: (r["year"], r["month"], r["day"]))
+    results = []
+    for r in rows:
+        c = customers.get(r["customer_id"])
+        if not c:
+            continue
+        if not results or results[-1]["iso"] != r["date"]:
+            results.append({"iso": r["date"], "_id": r["date_key"], "bookings": []})
+        results[-1]["bookings"].append({
+            "user": {
+                "id": str(c["_id"]),
+                "Name": c.get("Name"),
+                "mobile": c.get("mobile"),
+                "address": c.get("address"),
+                "group": c.get("group"),
+                "reference": c.get("reference"),
+                "deposit": c.get("deposit")
+            },
+            "given_price": c.get("given_price"),
+            "total_price": c.get("total_price")
+        })
 
     # Prepare for template
     bookings_by_date = [{"date": r["_id"], "bookings": r["bookings"]} for r in results]
@@ -2277,9 +1961,7 @@ def dashboard_listing():
     if not session.get('logged_in'):
         return redirect(url_for('navaratri.login'))
 
-    bookings = list(collection.find())
-    for b in bookings:
-        b['remaining'] = b.get('total_price', 0) - b.get('given_price', 0)
+    bookings = with_remaining(find_view(collection, "dashboard_listing"))
 
     return render_template("navaratri/dashboard_listing.html", bookings=bookings)
 # Add/replace this route in your blueprint (navaratri)
@@ -2310,26 +1992,12 @@ def available():
             except Exception:
                 formatted_date = date
 
-            # Collect booked codes for that date (safe check, handles list or comma-string)
+            # Collect booked codes for that date from the (date, product) index
             booked = set()
-            for doc in collection.find({}):
-                bookings = doc.get("bookings", {})
-                if not isinstance(bookings, dict):
-                    continue
-                if formatted_date in bookings:
-                    value = bookings.get(formatted_date, [])
-                    # normalize: could be list or string like "C1,C2"
-                    if isinstance(value, str):
-                        items = [p.strip() for p in value.split(',') if p.strip()]
-                    elif isinstance(value, list):
-                        items = value
-                    else:
-                        items = []
-
-                    for p in items:
-                        if not isinstance(p, str):
-                            continue
-                        booked.add(p.strip().upper())
+            iso = iso_date(formatted_date)
+            if iso:
+                for row in get_lines(collection).find({"date": iso}, {"product_code": 1}):
+                    booked.add(row["product_code"])
 
             # Debug prints (check server console)
             current_app.logger.debug(f"[DEBUG] Booked on {formatted_date} => {len(booked)} items: {sorted(booked)[:50]}")
@@ -2381,6 +2049,8 @@ def add_product():
                 })
             except Exception as e:
                 current_app.logger.warning(f"Skipping duplicate code: {code}")
+    bump_cycle_version(products.name)
+    autocomplete_changed()
 
     return redirect(url_for('navaratri.Storage'))
 
@@ -2416,7 +2086,7 @@ def Storage():
     all_bags = list(bags.find())
 
     # Generate available codes (for checkboxes)
-    all_codes = [f'C{i}' for i in range(1, 151)] + [f'K{i}' for i in range(1, 174)]
+    all_codes = list(INVENTORY_CODES)
     used_codes = [p['_id'] for p in products.find({}, {"_id": 1})]
     available_codes = [c for c in all_codes if c not in used_codes]
 
@@ -2478,8 +2148,10 @@ def navaratri_dashboard():
         except Exception as e:
             return f"Error: Database connection failed - {e}"
 
-        traditional_data = list(collection.find())
-        trad_analytics = get_navaratri_analytics(traditional_data)
+        trad_analytics = cached_result(
+            "navaratri_analytics", collection.name,
+            lambda: summary_analytics(collection)
+        )
 
         context = {
             "selected_cycle": selected_cycle,
@@ -2621,14 +2293,7 @@ def unlock_cycle(cycle_id):
         flash("❌ Invalid credentials!", "error")
         return redirect("/navaratri_admin")
 
-    navaratri_cycles.update_one(
-        {"_id": ObjectId(cycle_id)},
-        {
-            "$set": {
-                "edit_override": True
-            }
-        }
-    )
+    set_cycle_edit_override(cycle_id, True)
 
     flash("🔓 Cycle unlocked successfully!", "success")
     return redirect("/navaratri_admin")
@@ -2641,14 +2306,7 @@ def lock_cycle(cycle_id):
     if not session.get('logged_in'):
         return redirect(url_for('auth.login'))
 
-    navaratri_cycles.update_one(
-        {"_id": ObjectId(cycle_id)},
-        {
-            "$set": {
-                "edit_override": False
-            }
-        }
-    )
+    set_cycle_edit_override(cycle_id, False)
 
     flash("🔒 Cycle locked successfully!", "success")
     return redirect("/navaratri_admin")
@@ -2685,6 +2343,7 @@ def get_navaratri_customer():
                     )
         except Exception as e:
             current_app.logger.error(f"Migration error: {e}")
+        directory_changed(ncustomers)
 
     # Check if they have a booking in this cycle first
     active_customer = collection.find_one({"mobile": mobile})
@@ -2719,125 +2378,31 @@ def get_navaratri_customer():
 
 
 # ------------------ Page: Navaratri Customers Directory ------------------
-KNOWN_LOCALITIES = [
-    "Lambha", "Dehgam", "Patan", "Palanpur", "Unjha", "Visnagar", "Mehsana", "Kalol", "Chhatral", "Kadi", "Himmatnagar", "Gandhinagar",
-    "Nadiad", "Anand", "Bakrol", "Vadtal", "Vadodara", "Surat", "Rajkot", "Kheda", "Sanand", "Dholka", "Bavla",
-    "Aslali", "Bareja", "Changodar", "Moraiya",
-    "Nava Vadaj", "Vadaj", "Jay Hind", "Arbuda Nagar", "Haridarshan", "Hathijan", "Vivekanand Nagar",
-    "Saijpur Bogha", "Saijpur", "Jivraj Park", "South Bopal", "Bopal", "Ghatlodiya", "Gordhanwadi", "Maniyasa", "Laxminarayan",
-    "Jashodanagar", "Jashoda Nagar", "Bhadwat Nagar", "Prahlad Nagar", "Prahladnagar", "Prerna Tirth", "Satelite",
-    "New Maninagar", "New Vatva", "Shahwadi", "Motipura", "Sureliya", "Khodiyar Nagar", "Rajendra Park", "Saheed Circle", "Aman Nagar",
-    "Vastral", "Maninagar", "Khokhra", "Isanpur", "Amraiwadi", "Ghodasar",
-    "Vatva", "Odhav", "Hatkeshwar", "CTM", "Nikol", "Ramol", "Narol",
-    "Bapunagar", "Saraspur", "Asarwa", "Shahibaug", "Naroda", "Rakhial",
-    "Sarangpur", "Kalupur", "Astodia", "Raipur", "Lal Darwaja", "Geeta Mandir",
-    "Shahpur", "Dani Limda", "Navrangpura", "Satellite", "Vastrapur", "Bodakdev",
-    "Thaltej", "Sola", "Gota", "Ghatlodia", "Naranpura", "Paldi", "Vasna",
-    "Ranip", "Sabarmati", "Chandkheda"
-]
-
-AREA_COORDINATES = {
-    "Lambha": [22.9238, 72.5843],
-    "Dehgam": [23.1670, 72.8120],
-    "Patan": [23.8493, 72.1266],
-    "Palanpur": [24.1724, 72.4346],
-    "Unjha": [23.8043, 72.3942],
-    "Visnagar": [23.6961, 72.5484],
-    "Mehsana": [23.5880, 72.3693],
-    "Kalol": [23.2393, 72.4962],
-    "Chhatral": [23.2800, 72.4500],
-    "Kadi": [23.3000, 72.3300],
-    "Himmatnagar": [23.5979, 72.9698],
-    "Gandhinagar": [23.2156, 72.6369],
-    "Nadiad": [22.6916, 72.8634],
-    "Anand": [22.5645, 72.9289],
-    "Bakrol": [22.5480, 72.9350],
-    "Vadtal": [22.5920, 72.8880],
-    "Vadodara": [22.3072, 73.1812],
-    "Surat": [21.1702, 72.8311],
-    "Rajkot": [22.3039, 70.8022],
-    "Kheda": [22.7500, 72.6800],
-    "Sanand": [22.9910, 72.3810],
-    "Dholka": [22.7200, 72.4700],
-    "Bavla": [22.8300, 72.3600],
-    "Aslali": [22.9210, 72.6010],
-    "Bareja": [22.8850, 72.6050],
-    "Changodar": [22.9230, 72.4410],
-    "Moraiya": [22.9150, 72.4350],
-    "Nava Vadaj": [23.0640, 72.5690],
-    "Vadaj": [23.0640, 72.5690],
-    "Jay Hind": [22.9920, 72.5980],
-    "Arbuda Nagar": [23.0250, 72.6630],
-    "Haridarshan": [23.0450, 72.6680],
-    "Hathijan": [22.9280, 72.6390],
-    "Vivekanand Nagar": [22.9280, 72.6390],
-    "Saijpur Bogha": [23.0640, 72.6280],
-    "Saijpur": [23.0640, 72.6280],
-    "Jivraj Park": [23.0010, 72.5410],
-    "South Bopal": [23.0300, 72.4640],
-    "Bopal": [23.0300, 72.4640],
-    "Ghatlodiya": [23.0682, 72.5358],
-    "Gordhanwadi": [22.9980, 72.5920],
-    "Maniyasa": [22.9976, 72.6009],
-    "Laxminarayan": [22.9554, 72.6240],
-    "Jashodanagar": [22.9850, 72.6250],
-    "Jashoda Nagar": [22.9850, 72.6250],
-    "Bhadwat Nagar": [22.9910, 72.6080],
-    "Prahlad Nagar": [23.0125, 72.5118],
-    "Prahladnagar": [23.0125, 72.5118],
-    "Prerna Tirth": [23.0300, 72.5176],
-    "Satelite": [23.0300, 72.5176],
-    "Vastral": [23.0041, 72.6617],
-    "Maninagar": [22.9976, 72.6009],
-    "New Maninagar": [22.9850, 72.6150],
-    "Khokhra": [22.9983, 72.6167],
-    "Isanpur": [22.9731, 72.5976],
-    "Amraiwadi": [23.0039, 72.6288],
-    "Ghodasar": [22.9815, 72.6094],
-    "Vatva": [22.9554, 72.6240],
-    "New Vatva": [22.9480, 72.6310],
-    "Odhav": [23.0232, 72.6698],
-    "Hatkeshwar": [23.0012, 72.6225],
-    "CTM": [22.9908, 72.6321],
-    "Nikol": [23.0483, 72.6717],
-    "Ramol": [22.9840, 72.6582],
-    "Narol": [22.9634, 72.5891],
-    "Shahwadi": [22.9570, 72.5780],
-    "Motipura": [22.9610, 72.5820],
-    "Sureliya": [23.0010, 72.6510],
-    "Khodiyar Nagar": [23.0390, 72.6350],
-    "Rajendra Park": [23.0210, 72.6610],
-    "Aman Nagar": [23.0240, 72.6650],
-    "Saheed Circle": [23.0490, 72.6730],
-    "Bapunagar": [23.0371, 72.6231],
-    "Saraspur": [23.0298, 72.6080],
-    "Asarwa": [23.0494, 72.6033],
-    "Shahibaug": [23.0560, 72.5925],
-    "Naroda": [23.0725, 72.6656],
-    "Rakhial": [23.0180, 72.6210],
-    "Sarangpur": [23.0215, 72.5990],
-    "Kalupur": [23.0260, 72.5950],
-    "Astodia": [23.0170, 72.5910],
-    "Raipur": [23.0185, 72.5940],
-    "Lal Darwaja": [23.0240, 72.5810],
-    "Geeta Mandir": [23.0110, 72.5880],
-    "Shahpur": [23.0350, 72.5780],
-    "Dani Limda": [22.9950, 72.5810],
-    "Navrangpura": [23.0366, 72.5611],
-    "Satellite": [23.0300, 72.5176],
-    "Vastrapur": [23.0350, 72.5293],
-    "Bodakdev": [23.0410, 72.5115],
-    "Thaltej": [23.0500, 72.5070],
-    "Sola": [23.0680, 72.5180],
-    "Gota": [23.0970, 72.5310],
-    "Ghatlodia": [23.0682, 72.5358],
-    "Naranpura": [23.0520, 72.5530],
-    "Paldi": [23.0120, 72.5620],
-    "Vasna": [22.9980, 72.5520],
-    "Ranip": [23.0800, 72.5710],
-    "Sabarmati": [23.0845, 72.5802],
-    "Chandkheda": [23.1114, 72.5835]
-}
+def directory_query(search, area):
+    """Filter of the navaratri directory for a search text and a map area"""
+    query = {}
+    if search:
+        query["$or"] = [
+            {"name": {"$regex": search, "$options": "i"}},
+            {"mobile": {"$regex": search, "$options": "i"}},
+            {"address": {"$regex": search, "$options": "i"}}
+        ]
+    if area:
+        query.update(area_query(area))
+    return query
+
+
+def directory_page(args):
+    """(customers, next_cursor) of one directory page for request args"""
+    query = directory_query(args.get("search", "").strip(), args.get("area", "").strip())
+
+    customers, next_cursor = keyset_page(
+        ncustomers, query, projection("navaratri_customers"),
+        page_size(args.get("per_page")), args.get("after") or None
+    )
+    for c in customers:
+        c["mapped_locality"] = c.get("resolved_locality") or ""
+    return customers, next_cursor
 
 
 @navaratri.route("/navaratri-customers")
@@ -2846,65 +2411,12 @@ def navaratri_customers_list():
         return redirect('/admin')
 
     search = request.args.get("search", "").strip()
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"mobile": {"$regex": search, "$options": "i"}},
-                {"address": {"$regex": search, "$options": "i"}}
-            ]
-        }
-
-    all_customers = list(ncustomers.find().sort("updated_at", -1))
-
-    # Dynamic Custom Localities Merge
-    from website.general.db import custom_localities
-    active_localities = list(KNOWN_LOCALITIES)
-    active_coords = dict(AREA_COORDINATES)
     try:
-        for cloc in custom_localities.find():
-            cname = cloc.get("name")
-            clat = cloc.get("lat")
-            clng = cloc.get("lng")
-            if cname and clat is not None and clng is not None:
-                if cname not in active_localities:
-                    active_localities.insert(0, cname)
-                active_coords[cname] = [float(clat), float(clng)]
-    except Exception:
-        pass
-
-    # Area Strength Analytics & Verified Locality Mapping
-    from website.general.utils import resolve_customer_locality
-
-    area_counts = {}
-    total_with_addr = 0
-    unmapped_count = 0
+        customers, next_cursor = directory_page(request.args)
+    except ValueError:
+        return redirect(url_for('navaratri.navaratri_customers_list', search=search or None))
 
-    for c in all_customers:
-        matched_loc = resolve_customer_locality(c, active_localities)
-        if matched_loc:
-            c["mapped_locality"] = matched_loc
-            area_counts[matched_loc] = area_counts.get(matched_loc, 0) + 1
-            total_with_addr += 1
-        else:
-            c["mapped_locality"] = ""
-            unmapped_count += 1
-
-    sorted_areas = sorted(area_counts.items(), key=lambda x: x[1], reverse=True)
-    top_areas = []
-    map_localities = []
-
-    for loc, count in sorted_areas:
-        pct = round((count / max(total_with_addr, 1)) * 100, 1)
-        item = {"area": loc, "count": count, "percentage": pct}
-        if len(top_areas) < 5:
-            top_areas.append(item)
-        if loc in active_coords:
-            item_map = dict(item)
-            item_map["lat"] = active_coords[loc][0]
-            item_map["lng"] = active_coords[loc][1]
-            map_localities.append(item_map)
+    analytics = area_analytics(ncustomers)
 
     # Active Bookings Mobile List
     active_mobiles = set()
@@ -2914,29 +2426,46 @@ def navaratri_customers_list():
         except Exception:
             pass
 
-    id_to_loc = {str(c["_id"]): c.get("mapped_locality", "") for c in all_customers}
-
-    if search:
-        customers = list(ncustomers.find(query).sort("updated_at", -1))
-        for c in customers:
-            c["mapped_locality"] = id_to_loc.get(str(c["_id"]), "")
-    else:
-        customers = all_customers
-
     return render_template(
         "navaratri/navaratri_customers.html",
         customers=customers,
-        total_count=len(all_customers),
+        next_cursor=next_cursor,
+        per_page=page_size(request.args.get("per_page")),
+        total_count=analytics["total"],
         active_bookers_count=len(active_mobiles),
-        total_with_addr=total_with_addr,
-        unmapped_count=unmapped_count,
-        top_areas=top_areas,
-        map_localities=map_localities,
-        area_map_data=map_localities,
+        total_with_addr=analytics["total_with_addr"],
+        unmapped_count=analytics["unmapped_count"],
+        top_areas=analytics["top_areas"],
+        map_localities=analytics["map_localities"],
+        area_map_data=analytics["map_localities"],
         search=search
     )
 
 
+@navaratri.route("/api/navaratri-customers")
+def navaratri_customers_page():
+    """Next page of the customer directory for infinite scroll"""
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    try:
+        customers, next_cursor = directory_page(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    data = {
+        "success": True,
+        "html": render_template("navaratri/customer_rows.html", customers=customers),
+        "count": len(customers),
+        "next": next_cursor
+    }
+    if not request.args.get("after"):
+        data["total"] = ncustomers.count_documents(
+            directory_query(request.args.get("search", "").strip(), request.args.get("area", "").strip())
+        )
+    return jsonify(data)
+
+
 @navaratri.route("/navaratri_logs")
 def navaratri_logs():
     if not session.get('logged_in'):
@@ -3010,4 +2539,4 @@ def clear_navaratri_logs():
     except Exception:
         pass
 
-    return jsonify({"success": True, "message": "✅ All action logs cleared successfully!"})
\ No newline at end of file
+    return jsonify({"success": True, "message": "✅ All action logs cleared successfully!"})
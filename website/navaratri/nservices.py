@@ -1,107 +1,148 @@
+import logging
+import time
+
 from werkzeug.local import LocalProxy
 from website.navaratri.ncycle import get_selected_collection
 
 collection = LocalProxy(lambda: get_selected_collection())
 
 
-from datetime import datetime
-import re
+from website.navaratri.nindex import (
+    INVENTORY_CODES,
+    get_booking_index,
+    refresh_booking_index,
+    advance_booking_index,
+    drop_booking_index
+)
+from website.navaratri.nlines import sync_customer_lines, get_lines
+from website.navaratri.nsummary import sync_customer_summary
+from website.general.cache import bump_cycle_version
+from website.general.search import sync_search_document
 
-def normalize_product_code(code):
-    """Normalize product code by stripping hyphens, spaces, and converting to uppercase."""
-    if not code:
-        return ""
-    return re.sub(r'[^A-Z0-9]', '', str(code).strip().upper())
+logger = logging.getLogger(__name__)
 
-def parse_date_tuple(date_input):
-    """Extract (year, month, day) tuple from various date string formats."""
-    if not date_input:
-        return None
-    s = str(date_input).strip()
-    for fmt in ("%d-%m-%y", "%d-%m-%Y", "%Y-%m-%d", "%d/%m/%y", "%d/%m/%Y", "%Y/%m/%d"):
-        try:
-            dt = datetime.strptime(s, fmt)
-            return (dt.year, dt.month, dt.day)
-        except ValueError:
-            pass
-    m = re.match(r'^(\d{1,4})[\-/](\d{1,2})[\-/](\d{1,4})$', s)
-    if m:
-        p1, p2, p3 = int(m.group(1)), int(m.group(2)), int(m.group(3))
-        if p1 > 1000:
-            return (p1, p2, p3)
-        else:
-            yr = p3 if p3 > 100 else (2000 + p3 if p3 < 70 else 1900 + p3)
-            return (yr, p2, p1)
-    return None
+VERSION_BUMP_ATTEMPTS = 3
 
 # ------------------ CONFLICT CHECK ------------------
 def check_booking_conflict(date, products, exclude_mobile=None):
     conflicts = []
-    target_date_tuple = parse_date_tuple(date)
 
-    date_candidates = [date]
     try:
-        parts = date.split('-')
-        if len(parts) == 3:
-            d, m, y = parts[0], parts[1], parts[2]
-            if len(y) == 2:
-                date_candidates.append(f"{d}-{m}-20{y}")
-            elif len(y) == 4:
-                date_candidates.append(f"{d}-{m}-{y[2:]}")
+        index = get_booking_index(collection)
     except Exception:
-        pass
+        return False, conflicts
 
-    valid_dates = set(date_candidates)
+    for prod in products:
+        prod_clean = str(prod).strip().upper()
+        holder = index.find(date, prod, exclude_mobile=exclude_mobile)
+        if holder:
+            name, mobile = holder
+            conflicts.append({
+                "product": prod_clean,
+                "date": date,
+                "customer_name": name,
+                "customer_mobile": mobile
+            })
+            break
 
+    return len(conflicts) > 0, conflicts
+
+
+def on_customer_write(customer_id):
+    """
+    Keeps the derived booking structures of the selected cycle in step
+    with a customer document that was just inserted, updated or deleted.
+
+    The lines, summary and search rows are best effort. The version bump
+    is what tells the other workers to refresh their booking index, so
+    it is retried and, failing that, raised instead of swallowed.
+    """
     try:
-        all_docs = list(collection.find())
+        refresh_booking_index(collection, customer_id)
+        indexed = True
     except Exception:
-        all_docs = []
+        logger.exception("Could not refresh the booking index for customer %s in %s", customer_id, collection.name)
+        indexed = False
+
+    for step, sync in (
+        ("booking lines", lambda: sync_customer_lines(collection, customer_id)),
+        ("summary", lambda: sync_customer_summary(collection, customer_id)),
+        ("search row", lambda: sync_search_document(collection, "navaratri", customer_id))
+    ):
+        try:
+            sync()
+        except Exception:
+            logger.exception("Could not sync the %s of customer %s in %s", step, customer_id, collection.name)
 
-    for prod in products:
-        prod_clean = str(prod).strip().upper()
-        prod_norm = normalize_product_code(prod)
-        if not prod_norm:
-            continue
+    for attempt in range(1, VERSION_BUMP_ATTEMPTS + 1):
+        try:
+            version = bump_cycle_version(collection.name)
+            break
+        except Exception:
+            if attempt == VERSION_BUMP_ATTEMPTS:
+                logger.exception("Could not bump the version of %s after writing customer %s", collection.name, customer_id)
+                raise
+            time.sleep(0.2 * attempt)
 
-        found_conflict = None
-        for doc in all_docs:
-            cust_mobile = str(doc.get("mobile", "")).strip()
-            if exclude_mobile and cust_mobile == str(exclude_mobile).strip():
-                continue
-
-            cust_bookings = doc.get("bookings", {})
-            if not isinstance(cust_bookings, dict):
-                continue
-
-            for d_key, p_list in cust_bookings.items():
-                d_key_str = str(d_key).strip()
-                date_matches = (d_key_str in valid_dates)
-                if not date_matches and target_date_tuple:
-                    k_tuple = parse_date_tuple(d_key_str)
-                    if k_tuple and k_tuple == target_date_tuple:
-                        date_matches = True
-
-                if date_matches:
-                    p_items = p_list if isinstance(p_list, list) else [p_list]
-                    for p in p_items:
-                        p_str = str(p).strip().upper()
-                        p_norm = normalize_product_code(p)
-                        if p_str == prod_clean or (prod_norm and prod_norm == p_norm):
-                            found_conflict = {
-                                "product": prod_clean or p_str,
-                                "date": date,
-                                "customer_name": doc.get("Name", "Unknown"),
-                                "customer_mobile": cust_mobile
-                            }
-                            break
-                    if found_conflict:
-                        break
-            if found_conflict:
-                conflicts.append(found_conflict)
-                break
+    if indexed:
+        advance_booking_index(collection.name, version)
+    else:
+        # Rebuilt on next use rather than trusted without this write
+        drop_booking_index(collection.name)
 
-    return len(conflicts) > 0, conflicts
+
+# ------------------ AVAILABILITY MATRIX ------------------
+def get_availability_matrix(start, end, exclude_mobile=None):
+    """
+    Availability of every inventory code on each ISO date in [start, end],
+    from one range query on the cycle's booking lines.
+
+    Each date maps to a base64 bitmap over INVENTORY_CODES, most significant
+    bit first; a set bit means the code is free on that date.
+    """
+    from datetime import datetime, timedelta
+    import base64
+
+    nbytes = (len(INVENTORY_CODES) + 7) // 8
+    code_bits = {
+        code: 1 << (nbytes * 8 - 1 - i)
+        for i, code in enumerate(INVENTORY_CODES)
+    }
+    all_free = sum(code_bits.values())
+
+    start_obj = datetime.strptime(start, "%Y-%m-%d")
+    end_obj = datetime.strptime(end, "%Y-%m-%d")
+    dates = [
+        (start_obj + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range((end_obj - start_obj).days + 1)
+    ]
+
+    booked = {d: 0 for d in dates}
+    exclude = str(exclude_mobile).strip() if exclude_mobile else None
+    rows = get_lines(collection).find(
+        {"date": {"$gte": start, "$lte": end}},
+        {"date": 1, "product_code": 1, "mobile": 1}
+    )
+    for row in rows:
+        if exclude and str(row.get("mobile", "")).strip() == exclude:
+            continue
+        bit = code_bits.get(row["product_code"])
+        if bit and row["date"] in booked:
+            booked[row["date"]] |= bit
+
+    availability = {}
+    booked_count = {}
+    for d in dates:
+        free = all_free & ~booked[d]
+        availability[d] = base64.b64encode(free.to_bytes(nbytes, "big")).decode("ascii")
+        booked_count[d] = bin(booked[d]).count("1")
+
+    return {
+        "codes": INVENTORY_CODES,
+        "dates": dates,
+        "availability": availability,
+        "booked_count": booked_count
+    }
 
 
 from website.general.utils import (
@@ -168,4 +209,4 @@ def log_action(name, mobile, action, details):
         logs_col.insert_one(log_entry)
     except Exception:
         pass
-
\ No newline at end of file
+
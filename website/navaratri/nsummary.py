@@ -0,0 +1,168 @@
+# nsummary.py
+#
+# Per-cycle dashboard summary for navaratri customers, kept current with
+# `$inc` deltas by on_customer_write(). See website/general/summaries.py.
+
+from pymongo import ASCENDING, DESCENDING
+
+from website.general.summaries import (
+    path,
+    positive,
+    get_summary,
+    rebuild_summary,
+    sync_summary_part,
+    parts_collection_for
+)
+from website.navaratri.nanalytics import (
+    ANALYTICS_PROJECTION,
+    ProductAccumulator,
+    safe_int,
+    strict_int,
+    first_max,
+    top_items,
+    totals_stats,
+    product_insights
+)
+
+KIND = "navaratri"
+
+RANK_INDEXES = [
+    [("total_price", DESCENDING), ("_id", ASCENDING)],
+    [("remaining", DESCENDING), ("total_price", DESCENDING), ("_id", ASCENDING)]
+]
+
+RANK_FIELDS = {
+    "_id": 1, "name": 1, "mobile": 1, "address": 1,
+    "total_price": 1, "given_price": 1, "remaining": 1, "item_count": 1
+}
+
+
+def customer_part(doc):
+    """
+    (counter increments, ranking fields) contributed by one customer,
+    read exactly like the dashboard analytics read it.
+    """
+    inc = {}
+
+    def add(p, v):
+        if v:
+            inc[p] = inc.get(p, 0) + v
+
+    tot = safe_int(doc.get('total_price'))
+    giv = safe_int(doc.get('given_price'))
+
+    add("totals.customers", 1)
+    add("totals.collection", tot)
+    add("totals.given", giv)
+    if tot != 0:
+        if giv >= tot:
+            add("payment.fully_paid", 1)
+        elif giv > 0:
+            add("payment.partially_paid", 1)
+        else:
+            add("payment.unpaid", 1)
+
+    group = str(doc.get('group') or '-').strip() or '-'
+    ref = str(doc.get('reference') or 'Self').strip() or 'Self'
+    add(path("groups", group, "count"), 1)
+    add(path("groups", group, "revenue"), tot)
+    add(path("references", ref, "count"), 1)
+    add(path("references", ref, "revenue"), tot)
+
+    name = doc.get('Name') or doc.get('name', 'Unknown')
+    add(path("names", name, "count"), 1)
+    add(path("names", name, "total"), strict_int(doc.get('total_price')))
+
+    products = ProductAccumulator()
+    products.add(doc)
+    add("totals.items", products.total_items)
+    for code, count in products.product_counts.items():
+        add(path("products", code), count)
+    for date, count in products.by_date.items():
+        add(path("dates", date), count)
+    for (c, k), count in products.pairs.items():
+        add(path("pairs", f"{c}|{k}"), count)
+
+    item_count = 0
+    bookings = doc.get("bookings", {})
+    if isinstance(bookings, dict):
+        for items in bookings.values():
+            if isinstance(items, list):
+                item_count += len(items)
+
+    fields = {
+        "name": doc.get("Name") or doc.get("name") or "Unknown",
+        "mobile": doc.get("mobile") or "",
+        "address": doc.get("address") or "",
+        "total_price": tot,
+        "given_price": giv,
+        "remaining": tot - giv,
+        "item_count": item_count
+    }
+    return inc, fields
+
+
+def get_cycle_summary(collection):
+    return get_summary(collection, KIND, customer_part, ANALYTICS_PROJECTION, RANK_INDEXES)
+
+
+def rebuild_cycle_summary(collection):
+    return rebuild_summary(collection, KIND, customer_part, ANALYTICS_PROJECTION, RANK_INDEXES)
+
+
+def sync_customer_summary(collection, customer_id):
+    sync_summary_part(collection, customer_id, customer_part, ANALYTICS_PROJECTION)
+
+
+def _ranked_customers(parts, query, sort, limit):
+    rows = []
+    for row in parts.find(query, RANK_FIELDS).sort(sort).limit(limit):
+        row["id"] = str(row.pop("_id"))
+        rows.append(row)
+    return rows
+
+
+def summary_analytics(collection, top=15):
+    """
+    Dashboard analytics read from the cycle summary document, plus two
+    index-backed top-K queries on its parts for the customer rankings.
+    """
+    summary = get_cycle_summary(collection)
+    totals = summary.get("totals", {})
+    payment = summary.get("payment", {})
+
+    stats = totals_stats(
+        totals.get("customers", 0), totals.get("collection", 0), totals.get("given", 0),
+        payment.get("fully_paid", 0), payment.get("partially_paid", 0), payment.get("unpaid", 0)
+    )
+
+    products = ProductAccumulator()
+    products.total_items = totals.get("items", 0)
+    products.product_counts = positive(summary.get("products"))
+    for code, count in products.product_counts.items():
+        if code.startswith('C'):
+            products.choli_counts[code] = count
+        elif code.startswith('K'):
+            products.kediya_counts[code] = count
+    products.by_date = positive(summary.get("dates"))
+    products.pairs = {
+        tuple(pair.split("|", 1)): count
+        for pair, count in positive(summary.get("pairs")).items()
+    }
+    stats.update(products.result())
+
+    groups = positive(summary.get("groups"), "count")
+    references = positive(summary.get("references"), "count")
+    names = positive(summary.get("names"), "count")
+    person, value = first_max({k: v.get("total", 0) for k, v in names.items()})
+
+    parts = parts_collection_for(collection)
+    stats.update({
+        "top_customers": _ranked_customers(parts, {}, RANK_INDEXES[0], top),
+        "top_debtors": _ranked_customers(parts, {"remaining": {"$gt": 0}}, RANK_INDEXES[1], top),
+        "highest_booking_person": person,
+        "highest_booking_value": value,
+        "top_groups": top_items({k: v.get("revenue", 0) for k, v in groups.items()}, 10),
+        "top_references": top_items({k: v.get("revenue", 0) for k, v in references.items()}, 10)
+    })
+    return product_insights(stats, products)
@@ -1,7 +1,7 @@
-import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
 
+from website.general.mongo import get_client
+
 def print_customer_list():
     """
     Fetches all customers from the 'Form' collection and prints
@@ -13,8 +13,7 @@ def print_customer_list():
     
     # 2. Connect to the database (copied from your auth.py)
     try:
-        mongoUrl = os.environ.get("client")
-        client = MongoClient(mongoUrl, tls=True, tlsAllowInvalidCertificates=True)
+        client = get_client()
         db = client['Image_Traditional']
         collection = db['Form']
         
@@ -0,0 +1,101 @@
+// directory_scroll.js
+//
+// Infinite scroll for the keyset-paginated customer directories.
+// The page renders the first rows itself; when the sentinel element comes
+// into view the next page is fetched from `url` with the cursor the server
+// handed out, and the returned HTML is appended to the target containers.
+// reset(params) reloads from the first page with new filters.
+
+class DirectoryScroll {
+  /**
+   * url       JSON endpoint answering {success, count, next, total?, <htmlKey>...}
+   * targets   {htmlKey: containerElement} the fragments are appended to
+   * sentinel  element observed to trigger the next page
+   * params    filters sent with every request (search, area, per_page...)
+   * next      cursor of the page after the server-rendered one, or null
+   * offset    rows already rendered, sent so row numbers continue
+   * onPage    callback(data, replaced) after a page was inserted
+   */
+  constructor({ url, targets, sentinel, params = {}, next = null, offset = 0, onPage = null }) {
+    this.url = url;
+    this.targets = targets;
+    this.sentinel = sentinel;
+    this.params = Object.assign({}, params);
+    this.next = next;
+    this.offset = offset;
+    this.onPage = onPage;
+    this.loading = false;
+    this.seq = 0;
+
+    if ('IntersectionObserver' in window) {
+      this.observer = new IntersectionObserver(
+        entries => { if (entries.some(e => e.isIntersecting)) this.more(); },
+        { rootMargin: '600px 0px' }
+      );
+      this.observer.observe(sentinel);
+    } else {
+      sentinel.addEventListener('click', () => this.more());
+    }
+    this._sync();
+  }
+
+  more() {
+    if (this.loading || !this.next) return;
+    this._load({ after: this.next }, false);
+  }
+
+  reset(params) {
+    this.params = Object.assign({}, params);
+    this.next = null;
+    this.offset = 0;
+    this._load({}, true);
+  }
+
+  _query(extra) {
+    const q = new URLSearchParams();
+    const all = Object.assign({}, this.params, extra, { offset: this.offset });
+    Object.keys(all).forEach(k => {
+      if (all[k] !== undefined && all[k] !== null && all[k] !== '') q.set(k, all[k]);
+    });
+    return q.toString();
+  }
+
+  _load(extra, replace) {
+    const token = ++this.seq;
+    this.loading = true;
+    this.sentinel.classList.add('loading');
+
+    fetch(this.url + '?' + this._query(extra))
+      .then(r => r.json())
+      .then(data => {
+        if (token !== this.seq) return;   // superseded by a reset
+        if (!data.success) throw new Error(data.message || 'Could not load customers');
+
+        Object.keys(this.targets).forEach(key => {
+          const el = this.targets[key];
+          if (!el) return;
+          if (replace) el.innerHTML = '';
+          el.insertAdjacentHTML('beforeend', data[key] || '');
+        });
+        this.offset += data.count;
+        this.next = data.next;
+        if (this.onPage) this.onPage(data, replace);
+      })
+      .catch(err => console.error(err))
+      .finally(() => {
+        if (token !== this.seq) return;
+        this.loading = false;
+        this.sentinel.classList.remove('loading');
+        this._sync();
+      });
+  }
+
+  _sync() {
+    this.sentinel.style.display = this.next ? '' : 'none';
+    // A short page can leave the sentinel on screen, which the observer
+    // does not report again
+    if (this.next && this.sentinel.getBoundingClientRect().top < window.innerHeight + 600) {
+      requestAnimationFrame(() => this.more());
+    }
+  }
+}
@@ -0,0 +1,54 @@
+// mobile_suggest.js
+//
+// Typeahead for a mobile number input: once a few digits are typed, the
+// customers whose mobile starts with them are offered in a <datalist>,
+// from /api/autocomplete (served from memory, cached briefly by the
+// browser). Picking one completes the number, which fires the form's own
+// 10-digit lookup as before.
+
+function attachMobileSuggest(input, { url = '/api/autocomplete', system = null, minDigits = 3, limit = 8 } = {}) {
+  if (!input) return;
+  const list = document.createElement('datalist');
+  list.id = input.id + '-suggestions';
+  input.after(list);
+  input.setAttribute('list', list.id);
+
+  const seen = new Map();
+  let timer = null;
+  let latest = '';
+
+  function render(items) {
+    list.innerHTML = '';
+    items.forEach(c => {
+      const opt = document.createElement('option');
+      opt.value = c.mobile;
+      opt.label = [c.name, c.address].filter(Boolean).join(' — ');
+      list.appendChild(opt);
+    });
+  }
+
+  function lookup(prefix) {
+    if (seen.has(prefix)) return render(seen.get(prefix));
+    const q = new URLSearchParams({ kind: 'customers', q: prefix, limit: limit });
+    if (system) q.set('system', system);
+    fetch(url + '?' + q.toString())
+      .then(r => r.json())
+      .then(data => {
+        if (!data.success) return;
+        seen.set(prefix, data.suggestions);
+        if (prefix === latest) render(data.suggestions);
+      })
+      .catch(err => console.error(err));
+  }
+
+  input.addEventListener('input', () => {
+    const digits = input.value.replace(/\D/g, '');
+    latest = digits;
+    clearTimeout(timer);
+    if (digits.length < minDigits || digits.length >= 10) {
+      list.innerHTML = '';
+      return;
+    }
+    timer = setTimeout(() => lookup(digits), 120);
+  });
+}